@@ -24,8 +24,10 @@ eth_interpacket_gap = 12
 eth_preamble        = 0xd555555555555555
 buffer_depth        = 2**log2_int(eth_mtu, need_pow2=False)
 
-ethernet_type_ip    = 0x800
-ethernet_type_arp   = 0x806
+ethernet_type_ip          = 0x800
+ethernet_type_arp         = 0x806
+ethernet_type_mac_control = 0x8808
+ethernet_type_vlan        = 0x8100
 
 # MAC Constants/Header -----------------------------------------------------------------------------
 
@@ -37,6 +39,15 @@ mac_header_fields = {
 }
 mac_header = Header(mac_header_fields, mac_header_length, swap_field_bytes=True)
 
+# VLAN Constants/Header (802.1Q Tag) ---------------------------------------------------------------
+
+vlan_header_length = 4
+vlan_header_fields = {
+    "tci":           HeaderField(0, 0, 16), # Tag Control Information: PCP (3), DEI (1), VLAN ID (12).
+    "ethernet_type": HeaderField(2, 0, 16)
+}
+vlan_header = Header(vlan_header_fields, vlan_header_length, swap_field_bytes=True)
+
 # ARP Constants/Header -----------------------------------------------------------------------------
 
 arp_hwtype_ethernet = 0x0001
@@ -155,8 +166,19 @@ def convert_ip(s):
     else:
         return s
 
+def convert_ips(s):
+    if isinstance(s, (list, tuple)):
+        ips = [convert_ip(e) for e in s]
+    else:
+        ips = [convert_ip(s)]
+    if len(ips) > 2**ip_index_width:
+        raise ValueError("Up to {} local IP addresses are supported".format(2**ip_index_width))
+    return ips
+
 # Stream Layouts -----------------------------------------------------------------------------------
 
+ip_index_width = 4 # Index of the local IP address (when multiple local IP addresses are used).
+
 # PHY
 def eth_phy_description(dw):
     payload_layout = [
@@ -169,6 +191,17 @@ def eth_phy_description(dw):
 # MAC
 def eth_mac_description(dw):
     payload_layout = mac_header.get_layout() + [
+        ("vlan_id",    12), # 802.1Q VLAN ID (0: untagged), only used with VLAN support.
+        ("pcp",         3), # 802.1Q Priority Code Point, only used with VLAN support.
+        ("data",       dw),
+        ("last_be", dw//8),
+        ("error",   dw//8)
+    ]
+    return EndpointDescription(payload_layout)
+
+# VLAN
+def eth_vlan_description(dw):
+    payload_layout = vlan_header.get_layout() + [
         ("data",       dw),
         ("last_be", dw//8),
         ("error",   dw//8)
@@ -205,10 +238,14 @@ def eth_ipv4_description(dw):
     return EndpointDescription(payload_layout, param_layout)
 
 def eth_ipv4_user_description(dw):
+    # dst_ip_address: Destination IP address of the received packets (Local, Broadcast or Multicast
+    # group IP address), unused on TX.
     param_layout = [
-        ("length",     16),
-        ("protocol",    8),
-        ("ip_address", 32)
+        ("length",         16),
+        ("protocol",        8),
+        ("ip_address",     32),
+        ("ip_index",       ip_index_width),
+        ("dst_ip_address", 32)
     ]
     payload_layout = [
         ("data",       dw),
@@ -230,6 +267,7 @@ def eth_icmp_description(dw):
 def eth_icmp_user_description(dw):
     param_layout = icmp_header.get_layout() + [
         ("ip_address", 32),
+        ("ip_index",   ip_index_width),
         ("length",     16)
     ]
     payload_layout = [
@@ -254,6 +292,7 @@ def eth_udp_user_description(dw):
         ("src_port",   16),
         ("dst_port",   16),
         ("ip_address", 32),
+        ("ip_index",   ip_index_width),
         ("length",     16)
     ]
     payload_layout = [
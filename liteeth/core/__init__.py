@@ -14,19 +14,98 @@ from liteeth.core.icmp import LiteEthICMP
 # IP Core ------------------------------------------------------------------------------------------
 
 class LiteEthIPCore(Module, AutoCSR):
-    def __init__(self, phy, mac_address, ip_address, clk_freq, with_icmp=True, dw=8, with_sim_hack=False, dummy_checksum=False):
-        ip_address = convert_ip(ip_address)
-        self.submodules.mac = LiteEthMAC(phy, dw, interface="crossbar", with_preamble_crc=True, with_sim_hack=with_sim_hack)
-        self.submodules.arp = LiteEthARP(self.mac, mac_address, ip_address, clk_freq, dw=dw)
-        self.submodules.ip  = LiteEthIP(self.mac, mac_address, ip_address, self.arp.table, dw=dw, dummy_checksum=dummy_checksum)
+    def __init__(self, phy, mac_address, ip_address, clk_freq,
+        with_icmp           = True,
+        dw                  = 8,
+        with_sim_hack       = False,
+        dummy_checksum      = False,
+        arp_entries         = 1,
+        arp_static_entries  = 0,
+        arp_request_timeout = 0.1,
+        arp_entry_timeout   = 10,
+        arp_with_refresh    = False,
+        arp_with_timer_csrs = False,
+        ip_pending_depth    = None,
+        ip_pending_slots    = 4,
+        gateway             = None,
+        netmask             = 0xffffff00,
+        with_address_csrs   = False,
+        with_ip_broadcast   = False,
+        ip_mcast_groups     = 0,
+        mtu                 = eth_mtu):
+        ip_addresses = convert_ips(ip_address)
+
+        # Addresses: Constants, Signals or CSRs (Signals/CSRs are registered so that address
+        # compares remain single-cycle). ip_address can also be a list of local IP addresses
+        # (the matched one is reported as ip_index on the user ports).
+        if with_address_csrs:
+            if isinstance(mac_address, Signal) or any(isinstance(ip, Signal) for ip in ip_addresses):
+                raise ValueError("Address CSRs require constant reset values")
+            self._mac_address = CSRStorage(48, reset=mac_address, atomic_write=True, description="MAC Address.")
+            mac_address = self._mac_address.storage
+            for n, ip in enumerate(ip_addresses):
+                csr = CSRStorage(32, reset=ip, name="ip_address" if n == 0 else "ip_address{}".format(n),
+                    description="IP Address {}.".format(n))
+                setattr(self, "_" + csr.name, csr)
+                ip_addresses[n] = csr.storage
+        else:
+            if isinstance(mac_address, Signal):
+                _mac_address = Signal(48)
+                self.sync += _mac_address.eq(mac_address)
+                mac_address = _mac_address
+            for n, ip in enumerate(ip_addresses):
+                if isinstance(ip, Signal):
+                    _ip_address = Signal(32)
+                    self.sync += _ip_address.eq(ip)
+                    ip_addresses[n] = _ip_address
+        ip_address = ip_addresses if len(ip_addresses) > 1 else ip_addresses[0]
+        self.mac_address = mac_address
+        self.ip_address  = ip_address
+
+        # The hardware stack uses little-endian byte lanes (first byte of the stream on lane 0).
+        self.submodules.mac = LiteEthMAC(phy, dw, interface="crossbar", endianness="little", with_preamble_crc=True,
+                                         with_sim_hack=with_sim_hack, mtu=mtu)
+        # ARP/ICMP (control traffic) get a higher TX priority than IP/UDP traffic on the crossbars.
+        self.submodules.arp = LiteEthARP(self.mac, mac_address, ip_address, clk_freq, dw=dw,
+                                         entries=arp_entries, static_entries=arp_static_entries,
+                                         request_timeout=arp_request_timeout, entry_timeout=arp_entry_timeout,
+                                         with_refresh=arp_with_refresh, with_timer_csrs=arp_with_timer_csrs,
+                                         priority=1)
+        self.submodules.ip  = LiteEthIP(self.mac, mac_address, ip_address, self.arp.table, dw=dw, dummy_checksum=dummy_checksum,
+                                        pending_depth=ip_pending_depth, pending_slots=ip_pending_slots, gateway=gateway, netmask=netmask,
+                                        with_broadcast=with_ip_broadcast, mcast_groups=ip_mcast_groups, mtu=mtu)
         if with_icmp:
-            self.submodules.icmp = LiteEthICMP(self.ip, ip_address, dw=dw)
+            self.submodules.icmp = LiteEthICMP(self.ip, ip_address, dw=dw, priority=1)
 
 # UDP IP Core --------------------------------------------------------------------------------------
 
 class LiteEthUDPIPCore(LiteEthIPCore):
-    def __init__(self, phy, mac_address, ip_address, clk_freq, with_icmp=True, dw=8, with_sim_hack=False, dummy_checksum=False):
-        ip_address = convert_ip(ip_address)
+    def __init__(self, phy, mac_address, ip_address, clk_freq,
+        with_icmp           = True,
+        dw                  = 8,
+        with_sim_hack       = False,
+        dummy_checksum      = False,
+        arp_entries         = 1,
+        arp_static_entries  = 0,
+        arp_request_timeout = 0.1,
+        arp_entry_timeout   = 10,
+        arp_with_refresh    = False,
+        arp_with_timer_csrs = False,
+        ip_pending_depth    = None,
+        ip_pending_slots    = 4,
+        gateway             = None,
+        netmask             = 0xffffff00,
+        with_address_csrs   = False,
+        with_ip_broadcast   = False,
+        ip_mcast_groups     = 0,
+        with_udp_checksum   = False,
+        mtu                 = eth_mtu):
         LiteEthIPCore.__init__(self, phy, mac_address, ip_address, clk_freq, dw=dw,
-                               with_icmp=with_icmp, with_sim_hack=with_sim_hack, dummy_checksum=dummy_checksum)
-        self.submodules.udp = LiteEthUDP(self.ip, ip_address, dw=dw)
+                               with_icmp=with_icmp, with_sim_hack=with_sim_hack, dummy_checksum=dummy_checksum,
+                               arp_entries=arp_entries, arp_static_entries=arp_static_entries,
+                               arp_request_timeout=arp_request_timeout, arp_entry_timeout=arp_entry_timeout,
+                               arp_with_refresh=arp_with_refresh, arp_with_timer_csrs=arp_with_timer_csrs,
+                               ip_pending_depth=ip_pending_depth, ip_pending_slots=ip_pending_slots, gateway=gateway, netmask=netmask,
+                               with_address_csrs=with_address_csrs, with_ip_broadcast=with_ip_broadcast,
+                               ip_mcast_groups=ip_mcast_groups, mtu=mtu)
+        self.submodules.udp = LiteEthUDP(self.ip, self.ip_address, dw=dw, with_checksum=with_udp_checksum, mtu=mtu)
@@ -6,9 +6,10 @@
 
 from liteeth.common import *
 
-from migen.genlib.misc import WaitTimer
+from functools import reduce
+from operator import or_
 
-from litex.soc.interconnect.packet import Depacketizer, Packetizer
+from liteeth.packet import Depacketizer, Packetizer
 
 # ARP Layouts --------------------------------------------------------------------------------------
 
@@ -16,9 +17,29 @@ _arp_table_layout = [
         ("reply",        1),
         ("request",      1),
         ("ip_address",  32),
+        ("ip_index",    ip_index_width),
         ("mac_address", 48)
     ]
 
+# ARP Timer ----------------------------------------------------------------------------------------
+
+class _ARPTimer(Module):
+    """WaitTimer variant with a constant or runtime (CSR) timeout, in clock cycles."""
+    def __init__(self, t):
+        self.wait = Signal()
+        self.done = Signal()
+
+        # # #
+
+        count = Signal(len(t))
+        self.comb += self.done.eq(count == 0)
+        self.sync += \
+            If(self.wait,
+                If(~self.done, count.eq(count - 1))
+            ).Else(
+                count.eq(t)
+            )
+
 # ARP TX -------------------------------------------------------------------------------------------
 
 class LiteEthARPPacketizer(Packetizer):
@@ -36,9 +57,12 @@ class LiteEthARPTX(Module):
 
         # # #
 
-        packet_length = max(arp_header.length, eth_min_len)
-        packet_words  = packet_length//(dw//8)
-        counter       = Signal(max=packet_words, reset_less=True)
+        ip_addresses = convert_ips(ip_address)
+
+        # ARP header + padding up to the minimum Ethernet payload length.
+        payload_length = max(eth_min_len - arp_header.length, 1)
+        payload_words  = ceil(payload_length/(dw//8))
+        counter        = Signal(max=max(payload_words, 2), reset_less=True)
 
         self.submodules.packetizer = packetizer = LiteEthARPPacketizer(dw)
 
@@ -50,14 +74,14 @@ class LiteEthARPTX(Module):
             )
         )
         self.comb += [
-            packetizer.sink.last.eq(counter == (packet_words - 1)),
-            packetizer.sink.last_be.eq(1 if len(packetizer.sink.last_be) == 1 else 2**(packet_length%(dw//8)-1)),
+            packetizer.sink.last.eq(counter == (payload_words - 1)),
+            packetizer.sink.last_be.eq(2**((payload_length - 1)%(dw//8))),
             packetizer.sink.hwtype.eq(arp_hwtype_ethernet),
             packetizer.sink.proto.eq(arp_proto_ip),
             packetizer.sink.hwsize.eq(6),
             packetizer.sink.protosize.eq(4),
             packetizer.sink.sender_mac.eq(mac_address),
-            packetizer.sink.sender_ip.eq(ip_address),
+            packetizer.sink.sender_ip.eq(Array(ip_addresses)[sink.ip_index]),
             packetizer.sink.target_ip.eq(sink.ip_address),
             If(sink.reply,
                 packetizer.sink.opcode.eq(arp_opcode_reply),
@@ -76,8 +100,10 @@ class LiteEthARPTX(Module):
         fsm.act("SEND",
             packetizer.sink.valid.eq(1),
             packetizer.source.connect(source, keep={"valid", "ready"}),
+            If(packetizer.sink.valid & packetizer.sink.ready,
+                NextValue(counter, counter + 1)
+            ),
             If(source.valid & source.ready,
-                NextValue(counter, counter + 1),
                 If(source.last,
                     sink.ready.eq(1),
                     NextState("IDLE")
@@ -100,7 +126,9 @@ class LiteEthARPRX(Module):
         self.sink   = sink   = stream.Endpoint(eth_mac_description(dw))
         self.source = source = stream.Endpoint(_arp_table_layout)
 
-        # # #s
+        # # #
+
+        ip_addresses = convert_ips(ip_address)
 
         self.submodules.depacketizer = depacketizer = LiteEthARPDepacketizer(dw)
         self.comb += sink.connect(depacketizer.sink)
@@ -113,6 +141,11 @@ class LiteEthARPRX(Module):
                 NextState("CHECK")
             )
         )
+        ip_match = Signal()
+        ip_index = Signal(ip_index_width, reset_less=True)
+        for n, local_ip_address in enumerate(ip_addresses):
+            self.comb += If(depacketizer.source.target_ip == local_ip_address, ip_match.eq(1))
+            self.sync += If(depacketizer.source.target_ip == local_ip_address, ip_index.eq(n))
         valid = Signal(reset_less=True)
         self.sync += valid.eq(
             depacketizer.source.valid &
@@ -120,7 +153,7 @@ class LiteEthARPRX(Module):
             (depacketizer.source.proto == arp_proto_ip) &
             (depacketizer.source.hwsize == 6) &
             (depacketizer.source.protosize == 4) &
-            (depacketizer.source.target_ip == ip_address)
+            ip_match
         )
         reply = Signal()
         request = Signal()
@@ -131,6 +164,7 @@ class LiteEthARPRX(Module):
             })
         self.comb += [
             source.ip_address.eq(depacketizer.source.sender_ip),
+            source.ip_index.eq(ip_index),
             source.mac_address.eq(depacketizer.source.sender_mac)
         ]
         fsm.act("CHECK",
@@ -150,8 +184,12 @@ class LiteEthARPRX(Module):
 
 # ARP Table ----------------------------------------------------------------------------------------
 
-class LiteEthARPTable(Module):
-    def __init__(self, clk_freq, max_requests=8):
+class LiteEthARPTable(Module, AutoCSR):
+    def __init__(self, clk_freq, max_requests=8, entries=1, static_entries=0,
+        request_timeout = 0.1,
+        entry_timeout   = 10,
+        with_refresh    = False,
+        with_timer_csrs = False):
         self.sink   = sink   = stream.Endpoint(_arp_table_layout)  # from arp_rx
         self.source = source = stream.Endpoint(_arp_table_layout)  # to arp_tx
 
@@ -159,6 +197,28 @@ class LiteEthARPTable(Module):
         self.request  = request  = stream.Endpoint(arp_table_request_layout)
         self.response = response = stream.Endpoint(arp_table_response_layout)
 
+        # Direct lookup interface
+        self.lookup_valid       = Signal()
+        self.lookup_ip_address  = Signal(32)
+        self.lookup_hit         = Signal()
+        self.lookup_mac_address = Signal(48)
+
+        # Timers (in clock cycles, from request_timeout/entry_timeout in seconds, optionally
+        # overridable through CSRs).
+        cache_ages = 8
+        request_timeout_cycles = int(clk_freq*request_timeout)
+        age_period_cycles      = int(clk_freq*entry_timeout)//cache_ages
+        if with_timer_csrs:
+            self._request_timeout = CSRStorage(32, reset=request_timeout_cycles,
+                description="ARP request retry timeout (in clock cycles).")
+            self._age_period      = CSRStorage(32, reset=age_period_cycles,
+                description="ARP entry aging period (in clock cycles), entries expire after {} periods.".format(cache_ages))
+            request_timeout_cycles = self._request_timeout.storage
+            age_period_cycles      = self._age_period.storage
+        else:
+            request_timeout_cycles = Constant(request_timeout_cycles, 32)
+            age_period_cycles      = Constant(age_period_cycles, 32)
+
         # # #
 
         request_pending     = Signal()
@@ -172,16 +232,19 @@ class LiteEthARPTable(Module):
             )
 
         request_ip_address        = Signal(32, reset_less=True)
+        request_ip_address_valid  = Signal()
         request_ip_address_reset  = Signal()
         request_ip_address_update = Signal()
         self.sync += \
             If(request_ip_address_reset,
-                request_ip_address.eq(0)
+                request_ip_address.eq(0),
+                request_ip_address_valid.eq(0)
             ).Elif(request_ip_address_update,
-                request_ip_address.eq(request.ip_address)
+                request_ip_address.eq(request.ip_address),
+                request_ip_address_valid.eq(1)
             )
 
-        request_timer = WaitTimer(clk_freq//10)
+        request_timer = _ARPTimer(request_timeout_cycles)
         self.submodules += request_timer
         request_counter       = Signal(max=max_requests)
         request_counter_reset = Signal()
@@ -194,15 +257,162 @@ class LiteEthARPTable(Module):
             )
         self.comb += request_timer.wait.eq(request_pending & ~request_counter_ce)
 
-        # Note: Store only 1 IP/MAC couple, can be improved with a real
-        # table in the future to improve performance when packets are
-        # targeting multiple destinations.
-        update = Signal()
-        cached_valid       = Signal()
-        cached_ip_address  = Signal(32, reset_less=True)
-        cached_mac_address = Signal(48, reset_less=True)
-        cached_timer       = WaitTimer(clk_freq*10)
-        self.submodules += cached_timer
+        # Cache: Store up to `entries` IP/MAC couples. All entries are compared in parallel so a
+        # lookup hits in a single cycle. Entries are aged with a shared timer (and invalidated
+        # after entry_timeout without update) and replaced in LRU order when the cache is full.
+        # Entries used since their last update are refreshed (re-ARPed) during their last 2 age
+        # periods so active flows never stall on an expired entry.
+        index_max         = max(entries, 2)
+        cache_valid       = Array(Signal()                       for n in range(entries))
+        cache_age         = Array(Signal(max=cache_ages)         for n in range(entries))
+        cache_lru         = Array(Signal(max=index_max, reset=n) for n in range(entries))
+        cache_ip_address  = Array(Signal(32, reset_less=True)    for n in range(entries))
+        cache_mac_address = Array(Signal(48, reset_less=True)    for n in range(entries))
+        cache_active      = Array(Signal()                       for n in range(entries))
+        cache_refresh     = Array(Signal()                       for n in range(entries))
+
+        # Static entries: Programmed through CSRs, never expire and are never requested.
+        static_valid       = Array(Signal()                    for n in range(static_entries))
+        static_ip_address  = Array(Signal(32, reset_less=True) for n in range(static_entries))
+        static_mac_address = Array(Signal(48, reset_less=True) for n in range(static_entries))
+        if static_entries:
+            self.static_entries      = CSRConstant(static_entries)
+            self._static_ip_address  = CSRStorage(32, reset_less=True)
+            self._static_mac_address = CSRStorage(48, reset_less=True)
+            self._static_control     = CSRStorage(fields=[
+                CSRField("index", size=bits_for(static_entries - 1)),
+                CSRField("valid", size=1),
+                CSRField("write", size=1, pulse=True),
+            ])
+            static_control = self._static_control.fields
+            for n in range(static_entries):
+                self.sync += If(static_control.write & (static_control.index == n),
+                    static_valid[n].eq(static_control.valid),
+                    static_ip_address[n].eq(self._static_ip_address.storage),
+                    static_mac_address[n].eq(self._static_mac_address.storage)
+                )
+
+        # Lookup.
+        def static_lookup(ip_address):
+            hit         = Signal()
+            mac_address = Signal(48)
+            for n in range(static_entries):
+                self.comb += If(static_valid[n] & (static_ip_address[n] == ip_address),
+                    hit.eq(1),
+                    mac_address.eq(static_mac_address[n])
+                )
+            return hit, mac_address
+
+        def cache_lookup(ip_address):
+            hit   = Signal()
+            index = Signal(max=index_max)
+            for n in range(entries):
+                self.comb += If(cache_valid[n] & (cache_ip_address[n] == ip_address),
+                    hit.eq(1),
+                    index.eq(n)
+                )
+            return hit, index
+
+        check_ip_address                   = Signal(32)
+        check_hit, check_index             = cache_lookup(check_ip_address)
+        check_static_hit, check_static_mac = static_lookup(check_ip_address)
+
+        # Direct lookup (single cycle hit path, without request/response handshake).
+        direct_hit, direct_index             = cache_lookup(self.lookup_ip_address)
+        direct_static_hit, direct_static_mac = static_lookup(self.lookup_ip_address)
+        self.comb += [
+            self.lookup_hit.eq(direct_static_hit | direct_hit),
+            If(direct_static_hit,
+                self.lookup_mac_address.eq(direct_static_mac)
+            ).Else(
+                self.lookup_mac_address.eq(cache_mac_address[direct_index])
+            )
+        ]
+
+        # Victim selection (first free entry, else least recently used one).
+        victim_index = Signal(max=index_max)
+        for n in range(entries):
+            self.comb += If(cache_lru[n] == (entries - 1), victim_index.eq(n))
+        for n in reversed(range(entries)):
+            self.comb += If(~cache_valid[n], victim_index.eq(n))
+
+        # LRU tracking.
+        touch       = Signal()
+        touch_index = Signal(max=index_max)
+        lru_ce      = Signal()
+        lru_index   = Signal(max=index_max)
+        lru_value   = Signal(max=index_max)
+        self.comb += [
+            lru_ce.eq(touch | (self.lookup_valid & direct_hit)),
+            lru_index.eq(Mux(touch, touch_index, direct_index)),
+            lru_value.eq(cache_lru[lru_index])
+        ]
+        for n in range(entries):
+            self.sync += If(lru_ce,
+                If(lru_index == n,
+                    cache_lru[n].eq(0)
+                ).Elif(cache_lru[n] < lru_value,
+                    cache_lru[n].eq(cache_lru[n] + 1)
+                )
+            )
+
+        # Update/Aging.
+        update            = Signal()
+        update_index      = Signal(max=index_max)
+        reply_ip_address  = Signal(32, reset_less=True)
+        reply_mac_address = Signal(48, reset_less=True)
+        age_timer         = _ARPTimer(age_period_cycles)
+        self.submodules += age_timer
+        self.comb += age_timer.wait.eq(~age_timer.done)
+        for n in range(entries):
+            self.sync += [
+                If(update & (update_index == n),
+                    cache_valid[n].eq(1),
+                    cache_age[n].eq(0),
+                    cache_ip_address[n].eq(reply_ip_address),
+                    cache_mac_address[n].eq(reply_mac_address),
+                ).Elif(age_timer.done,
+                    If(cache_age[n] == (cache_ages - 1),
+                        cache_valid[n].eq(0)
+                    ).Else(
+                        cache_age[n].eq(cache_age[n] + 1)
+                    )
+                ),
+                If(update & (update_index == n),
+                    cache_active[n].eq(0)
+                ).Elif(lru_ce & (lru_index == n),
+                    cache_active[n].eq(1)
+                )
+            ]
+
+        # Refresh (one outstanding request per entry and per age period).
+        refresh_valid = Signal()
+        refresh_index = Signal(max=index_max)
+        refresh_set   = Signal()
+        for n in reversed(range(entries if with_refresh else 0)):
+            self.comb += If(cache_valid[n] & cache_active[n] & ~cache_refresh[n] & (cache_age[n] >= (cache_ages - 2)),
+                refresh_valid.eq(1),
+                refresh_index.eq(n)
+            )
+        for n in range(entries):
+            self.sync += \
+                If(update & (update_index == n),
+                    cache_refresh[n].eq(0)
+                ).Elif(refresh_set & (refresh_index == n),
+                    cache_refresh[n].eq(1)
+                ).Elif(age_timer.done,
+                    cache_refresh[n].eq(0)
+                )
+        refresh_pending = Signal()
+        self.comb += refresh_pending.eq(reduce(or_, [cache_refresh[n] for n in range(entries)]))
+
+        # Response.
+        response_failed      = Signal()
+        response_mac_address = Signal(48, reset_less=True)
+        self.comb += [
+            response.failed.eq(response_failed),
+            response.mac_address.eq(response_mac_address)
+        ]
 
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
@@ -210,51 +420,67 @@ class LiteEthARPTable(Module):
             # is lost. This is compensated by the protocol (retries)
             If(sink.valid & sink.request,
                 NextState("SEND_REPLY")
-            ).Elif(sink.valid & sink.reply & request_pending,
+            ).Elif(sink.valid & sink.reply & (request_pending | refresh_pending),
+                NextValue(reply_ip_address,  sink.ip_address),
+                NextValue(reply_mac_address, sink.mac_address),
                 NextState("UPDATE_TABLE"),
             ).Elif(request_counter == max_requests-1,
+                NextValue(response_failed, 1),
                 NextState("PRESENT_RESPONSE")
             ).Elif(request.valid | (request_pending & request_timer.done),
                 NextState("CHECK_TABLE")
+            ).Elif(refresh_valid,
+                NextState("SEND_REFRESH")
             )
         )
         fsm.act("SEND_REPLY",
             source.valid.eq(1),
             source.reply.eq(1),
             source.ip_address.eq(sink.ip_address),
+            source.ip_index.eq(sink.ip_index),
             source.mac_address.eq(sink.mac_address),
             If(source.ready,
                 NextState("IDLE")
             )
         )
         fsm.act("UPDATE_TABLE",
-            request_pending_clr.eq(1),
+            # Refresh replies must not clear a pending request for another IP.
+            request_pending_clr.eq(~request_ip_address_valid | (reply_ip_address == request_ip_address)),
             update.eq(1),
-            NextState("CHECK_TABLE")
-        )
-        self.sync += \
-            If(update,
-                cached_valid.eq(1),
-                cached_ip_address.eq(sink.ip_address),
-                cached_mac_address.eq(sink.mac_address),
+            touch.eq(1),
+            touch_index.eq(update_index),
+            If(request_ip_address_valid,
+                NextState("CHECK_TABLE")
             ).Else(
-                If(cached_timer.done,
-                    cached_valid.eq(0)
-                )
+                NextState("IDLE")
             )
-        self.comb += cached_timer.wait.eq(~update)
+        )
+        self.comb += [
+            If(fsm.ongoing("UPDATE_TABLE"),
+                check_ip_address.eq(reply_ip_address)
+            ).Elif(request_ip_address_valid,
+                check_ip_address.eq(request_ip_address)
+            ).Else(
+                check_ip_address.eq(request.ip_address)
+            ),
+            update_index.eq(Mux(check_hit, check_index, victim_index))
+        ]
         fsm.act("CHECK_TABLE",
-            If(cached_valid,
-                If(request_ip_address == cached_ip_address,
-                    request_ip_address_reset.eq(1),
-                    NextState("PRESENT_RESPONSE"),
-                ).Elif(request.ip_address == cached_ip_address,
-                    request.ready.eq(request.valid),
-                    NextState("PRESENT_RESPONSE"),
+            If(check_static_hit | check_hit,
+                If(request_ip_address_valid,
+                    request_ip_address_reset.eq(1)
                 ).Else(
-                    request_ip_address_update.eq(request.valid),
-                    NextState("SEND_REQUEST")
-                )
+                    request.ready.eq(request.valid)
+                ),
+                touch.eq(check_hit),
+                touch_index.eq(check_index),
+                NextValue(response_failed, 0),
+                If(check_static_hit,
+                    NextValue(response_mac_address, check_static_mac)
+                ).Else(
+                    NextValue(response_mac_address, cache_mac_address[check_index])
+                ),
+                NextState("PRESENT_RESPONSE"),
             ).Else(
                 request_ip_address_update.eq(request.valid),
                 NextState("SEND_REQUEST")
@@ -272,13 +498,21 @@ class LiteEthARPTable(Module):
                 NextState("IDLE")
             )
         )
+        fsm.act("SEND_REFRESH",
+            source.valid.eq(1),
+            source.request.eq(1),
+            source.ip_address.eq(cache_ip_address[refresh_index]),
+            If(source.ready,
+                refresh_set.eq(1),
+                NextState("IDLE")
+            )
+        )
         self.comb += [
             If(request_counter == max_requests - 1,
-                response.failed.eq(1),
                 request_counter_reset.eq(1),
-                request_pending_clr.eq(1)
-            ),
-            response.mac_address.eq(cached_mac_address)
+                request_pending_clr.eq(1),
+                request_ip_address_reset.eq(1)
+            )
         ]
         fsm.act("PRESENT_RESPONSE",
             response.valid.eq(1),
@@ -289,16 +523,27 @@ class LiteEthARPTable(Module):
 
 # ARP ----------------------------------------------------------------------------------------------
 
-class LiteEthARP(Module):
-    def __init__(self, mac, mac_address, ip_address, clk_freq, dw=8):
+class LiteEthARP(Module, AutoCSR):
+    def __init__(self, mac, mac_address, ip_address, clk_freq, dw=8, entries=1, static_entries=0,
+        request_timeout = 0.1,
+        entry_timeout   = 10,
+        with_refresh    = False,
+        with_timer_csrs = False,
+        priority        = 0):
         self.submodules.tx    = tx    = LiteEthARPTX(mac_address, ip_address, dw)
         self.submodules.rx    = rx    = LiteEthARPRX(mac_address, ip_address, dw)
-        self.submodules.table = table = LiteEthARPTable(clk_freq)
+        self.submodules.table = table = LiteEthARPTable(clk_freq,
+            entries         = entries,
+            static_entries  = static_entries,
+            request_timeout = request_timeout,
+            entry_timeout   = entry_timeout,
+            with_refresh    = with_refresh,
+            with_timer_csrs = with_timer_csrs)
         self.comb += [
             rx.source.connect(table.sink),
             table.source.connect(tx.sink)
         ]
-        mac_port = mac.crossbar.get_port(ethernet_type_arp, dw=dw)
+        mac_port = mac.crossbar.get_port(ethernet_type_arp, dw=dw, priority=priority)
         self.comb += [
             tx.source.connect(mac_port.sink),
             mac_port.source.connect(rx.sink)
@@ -6,7 +6,9 @@
 
 from liteeth.common import *
 
-from litex.soc.interconnect.packet import Depacketizer, Packetizer, PacketFIFO
+from litex.soc.interconnect.packet import PacketFIFO
+
+from liteeth.packet import Depacketizer, Packetizer
 
 # ICMP TX ------------------------------------------------------------------------------------------
 
@@ -50,6 +52,7 @@ class LiteEthICMPTX(Module):
             source.length.eq(sink.length + icmp_header.length),
             source.protocol.eq(icmp_protocol),
             source.ip_address.eq(sink.ip_address),
+            source.ip_index.eq(sink.ip_index),
         ]
         fsm.act("SEND",
             packetizer.source.connect(source, keep={"valid", "ready"}),
@@ -100,6 +103,7 @@ class LiteEthICMPRX(Module):
                 "error",
                 "last_be"}),
             source.ip_address.eq(sink.ip_address),
+            source.ip_index.eq(sink.ip_index),
             source.length.eq(sink.length - icmp_header.length),
         ]
         fsm.act("RECEIVE",
@@ -143,7 +147,7 @@ class LiteEthICMPEcho(Module):
 # ICMP ---------------------------------------------------------------------------------------------
 
 class LiteEthICMP(Module):
-    def __init__(self, ip, ip_address, dw=8):
+    def __init__(self, ip, ip_address, dw=8, priority=0):
         self.submodules.tx   = tx   = LiteEthICMPTX(ip_address, dw)
         self.submodules.rx   = rx   = LiteEthICMPRX(ip_address, dw)
         self.submodules.echo = echo = LiteEthICMPEcho(dw)
@@ -151,7 +155,7 @@ class LiteEthICMP(Module):
             rx.source.connect(echo.sink),
             echo.source.connect(tx.sink)
         ]
-        ip_port = ip.crossbar.get_port(icmp_protocol, dw)
+        ip_port = ip.crossbar.get_port(icmp_protocol, dw, priority=priority)
         self.comb += [
             tx.source.connect(ip_port.sink),
             ip_port.source.connect(rx.sink)
@@ -7,7 +7,7 @@
 from liteeth.common import *
 from liteeth.crossbar import LiteEthCrossbar
 
-from litex.soc.interconnect.packet import Depacketizer, Packetizer
+from liteeth.packet import Depacketizer, Packetizer
 
 # IP Crossbar --------------------------------------------------------------------------------------
 
@@ -31,14 +31,15 @@ class LiteEthIPV4UserPort(LiteEthIPV4SlavePort):
 
 
 class LiteEthIPV4Crossbar(LiteEthCrossbar):
-    def __init__(self, dw=8):
-        LiteEthCrossbar.__init__(self, LiteEthIPV4MasterPort, "protocol", dw)
+    def __init__(self, dw=8, mtu=eth_mtu):
+        LiteEthCrossbar.__init__(self, LiteEthIPV4MasterPort, "protocol", dw, mtu)
 
-    def get_port(self, protocol, dw=8):
+    def get_port(self, protocol, dw=8, priority=0, weight=1, tx_fifo_depth=None,
+        rx_mode="cut-through", rx_buffer_depth=None):
         if protocol in self.users.keys():
             raise ValueError("Protocol {0:#x} already assigned".format(protocol))
         port = LiteEthIPV4UserPort(dw)
-        self.users[protocol] = port
+        self.add_port(protocol, port, priority, weight, tx_fifo_depth, rx_mode, rx_buffer_depth)
         return port
 
 # IP Checksum --------------------------------------------------------------------------------------
@@ -46,34 +47,45 @@ class LiteEthIPV4Crossbar(LiteEthCrossbar):
 @ResetInserter()
 @CEInserter()
 class LiteEthIPV4Checksum(Module):
-    def __init__(self, words_per_clock_cycle=1, skip_checksum=False, dummy=True):
+    def __init__(self, words_per_clock_cycle=None, skip_checksum=False, dummy=True, dw=8):
         self.header = Signal(ipv4_header.length*8)
         self.value  = Signal(16)
         self.done   = Signal()
 
         # # #
+
+        if words_per_clock_cycle is None:
+            words_per_clock_cycle = max(2, dw//8)
+
         if not dummy:
-            s = Signal(17, reset_less=True)
-            r = Signal(17, reset_less=True)
-            n_cycles = 0
+            # Header words.
+            words = []
             for i in range(ipv4_header.length//2):
                 if skip_checksum and (i == ipv4_header.fields["checksum"].byte//2):
-                    pass
-                else:
-                    s_next = Signal(17, reset_less=True)
-                    r_next = Signal(17, reset_less=True)
-                    self.comb += s_next.eq(r + self.header[i*16:(i+1)*16])
-                    r_next_eq = r_next.eq(Cat(s_next[:16]+s_next[16], Signal()))
-                    if (i%words_per_clock_cycle) != 0:
-                        self.comb += r_next_eq
-                    else:
-                        self.sync += If(~self.done, r_next_eq)
-                        n_cycles += 1
-                    s, r = s_next, r_next
-            self.comb += self.value.eq(~Cat(r[8:16], r[:8]))
+                    continue
+                words.append(self.header[i*16:(i+1)*16])
 
-            if not skip_checksum:
+            # Pipelined one's complement adder tree: each stage sums groups of words_per_clock_cycle
+            # words, folds the carries and registers the result.
+            n_cycles = 0
+            while (len(words) > 1) or (n_cycles == 0):
+                words_next = []
+                for i in range(0, len(words), words_per_clock_cycle):
+                    group = words[i:i+words_per_clock_cycle]
+                    s = Signal(16 + bits_for(len(group)))
+                    f = Signal(17)
+                    r = Signal(16, reset_less=True)
+                    self.comb += [
+                        s.eq(sum(group)),
+                        f.eq(s[:16] + s[16:]),
+                    ]
+                    self.sync += r.eq(f[:16] + f[16])
+                    words_next.append(r)
+                words     = words_next
                 n_cycles += 1
+            r = words[0]
+            self.comb += self.value.eq(~Cat(r[8:16], r[:8]))
+
             counter    = Signal(max=n_cycles+1)
             counter_ce = Signal()
             self.sync += If(counter_ce, counter.eq(counter + 1))
@@ -93,18 +105,21 @@ class LiteEthIPV4Packetizer(Packetizer):
             ipv4_header)
 
 
-class LiteEthIPTX(Module):
-    def __init__(self, mac_address, ip_address, arp_table, dw=8, dummy_checksum=False):
+class LiteEthIPTX(Module, AutoCSR):
+    def __init__(self, mac_address, ip_address, arp_table, dw=8, dummy_checksum=False, pending_depth=None, pending_slots=4,
+        gateway = None,
+        netmask = 0xffffff00):
         self.sink   = sink   = stream.Endpoint(eth_ipv4_user_description(dw))
         self.source = source = stream.Endpoint(eth_mac_description(dw))
         self.target_unreachable = Signal()
 
         # # #
 
+        ip_addresses = convert_ips(ip_address)
+
         # Checksum.
-        self.submodules.checksum = checksum = LiteEthIPV4Checksum(skip_checksum=True, dummy=dummy_checksum)
+        self.submodules.checksum = checksum = LiteEthIPV4Checksum(skip_checksum=True, dummy=dummy_checksum, dw=dw)
         self.comb += checksum.ce.eq(sink.valid)
-        self.comb += checksum.reset.eq(source.valid & source.last & source.ready)
 
         # Packetizer.
         self.submodules.packetizer = packetizer = LiteEthIPV4Packetizer(dw)
@@ -122,28 +137,145 @@ class LiteEthIPTX(Module):
             packetizer.sink.ihl.eq(ipv4_header.length//4),
             packetizer.sink.identification.eq(0),
             packetizer.sink.ttl.eq(0x80),
-            packetizer.sink.sender_ip.eq(ip_address),
+            packetizer.sink.sender_ip.eq(Array(ip_addresses)[sink.ip_index]),
             checksum.header.eq(packetizer.header),
-            packetizer.sink.checksum.eq(checksum.value)
+            packetizer.sink.checksum.eq(checksum.value),
+            checksum.reset.eq(packetizer.source.valid & packetizer.source.last & packetizer.source.ready)
         ]
 
-        target_mac = Signal(48, reset_less=True)
+        # Routing: Off-subnet destinations are resolved to the gateway (through the ARP Table, so the
+        # gateway entry is aged/refreshed as any other entry).
+        routed   = Signal()
+        next_hop = Signal(32)
+        if gateway is not None:
+            self._gateway = CSRStorage(32, reset=convert_ip(gateway), description="Gateway IP Address.")
+            self._netmask = CSRStorage(32, reset=convert_ip(netmask), description="Subnet Mask.")
+            self.comb += [
+                routed.eq(((sink.ip_address ^ ip_addresses[0]) & self._netmask.storage) != 0),
+                next_hop.eq(Mux(routed, self._gateway.storage, sink.ip_address))
+            ]
+        else:
+            self.comb += next_hop.eq(sink.ip_address)
+
+        # Target MAC (Multicast or ARP Table lookup of the next hop, done while the header is presented).
+        target_mac       = Signal(48, reset_less=True)
+        target_mac_mcast = Signal()
+        target_mac_hit   = Signal()
+        target_mac_held  = Signal()
+        target_mac_next  = Signal(48)
+        self.comb += [
+            arp_table.lookup_ip_address.eq(next_hop),
+            target_mac_mcast.eq(sink.ip_address[28:] == mcast_ip_mask),
+            If(target_mac_mcast,
+                target_mac_hit.eq(1),
+                target_mac_next.eq(Cat(sink.ip_address[:23], 0, mcast_oui))
+            ).Else(
+                target_mac_hit.eq(arp_table.lookup_hit & ~target_mac_held),
+                target_mac_next.eq(arp_table.lookup_mac_address)
+            )
+        ]
+
+        # Pending: On ARP Table miss, park the packet (up to pending_slots packets/pending_depth words)
+        # while its MAC address is resolved so that packets to already resolved destinations are not
+        # blocked behind it. Parked packets are resolved and flushed in order.
+        pending_busy     = Signal()
+        pending_resolved = Signal()
+        pending_failed   = Signal()
+        pending_done     = Signal()
+        if pending_depth is not None:
+            pending_fits        = Signal()
+            pending_start       = Signal()
+            pending_mac_address = Signal(48, reset_less=True)
+
+            self.submodules.pending = pending = stream.SyncFIFO(eth_phy_description(dw), pending_depth, buffered=True)
+            self.submodules.pending_queue = pending_queue = stream.SyncFIFO([("ip_address", 32)], pending_slots)
+            self.comb += [
+                pending_fits.eq(pending_queue.sink.ready &
+                    ((pending.level*(dw//8) + ipv4_header.length + sink.length) <= pending_depth*(dw//8))),
+                pending_queue.sink.valid.eq(pending_start),
+                pending_queue.sink.ip_address.eq(next_hop),
+                pending_busy.eq(pending_queue.source.valid),
+                # The ARP Table hits as soon as the next hop being resolved is updated, before its
+                # parked packets are flushed: handle it as a miss to keep the packets in order.
+                target_mac_held.eq(pending_busy & (pending_queue.source.ip_address == next_hop))
+            ]
+
+            self.submodules.pending_fsm = pending_fsm = FSM(reset_state="IDLE")
+            pending_fsm.act("IDLE",
+                If(pending_queue.source.valid,
+                    NextState("SEND_MAC_ADDRESS_REQUEST")
+                )
+            )
+            pending_fsm.act("SEND_MAC_ADDRESS_REQUEST",
+                arp_table.request.valid.eq(1),
+                arp_table.request.ip_address.eq(pending_queue.source.ip_address),
+                If(arp_table.request.valid & arp_table.request.ready,
+                    NextState("WAIT_MAC_ADDRESS_RESPONSE")
+                )
+            )
+            pending_fsm.act("WAIT_MAC_ADDRESS_RESPONSE",
+                If(arp_table.response.valid,
+                    NextValue(pending_mac_address, arp_table.response.mac_address),
+                    arp_table.response.ready.eq(1),
+                    If(arp_table.response.failed,
+                        self.target_unreachable.eq(1),
+                        NextState("FAILED"),
+                    ).Else(
+                        NextState("RESOLVED")
+                    )
+                )
+            )
+            pending_fsm.act("RESOLVED",
+                pending_resolved.eq(1),
+                If(pending_done,
+                    pending_queue.source.ready.eq(1),
+                    NextState("IDLE")
+                )
+            )
+            pending_fsm.act("FAILED",
+                pending_failed.eq(1),
+                If(pending_done,
+                    pending_queue.source.ready.eq(1),
+                    NextState("IDLE")
+                )
+            )
 
         # FSM.
+        if pending_depth is not None:
+            pending_flush = [NextState("FLUSH_PENDING")]
+            target_miss   = [If(pending_fits,
+                pending_start.eq(1),
+                NextState("PARK")
+            ).Elif(~pending_busy,
+                NextState("SEND_MAC_ADDRESS_REQUEST")
+            )]
+        else:
+            pending_flush = []
+            target_miss   = [NextState("SEND_MAC_ADDRESS_REQUEST")]
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
-            If(packetizer.source.valid,
-                If(sink.ip_address[28:] == mcast_ip_mask,
-                    NextValue(target_mac, Cat(sink.ip_address[:23], 0, mcast_oui)),
-                    NextState("SEND")
+            If(pending_resolved | pending_failed,
+                *pending_flush
+            ).Elif(packetizer.source.valid,
+                arp_table.lookup_valid.eq(~target_mac_mcast),
+                If(target_mac_hit,
+                    # Send first word directly to avoid dead cycles between packets.
+                    packetizer.source.connect(source),
+                    source.ethernet_type.eq(ethernet_type_ip),
+                    source.target_mac.eq(target_mac_next),
+                    source.sender_mac.eq(mac_address),
+                    NextValue(target_mac, target_mac_next),
+                    If(source.valid & source.ready & ~source.last,
+                        NextState("SEND")
+                    )
                 ).Else(
-                    NextState("SEND_MAC_ADDRESS_REQUEST")
+                    *target_miss
                 )
             )
         )
-        self.comb += arp_table.request.ip_address.eq(sink.ip_address)
         fsm.act("SEND_MAC_ADDRESS_REQUEST",
             arp_table.request.valid.eq(1),
+            arp_table.request.ip_address.eq(next_hop),
             If(arp_table.request.valid & arp_table.request.ready,
                 NextState("WAIT_MAC_ADDRESS_RESPONSE")
             )
@@ -177,6 +309,27 @@ class LiteEthIPTX(Module):
                 NextState("IDLE")
             )
         )
+        if pending_depth is not None:
+            fsm.act("PARK",
+                packetizer.source.connect(pending.sink, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+                If(pending.sink.valid & pending.sink.last & pending.sink.ready,
+                    NextState("IDLE")
+                )
+            )
+            fsm.act("FLUSH_PENDING",
+                If(pending_failed,
+                    pending.source.ready.eq(1)
+                ).Else(
+                    pending.source.connect(source, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+                    source.ethernet_type.eq(ethernet_type_ip),
+                    source.target_mac.eq(pending_mac_address),
+                    source.sender_mac.eq(mac_address)
+                ),
+                If(pending.source.valid & pending.source.last & pending.source.ready,
+                    pending_done.eq(1),
+                    NextState("IDLE")
+                )
+            )
 
 # IP RX --------------------------------------------------------------------------------------------
 
@@ -188,19 +341,76 @@ class LiteEthIPV4Depacketizer(Depacketizer):
             ipv4_header)
 
 
-class LiteEthIPRX(Module):
-    def __init__(self, mac_address, ip_address, dw=8, dummy_checksum=False):
+class LiteEthIPRX(Module, AutoCSR):
+    def __init__(self, mac_address, ip_address, dw=8, dummy_checksum=False,
+        with_broadcast = False,
+        mcast_groups   = 0):
         self.sink   = sink   = stream.Endpoint(eth_mac_description(dw))
         self.source = source = stream.Endpoint(eth_ipv4_user_description(dw))
 
         # # #
 
+        ip_addresses = convert_ips(ip_address)
+
         # Depacketizer.
         self.submodules.depacketizer = depacketizer = LiteEthIPV4Depacketizer(dw)
         self.comb += sink.connect(depacketizer.sink)
 
+        # Local IP Address match (all addresses compared in parallel).
+        ip_match = Signal()
+        ip_index = Signal(ip_index_width)
+        for n, local_ip_address in enumerate(ip_addresses):
+            self.comb += If(depacketizer.source.target_ip == local_ip_address,
+                ip_match.eq(1),
+                ip_index.eq(n)
+            )
+
+        # Multicast Groups: Programmed through CSRs, matched at MAC (01:00:5e + 23 LSBs of the group)
+        # and IP levels.
+        mcast_valid      = Array(Signal()                    for n in range(mcast_groups))
+        mcast_ip_address = Array(Signal(32, reset_less=True) for n in range(mcast_groups))
+        if mcast_groups:
+            self._mcast_ip_address = CSRStorage(32, reset_less=True)
+            self._mcast_control    = CSRStorage(fields=[
+                CSRField("index", size=bits_for(mcast_groups - 1)),
+                CSRField("valid", size=1),
+                CSRField("write", size=1, pulse=True),
+            ])
+            mcast_control = self._mcast_control.fields
+            for n in range(mcast_groups):
+                self.sync += If(mcast_control.write & (mcast_control.index == n),
+                    mcast_valid[n].eq(mcast_control.valid),
+                    mcast_ip_address[n].eq(self._mcast_ip_address.storage)
+                )
+
+        # MAC level filter (evaluated on each incoming word, the MAC header being constant over the
+        # packet, and registered for the IP level check).
+        mac_bcast       = Signal()
+        mac_mcast_hit   = Signal()
+        mac_mcast_match = Signal()
+        for n in range(mcast_groups):
+            self.comb += If(mcast_valid[n] &
+                (sink.target_mac[24:] == mcast_oui) &
+                (sink.target_mac[:24] == Cat(mcast_ip_address[n][:23], 0)),
+                mac_mcast_match.eq(1)
+            )
+        self.sync += If(sink.valid & sink.ready,
+            mac_bcast.eq(sink.target_mac == 0xffffffffffff),
+            mac_mcast_hit.eq(mac_mcast_match)
+        )
+
+        # IP level filter.
+        ip_bcast     = Signal()
+        ip_mcast_hit = Signal()
+        if with_broadcast:
+            self.comb += ip_bcast.eq(mac_bcast & (depacketizer.source.target_ip == 0xffffffff))
+        for n in range(mcast_groups):
+            self.comb += If(mac_mcast_hit & mcast_valid[n] & (depacketizer.source.target_ip == mcast_ip_address[n]),
+                ip_mcast_hit.eq(1)
+            )
+
         # Checksum.
-        self.submodules.checksum = checksum = LiteEthIPV4Checksum(skip_checksum=False, dummy=dummy_checksum)
+        self.submodules.checksum = checksum = LiteEthIPV4Checksum(skip_checksum=False, dummy=dummy_checksum, dw=dw)
         self.comb += [
             checksum.header.eq(depacketizer.header),
             checksum.reset.eq(~depacketizer.source.valid),
@@ -212,7 +422,7 @@ class LiteEthIPRX(Module):
         fsm.act("IDLE",
             If(depacketizer.source.valid & checksum.done,
                 NextState("DROP"),
-                If((depacketizer.source.target_ip == ip_address) &
+                If((ip_match | ip_bcast | ip_mcast_hit) &
                    (depacketizer.source.version == 0x4) &
                    (depacketizer.source.ihl == 0x5) &
                    (checksum.value == 0),
@@ -229,6 +439,8 @@ class LiteEthIPRX(Module):
                 "last_be"}),
             source.length.eq(depacketizer.source.total_length - (0x5*4)),
             source.ip_address.eq(depacketizer.source.sender_ip),
+            source.ip_index.eq(ip_index),
+            source.dst_ip_address.eq(depacketizer.source.target_ip),
         ]
         fsm.act("RECEIVE",
             depacketizer.source.connect(source, keep={"valid", "ready"}),
@@ -249,16 +461,25 @@ class LiteEthIPRX(Module):
 
 # IP -----------------------------------------------------------------------------------------------
 
-class LiteEthIP(Module):
-    def __init__(self, mac, mac_address, ip_address, arp_table, dw=8, dummy_checksum=False):
-        self.submodules.tx = tx = LiteEthIPTX(mac_address, ip_address, arp_table, dw=dw, dummy_checksum=dummy_checksum)
-        self.submodules.rx = rx = LiteEthIPRX(mac_address, ip_address, dw=dw, dummy_checksum=dummy_checksum)
+class LiteEthIP(Module, AutoCSR):
+    def __init__(self, mac, mac_address, ip_address, arp_table, dw=8, dummy_checksum=False, pending_depth=None, pending_slots=4,
+        gateway        = None,
+        netmask        = 0xffffff00,
+        with_broadcast = False,
+        mcast_groups   = 0,
+        mtu            = eth_mtu):
+        self.submodules.tx = tx = LiteEthIPTX(mac_address, ip_address, arp_table, dw=dw, dummy_checksum=dummy_checksum, pending_depth=pending_depth, pending_slots=pending_slots,
+            gateway = gateway,
+            netmask = netmask)
+        self.submodules.rx = rx = LiteEthIPRX(mac_address, ip_address, dw=dw, dummy_checksum=dummy_checksum,
+            with_broadcast = with_broadcast,
+            mcast_groups   = mcast_groups)
         mac_port = mac.crossbar.get_port(ethernet_type_ip, dw)
         self.comb += [
             tx.source.connect(mac_port.sink),
             mac_port.source.connect(rx.sink)
         ]
-        self.submodules.crossbar = crossbar = LiteEthIPV4Crossbar(dw)
+        self.submodules.crossbar = crossbar = LiteEthIPV4Crossbar(dw, mtu=mtu)
         self.comb += [
             crossbar.master.source.connect(tx.sink),
             rx.source.connect(crossbar.master.sink)
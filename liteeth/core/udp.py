@@ -8,7 +8,9 @@ from liteeth.common import *
 from liteeth.crossbar import LiteEthCrossbar
 
 from litex.soc.interconnect import stream
-from litex.soc.interconnect.packet import Depacketizer, Packetizer
+from litex.soc.interconnect.packet import PacketFIFO
+
+from liteeth.packet import Depacketizer, Packetizer
 
 # UDP Crossbar -------------------------------------------------------------------------------------
 
@@ -32,11 +34,12 @@ class LiteEthUDPUserPort(LiteEthUDPSlavePort):
 
 
 class LiteEthUDPCrossbar(LiteEthCrossbar):
-    def __init__(self, dw=8):
+    def __init__(self, dw=8, mtu=eth_mtu):
         self.dw = dw
-        LiteEthCrossbar.__init__(self, LiteEthUDPMasterPort, "dst_port", dw=dw)
+        LiteEthCrossbar.__init__(self, LiteEthUDPMasterPort, "dst_port", dw=dw, mtu=mtu)
 
-    def get_port(self, udp_port, dw=8, cd="sys"):
+    def get_port(self, udp_port, dw=8, cd="sys", priority=0, weight=1, tx_fifo_depth=None,
+        rx_mode="cut-through", rx_buffer_depth=None):
         if udp_port in self.users.keys():
             raise ValueError("Port {0:#x} already assigned".format(udp_port))
 
@@ -86,10 +89,82 @@ class LiteEthUDPCrossbar(LiteEthCrossbar):
 
         # Expose/Return User Port.
         # ------------------------
-        self.users[udp_port] = internal_port
+        self.add_port(udp_port, internal_port, priority, weight, tx_fifo_depth, rx_mode, rx_buffer_depth)
 
         return user_port
 
+# UDP Checksum -------------------------------------------------------------------------------------
+
+class LiteEthUDPChecksum(Module):
+    """Streaming UDP checksum (pseudo-header + header + payload).
+
+    Payload words are accumulated as they are presented (valid), value gives the checksum of the
+    datagram ending with the current word and the accumulator restarts after last. The sum is done
+    on byte-swapped 16-bit words so that data lanes can be added directly (one's complement sums are
+    byte order independent) and bytes beyond the UDP length (padding) are masked.
+    """
+    def __init__(self, dw=8):
+        self.valid    = Signal()
+        self.last     = Signal()
+        self.data     = Signal(dw)
+        self.src_ip   = Signal(32)
+        self.dst_ip   = Signal(32)
+        self.src_port = Signal(16)
+        self.dst_port = Signal(16)
+        self.length   = Signal(16) # UDP length (header + payload).
+        self.checksum = Signal(16) # Header checksum field (0 on TX).
+        self.value    = Signal(16)
+
+        # # #
+
+        def bswap(v):
+            return Cat(v[8:16], v[:8])
+
+        first = Signal(reset=1)
+        count = Signal(16)
+        acc   = Signal(32, reset_less=True)
+        self.sync += If(self.valid,
+            first.eq(self.last),
+            If(self.last,
+                count.eq(0)
+            ).Else(
+                count.eq(count + dw//8)
+            )
+        )
+
+        # Pseudo-Header + Header.
+        header = Signal(32)
+        self.comb += header.eq(sum(bswap(w) for w in [
+            self.src_ip[16:], self.src_ip[:16],
+            self.dst_ip[16:], self.dst_ip[:16],
+            C(udp_protocol, 16), self.length,
+            self.src_port, self.dst_port, self.length, self.checksum]))
+
+        # Payload (masked to UDP length).
+        payload_length = Signal(16)
+        self.comb += payload_length.eq(self.length - udp_header.length)
+        data_bytes = []
+        for i in range(dw//8):
+            data_byte = Signal(8)
+            self.comb += If((count + i) < payload_length, data_byte.eq(self.data[8*i:8*(i+1)]))
+            data_bytes.append(data_byte)
+        if dw == 8:
+            data_words = [Mux(count[0], Cat(C(0, 8), data_bytes[0]), Cat(data_bytes[0], C(0, 8)))]
+        else:
+            data_words = [Cat(data_bytes[2*i], data_bytes[2*i+1]) for i in range(dw//16)]
+
+        # Accumulate/Fold.
+        total = Signal(32)
+        fold0 = Signal(17)
+        fold1 = Signal(16)
+        self.comb += [
+            total.eq(Mux(first, header, acc) + sum(data_words)),
+            fold0.eq(total[:16] + total[16:]),
+            fold1.eq(fold0[:16] + fold0[16]),
+            self.value.eq(~bswap(fold1)),
+        ]
+        self.sync += If(self.valid, acc.eq(total))
+
 # UDP TX -------------------------------------------------------------------------------------------
 
 class LiteEthUDPPacketizer(Packetizer):
@@ -101,12 +176,45 @@ class LiteEthUDPPacketizer(Packetizer):
 
 
 class LiteEthUDPTX(Module):
-    def __init__(self, ip_address, dw=8):
+    def __init__(self, ip_address, dw=8, with_checksum=False, mtu=eth_mtu):
         self.sink   = sink   = stream.Endpoint(eth_udp_user_description(dw))
         self.source = source = stream.Endpoint(eth_ipv4_user_description(dw))
 
         # # #
 
+        ip_addresses = convert_ips(ip_address)
+
+        # Checksum (Store and Forward: the checksum is only known at the end of the datagram and is
+        # stored with the datagram parameters).
+        if with_checksum:
+            description = eth_udp_user_description(dw)
+            description = stream.EndpointDescription(description.payload_layout,
+                description.param_layout + [("checksum", 16)])
+            self.submodules.checksum = checksum = LiteEthUDPChecksum(dw)
+            self.submodules.buffer   = buffer   = PacketFIFO(description,
+                payload_depth = 2**log2_int(mtu, need_pow2=False)//(dw//8),
+                param_depth   = 4,
+                buffered      = True
+            )
+            self.comb += [
+                sink.connect(buffer.sink),
+                checksum.valid.eq(sink.valid & sink.ready),
+                checksum.last.eq(sink.last),
+                checksum.data.eq(sink.data),
+                checksum.src_ip.eq(Array(ip_addresses)[sink.ip_index]),
+                checksum.dst_ip.eq(sink.ip_address),
+                checksum.src_port.eq(sink.src_port),
+                checksum.dst_port.eq(sink.dst_port),
+                checksum.length.eq(sink.length + udp_header.length),
+                # A computed checksum of 0 is transmitted as 0xffff (0 means no checksum).
+                If(checksum.value == 0,
+                    buffer.sink.checksum.eq(0xffff)
+                ).Else(
+                    buffer.sink.checksum.eq(checksum.value)
+                )
+            ]
+            sink = buffer.source
+
         # Packetizer.
         self.submodules.packetizer = packetizer = LiteEthUDPPacketizer(dw=dw)
 
@@ -121,8 +229,11 @@ class LiteEthUDPTX(Module):
                 "dst_port",
                 "data"}),
             packetizer.sink.length.eq(sink.length + udp_header.length),
-            packetizer.sink.checksum.eq(0), # UDP Checksum is not used, we only rely on MAC CRC.
         ]
+        if with_checksum:
+            self.comb += packetizer.sink.checksum.eq(sink.checksum)
+        else:
+            self.comb += packetizer.sink.checksum.eq(0) # UDP Checksum is not used, we only rely on MAC CRC.
 
         # Control-Path (FSM).
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
@@ -136,6 +247,7 @@ class LiteEthUDPTX(Module):
             source.length.eq(packetizer.sink.length),
             source.protocol.eq(udp_protocol),
             source.ip_address.eq(sink.ip_address),
+            source.ip_index.eq(sink.ip_index),
             If(source.valid & source.ready,
                 If(source.last,
                     NextState("IDLE")
@@ -154,7 +266,7 @@ class LiteEthUDPDepacketizer(Depacketizer):
 
 
 class LiteEthUDPRX(Module):
-    def __init__(self, ip_address, dw=8):
+    def __init__(self, ip_address, dw=8, with_checksum=False):
         self.sink   = sink   = stream.Endpoint(eth_ipv4_user_description(dw))
         self.source = source = stream.Endpoint(eth_udp_user_description(dw))
 
@@ -172,11 +284,32 @@ class LiteEthUDPRX(Module):
                 "data",
                 "error"}),
             source.ip_address.eq(sink.ip_address),
+            source.ip_index.eq(sink.ip_index),
             source.length.eq(depacketizer.source.length - udp_header.length),
         ]
 
+        # Checksum (verified on the last word, error is set on mismatch; a 0 checksum is not checked).
+        if with_checksum:
+            self.submodules.checksum = checksum = LiteEthUDPChecksum(dw)
+            self.comb += [
+                checksum.valid.eq(source.valid & source.ready),
+                checksum.last.eq(source.last),
+                checksum.data.eq(depacketizer.source.data),
+                checksum.src_ip.eq(sink.ip_address),
+                checksum.dst_ip.eq(sink.dst_ip_address),
+                checksum.src_port.eq(depacketizer.source.src_port),
+                checksum.dst_port.eq(depacketizer.source.dst_port),
+                checksum.length.eq(depacketizer.source.length),
+                checksum.checksum.eq(depacketizer.source.checksum),
+                If(source.last & (checksum.checksum != 0) & (checksum.value != 0),
+                    source.error.eq(2**(dw//8) - 1)
+                )
+            ]
+
         # Control-Path (FSM).
-        count = Signal(16)
+        count     = Signal(16)
+        last_byte = Signal(max=max(dw//8, 2))
+        self.comb += last_byte.eq(source.length - 1)
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
             NextValue(count, 0),
@@ -189,7 +322,15 @@ class LiteEthUDPRX(Module):
         )
         fsm.act("RECEIVE",
             depacketizer.source.connect(source, keep={"valid", "ready"}),
-            source.last.eq(depacketizer.source.last | (count == (source.length - dw//8))),
+            If(depacketizer.source.last,
+                source.last.eq(1),
+                source.last_be.eq(depacketizer.source.last_be)
+            ),
+            # Stop on the UDP length (Ethernet padding is dropped).
+            If((count + dw//8) >= source.length,
+                source.last.eq(1),
+                source.last_be.eq(Array([2**i for i in range(dw//8)])[last_byte])
+            ),
             If(source.valid & source.ready,
                 NextValue(count, count + dw//8),
                 If(depacketizer.source.last,
@@ -212,15 +353,15 @@ class LiteEthUDPRX(Module):
 # UDP ----------------------------------------------------------------------------------------------
 
 class LiteEthUDP(Module):
-    def __init__(self, ip, ip_address, dw=8):
-        self.submodules.tx = tx = LiteEthUDPTX(ip_address, dw)
-        self.submodules.rx = rx = LiteEthUDPRX(ip_address, dw)
+    def __init__(self, ip, ip_address, dw=8, with_checksum=False, mtu=eth_mtu):
+        self.submodules.tx = tx = LiteEthUDPTX(ip_address, dw, with_checksum=with_checksum, mtu=mtu)
+        self.submodules.rx = rx = LiteEthUDPRX(ip_address, dw, with_checksum=with_checksum)
         ip_port = ip.crossbar.get_port(udp_protocol, dw)
         self.comb += [
             tx.source.connect(ip_port.sink),
             ip_port.source.connect(rx.sink)
         ]
-        self.submodules.crossbar = crossbar = LiteEthUDPCrossbar(dw)
+        self.submodules.crossbar = crossbar = LiteEthUDPCrossbar(dw, mtu=mtu)
         self.comb += [
             crossbar.master.source.connect(tx.sink),
             rx.source.connect(crossbar.master.sink)
@@ -5,33 +5,195 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from collections import OrderedDict
+from functools import reduce
+from operator import or_
 
 from liteeth.common import *
 
-from litex.soc.interconnect.packet import Arbiter, Dispatcher
+from litex.soc.interconnect.packet import Dispatcher, PacketFIFO
+
+from liteeth.packet import StoreAndForwardBuffer
+
+# Priority Arbiter ---------------------------------------------------------------------------------
+
+class PriorityArbiter(Module):
+    """Priority Arbiter
+
+    Arbitrates packets between masters: strict priority between priority levels (the highest level
+    with a requesting master is granted) and weighted round-robin between the masters of a level (a
+    master is granted up to weight consecutive packets while others are requesting). The grant is
+    only changed between packets.
+
+    Attributes
+    ----------
+    grant : out
+        Index of the granted master.
+    """
+    def __init__(self, masters, slave, priorities=None, weights=None):
+        if priorities is None:
+            priorities = [0]*len(masters)
+        if weights is None:
+            weights = [1]*len(masters)
+        assert len(priorities) == len(masters)
+        assert len(weights) == len(masters)
+        assert min(weights, default=1) >= 1
+        self.grant = Signal(max=max(len(masters), 2))
+
+        # # #
+
+        if len(masters) == 0:
+            return
+        if len(masters) == 1:
+            self.comb += masters[0].connect(slave)
+            return
+
+        # Packet tracking (from the first presented word to the last accepted one).
+        ongoing = Signal()
+        self.sync += [
+            If(slave.valid,
+                ongoing.eq(1)
+            ),
+            If(slave.valid & slave.ready & slave.last,
+                ongoing.eq(0)
+            )
+        ]
+
+        # Grant (selected between packets, held during packets).
+        select = Signal.like(self.grant)
+        grant  = Signal.like(self.grant)
+        self.comb += [
+            select.eq(grant),
+            If(ongoing,
+                self.grant.eq(grant)
+            ).Else(
+                self.grant.eq(select)
+            )
+        ]
+        self.sync += grant.eq(self.grant)
+        self.comb += Case(self.grant, {i: masters[i].connect(slave) for i in range(len(masters))})
+
+        # Selection (levels by increasing priority, the highest requesting level wins).
+        levels   = sorted(set(priorities))
+        requests = {}
+        for level in levels:
+            requests[level] = reduce(or_, [m.valid for m, p in zip(masters, priorities) if p == level])
+        for level in levels:
+            # Weighted round-robin over the slots of the level (weight slots per master).
+            slots = []
+            for i, (p, w) in enumerate(zip(priorities, weights)):
+                if p == level:
+                    slots += [i]*w
+            pointer      = Signal(max=max(len(slots), 2))
+            pointer_next = Signal.like(pointer)
+            level_select = Signal.like(self.grant)
+            cases = {}
+            for start in range(len(slots)):
+                cases[start] = []
+                for k in reversed(range(len(slots))):
+                    n = (start + k)%len(slots)
+                    cases[start].append(If(masters[slots[n]].valid,
+                        level_select.eq(slots[n]),
+                        pointer_next.eq((n + 1)%len(slots))
+                    ))
+            self.comb += Case(pointer, cases)
+            self.comb += If(requests[level], select.eq(level_select))
+
+            # Advance the pointer when a packet of the level is started.
+            higher_requests = [requests[l] for l in levels if l > level]
+            granted = requests[level]
+            if higher_requests:
+                granted = granted & ~reduce(or_, higher_requests)
+            self.sync += If(~ongoing & slave.valid & granted, pointer.eq(pointer_next))
 
 # Crossbar -----------------------------------------------------------------------------------------
 
 class LiteEthCrossbar(Module):
-    def __init__(self, master_port, dispatch_param, dw=8):
+    def __init__(self, master_port, dispatch_param, dw=8, mtu=eth_mtu):
         self.users  = OrderedDict()
         self.master = master_port(dw)
         self.dispatch_param = dispatch_param
+        self.mtu              = mtu
+        self.tx_priorities    = {}
+        self.tx_weights       = {}
+        self.tx_fifo_depths   = {}
+        self.rx_modes         = {}
+        self.rx_buffer_depths = {}
 
     # overload this in derived classes
     def get_port(self, *args, **kwargs):
         pass
 
+    def add_port(self, key, port, priority=0, weight=1, tx_fifo_depth=None,
+        rx_mode="cut-through", rx_buffer_depth=None):
+        """Add a user port.
+
+        TX packets are arbitrated with strict priority between priorities (higher first) and
+        weighted round-robin between ports of the same priority. With tx_fifo_depth, TX packets
+        are buffered (store and forward, tx_fifo_depth words, that must hold an MTU): ports only
+        take part in the arbitration once a full packet is available, so a slow port does not hold
+        the crossbar and higher priority packets can be sent at the next packet boundary.
+
+        RX packets are forwarded as received in "cut-through" mode (minimal latency, errors are
+        only reported on the last word). In "store-and-forward" mode, they are buffered
+        (rx_buffer_depth words, default: one MTU) and only forwarded once fully received: packets
+        with errors are dropped.
+        """
+        if weight < 1:
+            raise ValueError("Weight must be >= 1, got {}".format(weight))
+        if rx_mode not in ["cut-through", "store-and-forward"]:
+            raise ValueError("Unsupported RX mode: {}".format(rx_mode))
+        self.users[key]            = port
+        self.tx_priorities[key]    = priority
+        self.tx_weights[key]       = weight
+        self.tx_fifo_depths[key]   = tx_fifo_depth
+        self.rx_modes[key]         = rx_mode
+        self.rx_buffer_depths[key] = rx_buffer_depth
+
     def do_finalize(self):
-        # TX arbitrate
-        sinks = [port.sink for port in self.users.values()]
-        self.submodules.arbiter = Arbiter(sinks, self.master.source)
+        # TX arbitrate (optional per-port packet FIFOs, strict priority + weighted round-robin)
+        sinks = []
+        for k, port in self.users.items():
+            sink  = port.sink
+            depth = self.tx_fifo_depths.get(k, None)
+            if depth is not None:
+                # Params are only pushed on last: a packet larger than the FIFO would deadlock it.
+                if depth*(len(sink.data)//8) < self.mtu:
+                    raise ValueError("TX FIFO depth ({} words) of port {} is smaller than MTU ({} bytes)".format(
+                        depth, k, self.mtu))
+                fifo = PacketFIFO(sink.description, payload_depth=depth, param_depth=4, buffered=True)
+                self.submodules += fifo
+                self.comb += sink.connect(fifo.sink)
+                sink = fifo.source
+            sinks.append(sink)
+        self.submodules.arbiter = PriorityArbiter(sinks, self.master.source,
+            priorities = [self.tx_priorities.get(k, 0) for k in self.users.keys()],
+            weights    = [self.tx_weights.get(k, 1)    for k in self.users.keys()])
 
-        # RX dispatch
-        sources = [port.source for port in self.users.values()]
+        # RX dispatch (optional per-port store and forward buffers)
+        # (on a param or on a tuple of params, users are then keyed by tuples of values)
+        sources = []
+        for k, port in self.users.items():
+            source = port.source
+            if self.rx_modes.get(k, "cut-through") == "store-and-forward":
+                depth = self.rx_buffer_depths.get(k, None)
+                if depth is None:
+                    depth = 2**log2_int(self.mtu, need_pow2=False)//(len(source.data)//8)
+                buffer = StoreAndForwardBuffer(source.description, depth)
+                self.submodules += buffer
+                self.comb += buffer.source.connect(source)
+                source = buffer.sink
+            sources.append(source)
         self.submodules.dispatcher = Dispatcher(self.master.sink, sources, one_hot=True)
+        params = self.dispatch_param if isinstance(self.dispatch_param, tuple) else (self.dispatch_param,)
+        fields = [getattr(self.master.sink, param) for param in params]
         cases = {}
         cases["default"] = self.dispatcher.sel.eq(0)
         for i, (k, v) in enumerate(self.users.items()):
-            cases[k] = self.dispatcher.sel.eq(2**i)
-        self.comb += Case(getattr(self.master.sink, self.dispatch_param), cases)
+            values = k if isinstance(k, tuple) else (k,)
+            key    = 0
+            offset = 0
+            for value, field in zip(values, fields):
+                key    |= value << offset
+                offset += len(field)
+            cases[key] = self.dispatcher.sel.eq(2**i)
+        self.comb += Case(Cat(*fields), cases)
@@ -20,6 +20,8 @@ from liteeth.common import *
 from litex.soc.interconnect import wishbone
 from litex.soc.interconnect.packet import *
 
+from liteeth.packet import Depacketizer, Packetizer
+
 # Etherbone Packet ---------------------------------------------------------------------------------
 
 class LiteEthEtherbonePacketPacketizer(Packetizer):
@@ -91,10 +91,11 @@ class LiteEthUDP2StreamRX(Module):
 # UDP Streamer -------------------------------------------------------------------------------------
 
 class LiteEthUDPStreamer(Module):
-    def __init__(self, udp, ip_address, udp_port, rx_fifo_depth=64, tx_fifo_depth=64):
+    def __init__(self, udp, ip_address, udp_port, rx_fifo_depth=64, tx_fifo_depth=64,
+        rx_mode="cut-through", rx_buffer_depth=None):
         self.submodules.tx = tx = LiteEthStream2UDPTX(ip_address, udp_port, tx_fifo_depth)
         self.submodules.rx = rx = LiteEthUDP2StreamRX(ip_address, udp_port, rx_fifo_depth)
-        udp_port = udp.crossbar.get_port(udp_port, dw=8)
+        udp_port = udp.crossbar.get_port(udp_port, dw=8, rx_mode=rx_mode, rx_buffer_depth=rx_buffer_depth)
         self.comb += [
             tx.source.connect(udp_port.sink),
             udp_port.source.connect(rx.sink)
@@ -215,7 +215,6 @@ class MACCore(PHYCore):
 
         nrxslots = core_config.get("nrxslots", 2)
         ntxslots = core_config.get("ntxslots", 2)
-        mac_memsize = (nrxslots + ntxslots) * buffer_depth
 
         # MAC --------------------------------------------------------------------------------------
         self.submodules.ethmac = LiteEthMAC(
@@ -225,7 +224,9 @@ class MACCore(PHYCore):
             endianness     = core_config["endianness"],
             nrxslots       = nrxslots,
             ntxslots       = ntxslots,
-            full_memory_we = core_config.get("full_memory_we", False))
+            full_memory_we = core_config.get("full_memory_we", False),
+            mtu            = core_config.get("mtu", eth_mtu))
+        mac_memsize = (nrxslots + ntxslots) * self.ethmac.slot_size.constant
         self.add_wb_slave(self.mem_map["ethmac"], self.ethmac.bus)
         self.add_memory_region("ethmac", self.mem_map["ethmac"], mac_memsize, type="io")
         self.add_csr("ethmac")
@@ -250,7 +251,8 @@ class UDPCore(PHYCore):
         self.submodules.core = LiteEthUDPIPCore(self.ethphy,
             mac_address = core_config["mac_address"],
             ip_address  = core_config["ip_address"],
-            clk_freq    = core_config["clk_freq"])
+            clk_freq    = core_config["clk_freq"],
+            mtu         = core_config.get("mtu", eth_mtu))
 
         # UDP --------------------------------------------------------------------------------------
         udp_port = self.core.udp.crossbar.get_port(core_config["port"], 8)
@@ -7,46 +7,87 @@
 from liteeth.common import *
 from liteeth.mac.common import *
 from liteeth.mac.core import LiteEthMACCore
+from liteeth.mac.dma import LiteEthMACDMAInterface
+from liteeth.mac.vlan import LiteEthMACVLANRX, LiteEthMACVLANTX
 from liteeth.mac.wishbone import LiteEthMACWishboneInterface
 
 # MAC ----------------------------------------------------------------------------------------------
 
 class LiteEthMAC(Module, AutoCSR):
     def __init__(self, phy, dw,
-        interface         = "crossbar",
-        endianness        = "big",
-        with_preamble_crc = True,
-        nrxslots          = 2,
-        ntxslots          = 2,
-        hw_mac            = None,
-        timestamp         = None,
-        full_memory_we    = False,
-        with_sim_hack     = False):
-        assert interface in ["crossbar", "wishbone", "hybrid"]
-        self.submodules.core = LiteEthMACCore(phy, dw, endianness, with_preamble_crc, with_sim_hack=with_sim_hack)
+        interface           = "crossbar",
+        endianness          = "big",
+        with_preamble_crc   = True,
+        nrxslots            = 2,
+        ntxslots            = 2,
+        hw_mac              = None,
+        timestamp           = None,
+        full_memory_we      = False,
+        with_sim_hack       = False,
+        mtu                 = eth_mtu,
+        with_pause          = False,
+        with_vlan           = False,
+        rx_mode             = "cut-through",
+        rx_buffer_depth     = None,
+        with_irq_coalescing = False):
+        assert interface in ["crossbar", "wishbone", "hybrid", "dma"]
+        self.submodules.core = LiteEthMACCore(phy, dw, endianness, with_preamble_crc, with_sim_hack=with_sim_hack,
+            with_pause=with_pause, rx_mode=rx_mode, rx_buffer_depth=rx_buffer_depth, mtu=mtu)
         self.csrs = []
         if interface == "crossbar":
-            self.submodules.crossbar     = LiteEthMACCrossbar(dw)
+            self.submodules.crossbar     = LiteEthMACCrossbar(dw, with_vlan=with_vlan, mtu=mtu)
             self.submodules.packetizer   = LiteEthMACPacketizer(dw)
             self.submodules.depacketizer = LiteEthMACDepacketizer(dw)
             self.comb += [
-                self.crossbar.master.source.connect(self.packetizer.sink),
                 self.packetizer.source.connect(self.core.sink),
                 self.core.source.connect(self.depacketizer.sink),
-                self.depacketizer.source.connect(self.crossbar.master.sink)
             ]
-        else:
-            # Wishbone MAC
-            self.rx_slots  = CSRConstant(nrxslots)
-            self.tx_slots  = CSRConstant(ntxslots)
-            self.slot_size = CSRConstant(2**bits_for(eth_mtu))
-            wishbone_interface = LiteEthMACWishboneInterface(
+            if with_vlan:
+                self.submodules.vlan_tx = LiteEthMACVLANTX(dw)
+                self.submodules.vlan_rx = LiteEthMACVLANRX(dw)
+                self.comb += [
+                    self.crossbar.master.source.connect(self.vlan_tx.sink),
+                    self.vlan_tx.source.connect(self.packetizer.sink),
+                    self.depacketizer.source.connect(self.vlan_rx.sink),
+                    self.vlan_rx.source.connect(self.crossbar.master.sink)
+                ]
+            else:
+                self.comb += [
+                    self.crossbar.master.source.connect(self.packetizer.sink),
+                    self.depacketizer.source.connect(self.crossbar.master.sink)
+                ]
+        elif interface == "dma":
+            # DMA MAC (descriptor rings in system memory, bus is a master)
+            assert dw == 32
+            assert not with_vlan
+            self.submodules.interface = LiteEthMACDMAInterface(
                 dw         = 32,
                 nrxslots   = nrxslots,
                 ntxslots   = ntxslots,
                 endianness = endianness,
-                timestamp  = timestamp,
+                mtu        = mtu,
+            )
+            self.rx_slots = CSRConstant(nrxslots)
+            self.tx_slots = CSRConstant(ntxslots)
+            self.ev, self.bus = self.interface.ev, self.interface.bus
+            self.csrs = self.interface.get_csrs() + self.core.get_csrs()
+            self.comb += self.interface.source.connect(self.core.sink)
+            self.comb += self.core.source.connect(self.interface.sink)
+        else:
+            # Wishbone MAC (32-bit in hybrid mode, else the data width of the core: any power of 2
+            # from 32).
+            wishbone_interface = LiteEthMACWishboneInterface(
+                dw                  = 32 if interface == "hybrid" else dw,
+                nrxslots            = nrxslots,
+                ntxslots            = ntxslots,
+                endianness          = endianness,
+                timestamp           = timestamp,
+                mtu                 = mtu,
+                with_irq_coalescing = with_irq_coalescing,
             )
+            self.rx_slots  = CSRConstant(nrxslots)
+            self.tx_slots  = CSRConstant(ntxslots)
+            self.slot_size = CSRConstant(wishbone_interface.slot_size)
             # On some targets (Intel/Altera), the complex ports aren't inferred
             # as block ram, but are created with LUTs.  FullMemoryWe splits such
             # `Memory` instances up into 4 separate memory blocks, each
@@ -62,10 +103,12 @@ class LiteEthMAC(Module, AutoCSR):
             if interface == "hybrid":
                 assert dw == 8
                 # Hardware MAC
-                self.submodules.crossbar     = LiteEthMACCrossbar(dw)
-                self.submodules.mac_crossbar = LiteEthMACCoreCrossbar(self.core, self.crossbar, self.interface, dw, endianness, hw_mac)
+                self.submodules.crossbar     = LiteEthMACCrossbar(dw, with_vlan=with_vlan, mtu=mtu)
+                self.submodules.mac_crossbar = LiteEthMACCoreCrossbar(self.core, self.crossbar, self.interface, dw, endianness, hw_mac,
+                    with_vlan=with_vlan)
             else:
-                assert dw == 32
+                assert dw >= 32 and dw == 2**log2_int(dw, need_pow2=False)
+                assert not with_vlan
                 self.comb += self.interface.source.connect(self.core.sink)
                 self.comb += self.core.source.connect(self.interface.sink)
 
@@ -75,7 +118,7 @@ class LiteEthMAC(Module, AutoCSR):
 # MAC Core Crossbar --------------------------------------------------------------------------------
 
 class LiteEthMACCoreCrossbar(Module):
-    def __init__(self, core, crossbar, interface, dw, endianness, hw_mac=None):
+    def __init__(self, core, crossbar, interface, dw, endianness, hw_mac=None, with_vlan=False):
         rx_ready = Signal()
         rx_valid = Signal()
 
@@ -116,13 +159,29 @@ class LiteEthMACCoreCrossbar(Module):
             # CPU input path
             # rx_pipe -> interface
             self.rx_pipe.source.connect(interface.sink),
-            # HW input path
-            # depacketizer -> crossbar
-            self.depacketizer.source.connect(crossbar.master.sink),
-            # HW output path
-            # crossbar -> packetizer -> tx_fifo
-            crossbar.master.source.connect(self.packetizer.sink),
         ]
+        if with_vlan:
+            self.submodules.vlan_tx = LiteEthMACVLANTX(dw)
+            self.submodules.vlan_rx = LiteEthMACVLANRX(dw)
+            self.comb += [
+                # HW input path
+                # depacketizer -> vlan_rx -> crossbar
+                self.depacketizer.source.connect(self.vlan_rx.sink),
+                self.vlan_rx.source.connect(crossbar.master.sink),
+                # HW output path
+                # crossbar -> vlan_tx -> packetizer -> tx_fifo
+                crossbar.master.source.connect(self.vlan_tx.sink),
+                self.vlan_tx.source.connect(self.packetizer.sink),
+            ]
+        else:
+            self.comb += [
+                # HW input path
+                # depacketizer -> crossbar
+                self.depacketizer.source.connect(crossbar.master.sink),
+                # HW output path
+                # crossbar -> packetizer -> tx_fifo
+                crossbar.master.source.connect(self.packetizer.sink),
+            ]
 
         # MAC filtering
         if hw_mac is not None:
@@ -7,7 +7,7 @@
 from liteeth.common import *
 from liteeth.crossbar import LiteEthCrossbar
 
-from litex.soc.interconnect.packet import Depacketizer, Packetizer
+from liteeth.packet import Depacketizer, Packetizer
 
 # MAC Packetizer/Depacketizer ----------------------------------------------------------------------
 
@@ -46,12 +46,25 @@ class LiteEthMACUserPort(LiteEthMACSlavePort):
 
 
 class LiteEthMACCrossbar(LiteEthCrossbar):
-    def __init__(self, dw=8):
-        LiteEthCrossbar.__init__(self, LiteEthMACMasterPort, "ethernet_type", dw)
+    def __init__(self, dw=8, with_vlan=False, mtu=eth_mtu):
+        self.with_vlan = with_vlan
+        if with_vlan:
+            LiteEthCrossbar.__init__(self, LiteEthMACMasterPort, ("ethernet_type", "vlan_id"), dw, mtu)
+        else:
+            LiteEthCrossbar.__init__(self, LiteEthMACMasterPort, "ethernet_type", dw, mtu)
 
-    def get_port(self, ethernet_type, dw=8):
+    def get_port(self, ethernet_type, dw=8, vlan_id=0, priority=0, weight=1, tx_fifo_depth=None,
+        rx_mode="cut-through", rx_buffer_depth=None):
         port = LiteEthMACUserPort(dw)
-        if ethernet_type in self.users.keys():
+        if self.with_vlan:
+            key = (ethernet_type, vlan_id)
+        else:
+            if vlan_id != 0:
+                raise ValueError("VLAN {} requires VLAN support".format(vlan_id))
+            key = ethernet_type
+        if key in self.users.keys():
+            if vlan_id != 0:
+                raise ValueError("Ethernet type {0:#x} already assigned on VLAN {1}".format(ethernet_type, vlan_id))
             raise ValueError("Ethernet type {0:#x} already assigned".format(ethernet_type))
-        self.users[ethernet_type] = port
+        self.add_port(key, port, priority, weight, tx_fifo_depth, rx_mode, rx_buffer_depth)
         return port
@@ -7,27 +7,32 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from liteeth.common import *
-from liteeth.mac import gap, preamble, crc, padding, last_be
+from liteeth.mac import gap, preamble, crc, padding, pause, last_be
 from liteeth.phy.model import LiteEthPHYModel
+from liteeth.packet import StoreAndForwardBuffer
 
-from migen.genlib.cdc import PulseSynchronizer
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
 
 from litex.soc.interconnect.stream import BufferizeEndpoints, DIR_SOURCE, DIR_SINK
 
 # MAC Core -----------------------------------------------------------------------------------------
 
 class LiteEthMACCore(Module, AutoCSR):
-    def __init__(self, phy, dw, endianness="big", with_preamble_crc=True, with_padding=True, with_sim_hack=False):
+    def __init__(self, phy, dw, endianness="big", with_preamble_crc=True, with_padding=True, with_sim_hack=False,
+        with_pause=False, pause_fifo_depth=None, rx_mode="cut-through", rx_buffer_depth=None, mtu=eth_mtu):
         if dw < phy.dw:
             raise ValueError("Core data width({}) must be larger than PHY data width({})".format(dw, phy.dw))
+        if rx_mode not in ["cut-through", "store-and-forward"]:
+            raise ValueError("Unsupported RX mode: {}".format(rx_mode))
 
         rx_pipeline = [phy]
         tx_pipeline = [phy]
 
-        # Interpacket gap
-        tx_gap_inserter = gap.LiteEthMACGap(phy.dw)
-        self.submodules += ClockDomainsRenamer("eth_tx")(tx_gap_inserter)
-        tx_pipeline += [tx_gap_inserter]
+        # Interpacket gap (unless generated by the PHY)
+        if not getattr(phy, "integrated_ifg_inserter", False):
+            tx_gap_inserter = gap.LiteEthMACGap(phy.dw)
+            self.submodules += ClockDomainsRenamer("eth_tx")(tx_gap_inserter)
+            tx_pipeline += [tx_gap_inserter]
 
         # Preamble / CRC
         if isinstance(phy, LiteEthPHYModel):
@@ -70,13 +75,55 @@ class LiteEthMACCore(Module, AutoCSR):
 
         # Padding
         if with_padding:
+            # In simulation, frames from the Ethernet tap are not padded: don't drop runts.
+            rx_min_length = 0 if isinstance(phy, LiteEthPHYModel) else 60
+            self.runt_errors = CSRStatus(32)
+
             padding_inserter = padding.LiteEthMACPaddingInserter(phy.dw, 60)
-            padding_checker  = padding.LiteEthMACPaddingChecker(phy.dw, 60)
+            padding_checker  = padding.LiteEthMACPaddingChecker(phy.dw, rx_min_length)
             self.submodules += ClockDomainsRenamer("eth_tx")(padding_inserter)
             self.submodules += ClockDomainsRenamer("eth_rx")(padding_checker)
             tx_pipeline += [padding_inserter]
             rx_pipeline += [padding_checker]
 
+            # Runt counter
+            self.submodules.ps_runt_error = PulseSynchronizer("eth_rx", "sys")
+            self.comb += self.ps_runt_error.i.eq(padding_checker.error)
+            self.sync += If(self.ps_runt_error.o,
+                self.runt_errors.status.eq(self.runt_errors.status + 1))
+
+        # Flow control (PAUSE)
+        if with_pause:
+            if pause_fifo_depth is None:
+                pause_fifo_depth = 2*2**log2_int(mtu, need_pow2=False)//(dw//8)
+            self.pause_mac_address = CSRStorage(48, description="Source MAC Address of the emitted PAUSE frames.")
+            self.pause_quanta      = CSRStorage(16, reset=0xffff, description="Pause time of the emitted PAUSE frames (in quanta of 512 bit times).")
+            self.pause_watermark   = CSRStorage(bits_for(pause_fifo_depth), reset=pause_fifo_depth//2,
+                description="RX FIFO level (in words) above which PAUSE frames are emitted.")
+
+            pause_tx = pause.LiteEthMACPauseTX(phy.dw)
+            pause_rx = pause.LiteEthMACPauseRX(phy.dw)
+            self.submodules.pause_tx = ClockDomainsRenamer("eth_tx")(pause_tx)
+            self.submodules.pause_rx = ClockDomainsRenamer("eth_rx")(pause_rx)
+            tx_pipeline += [pause_tx]
+            rx_pipeline += [pause_rx]
+
+            # Honoring (RX -> TX)
+            self.submodules.ps_pause = PulseSynchronizer("eth_rx", "eth_tx")
+            self.comb += [
+                self.ps_pause.i.eq(pause_rx.pause),
+                pause_tx.pause.eq(self.ps_pause.o),
+            ]
+            self.specials += MultiReg(pause_rx.quanta, pause_tx.quanta, "eth_tx")
+
+            # Generation (RX FIFO watermark -> TX)
+            pause_xoff = Signal()
+            self.specials += [
+                MultiReg(pause_xoff, pause_tx.xoff, "eth_tx"),
+                MultiReg(self.pause_quanta.storage, pause_tx.tx_quanta, "eth_tx"),
+                MultiReg(self.pause_mac_address.storage, pause_tx.mac_address, "eth_tx"),
+            ]
+
         # Delimiters
         if dw != 8:
             tx_last_be = last_be.LiteEthMACTXLastBE(phy.dw)
@@ -110,6 +157,23 @@ class LiteEthMACCore(Module, AutoCSR):
         tx_pipeline += [tx_cdc]
         rx_pipeline += [rx_cdc]
 
+        # RX Store and Forward (frames are forwarded once received and checked, frames with errors
+        # are dropped). In cut-through mode, frames are forwarded as received and errors are only
+        # reported on their last word.
+        if rx_mode == "store-and-forward":
+            if rx_buffer_depth is None:
+                rx_buffer_depth = 2*2**log2_int(mtu, need_pow2=False)//(dw//8)
+            rx_buffer = StoreAndForwardBuffer(eth_phy_description(dw), rx_buffer_depth)
+            self.submodules += rx_buffer
+            rx_pipeline += [rx_buffer]
+
+        # RX FIFO (absorbs the frames received until the link partner honors the PAUSE frames)
+        if with_pause:
+            rx_fifo = stream.SyncFIFO(eth_phy_description(dw), pause_fifo_depth, buffered=True)
+            self.submodules += rx_fifo
+            rx_pipeline += [rx_fifo]
+            self.comb += pause_xoff.eq(rx_fifo.level >= self.pause_watermark.storage)
+
         # Graph
         self.submodules.tx_pipeline = stream.Pipeline(*reversed(tx_pipeline))
         self.submodules.rx_pipeline = stream.Pipeline(*rx_pipeline)
@@ -95,6 +95,9 @@ class LiteEthMACCRC32(Module):
 
     Implement an IEEE 802.3 CRC generator/checker.
 
+    With data widths > 8-bit, an engine is generated for each possible number of valid bytes in the
+    last word and the next CRC value is selected with last_be.
+
     Parameters
     ----------
     data_width : int
@@ -104,8 +107,12 @@ class LiteEthMACCRC32(Module):
     ----------
     d : in
         Data input.
+    last_be : in
+        Last valid byte of the data input (one-hot, 0 for a full word).
     value : out
         CRC value (used for generator).
+    next_value : out
+        CRC value including the data input (used for generator).
     error : out
         CRC error (used for checker).
     """
@@ -114,21 +121,34 @@ class LiteEthMACCRC32(Module):
     init    = 2**width-1
     check   = 0xC704DD7B
     def __init__(self, data_width):
-        self.data  = Signal(data_width)
-        self.value = Signal(self.width)
-        self.error = Signal()
+        self.data       = Signal(data_width)
+        self.last_be    = Signal(data_width//8)
+        self.value      = Signal(self.width)
+        self.next_value = Signal(self.width)
+        self.error      = Signal()
 
         # # #
 
         self.submodules.engine = LiteEthMACCRCEngine(data_width, self.width, self.polynom)
-        reg = Signal(self.width, reset=self.init)
-        self.sync += reg.eq(self.engine.next)
+        engines = [LiteEthMACCRCEngine(8*(n + 1), self.width, self.polynom) for n in range(data_width//8 - 1)]
+        self.submodules += engines
+        engines.append(self.engine)
+
+        reg  = Signal(self.width, reset=self.init)
+        next = Signal(self.width)
+        self.comb += next.eq(self.engine.next)
+        for n, engine in enumerate(engines):
+            self.comb += [
+                engine.data.eq(self.data),
+                engine.last.eq(reg),
+            ]
+            if engine is not self.engine:
+                self.comb += If(self.last_be[n], next.eq(engine.next))
+        self.sync += reg.eq(next)
         self.comb += [
-            self.engine.data.eq(self.data),
-            self.engine.last.eq(reg),
-
             self.value.eq(~reg[::-1]),
-            self.error.eq(self.engine.next != self.check)
+            self.next_value.eq(~next[::-1]),
+            self.error.eq(next != self.check)
         ]
 
 # MAC CRC Inserter ---------------------------------------------------------------------------------
@@ -138,6 +158,9 @@ class LiteEthMACCRCInserter(Module):
 
     Append a CRC at the end of each packet.
 
+    With data widths > 8-bit, the CRC is appended right after the last valid byte (given by
+    last_be) and can end in an extra word.
+
     Parameters
     ----------
     description : description
@@ -161,6 +184,25 @@ class LiteEthMACCRCInserter(Module):
         fsm = FSM(reset_state="IDLE")
         self.submodules += crc, fsm
 
+        bytes_per_clk = dw//8
+        tail_bytes    = bytes_per_clk + crc.width//8
+        last_be       = Array([2**i for i in range(bytes_per_clk)])
+
+        # Tail: last valid bytes of the packet followed by the CRC.
+        last_lane  = Signal(max=max(bytes_per_clk, 2))
+        tail       = Signal(8*tail_bytes)
+        tail_len   = Signal(max=tail_bytes + 1)
+        tail_d     = Signal(8*tail_bytes)
+        tail_d_len = Signal(max=tail_bytes + 1)
+        self.comb += last_lane.eq(bytes_per_clk - 1)
+        for i in range(bytes_per_clk):
+            self.comb += If(sink.last_be[i], last_lane.eq(i))
+        self.comb += [
+            Case(last_lane, {n: tail.eq(Cat(sink.data[:8*(n + 1)], crc.next_value))
+                for n in range(bytes_per_clk)}),
+            tail_len.eq(last_lane + 1 + crc.width//8),
+        ]
+
         fsm.act("IDLE",
             crc.reset.eq(1),
             sink.ready.eq(1),
@@ -174,36 +216,40 @@ class LiteEthMACCRCInserter(Module):
             crc.data.eq(sink.data),
             sink.connect(source),
             source.last.eq(0),
-            If(sink.valid & sink.last & source.ready,
-                NextState("CRC"),
-            )
-        )
-        ratio = crc.width//dw
-        if ratio > 1:
-            cnt = Signal(max=ratio, reset=ratio-1)
-            cnt_done = Signal()
-            fsm.act("CRC",
-                source.valid.eq(1),
-                chooser(crc.value, cnt, source.data, reverse=True),
-                If(cnt_done,
+            source.last_be.eq(0),
+            If(sink.last,
+                crc.last_be.eq(sink.last_be),
+                source.data.eq(tail[:dw]),
+                If(tail_len <= bytes_per_clk,
                     source.last.eq(1),
-                    If(source.ready, NextState("IDLE"))
+                    source.last_be.eq(last_be[tail_len - 1])
                 )
-            )
-            self.comb += cnt_done.eq(cnt == 0)
-            self.sync += \
-                If(fsm.ongoing("IDLE"),
-                    cnt.eq(cnt.reset)
-                ).Elif(fsm.ongoing("CRC") & ~cnt_done,
-                    cnt.eq(cnt - source.ready)
+            ),
+            If(sink.valid & sink.last & source.ready,
+                NextValue(tail_d, tail[dw:]),
+                NextValue(tail_d_len, tail_len - bytes_per_clk),
+                If(tail_len <= bytes_per_clk,
+                    NextState("IDLE")
+                ).Else(
+                    NextState("CRC")
                 )
-        else:
-            fsm.act("CRC",
-                source.valid.eq(1),
+            )
+        )
+        fsm.act("CRC",
+            source.valid.eq(1),
+            source.data.eq(tail_d[:dw]),
+            If(tail_d_len <= bytes_per_clk,
                 source.last.eq(1),
-                source.data.eq(crc.value),
-                If(source.ready, NextState("IDLE"))
+                source.last_be.eq(last_be[tail_d_len - 1])
+            ),
+            If(source.ready,
+                NextValue(tail_d, tail_d[dw:]),
+                NextValue(tail_d_len, tail_d_len - bytes_per_clk),
+                If(tail_d_len <= bytes_per_clk,
+                    NextState("IDLE")
+                )
             )
+        )
 
 
 class LiteEthMACCRC32Inserter(LiteEthMACCRCInserter):
@@ -217,6 +263,8 @@ class LiteEthMACCRCChecker(Module):
 
     Check CRC at the end of each packet.
 
+    With data widths > 8-bit, last_be is adjusted to end the packet before the CRC.
+
     Parameters
     ----------
     description : description
@@ -245,54 +293,127 @@ class LiteEthMACCRCChecker(Module):
         self.submodules += crc
         ratio = crc.width//dw
 
-        fifo = ResetInserter()(stream.SyncFIFO(description, ratio + 1))
-        self.submodules += fifo
-
-        fsm = FSM(reset_state="RESET")
-        self.submodules += fsm
-
-        fifo_in   = Signal()
-        fifo_out  = Signal()
-        fifo_full = Signal()
-
         self.comb += [
-            fifo_full.eq(fifo.level == ratio),
-            fifo_in.eq(sink.valid & (~fifo_full | fifo_out)),
-            fifo_out.eq(source.valid & source.ready),
-
-            sink.connect(fifo.sink),
-            fifo.sink.valid.eq(fifo_in),
-            self.sink.ready.eq(fifo_in),
-
-            source.valid.eq(sink.valid & fifo_full),
-            source.last.eq(sink.last),
-            fifo.source.ready.eq(fifo_out),
-            source.payload.eq(fifo.source.payload),
-
-            source.error.eq(sink.error | crc.error),
-            self.error.eq(source.valid & source.last & crc.error),
+            crc.data.eq(sink.data),
+            If(sink.last, crc.last_be.eq(sink.last_be)),
         ]
 
-        fsm.act("RESET",
-            crc.reset.eq(1),
-            fifo.reset.eq(1),
-            NextState("IDLE"),
-        )
-        self.comb += crc.data.eq(sink.data)
-        fsm.act("IDLE",
-            If(sink.valid & sink.ready,
-                crc.ce.eq(1),
-                NextState("COPY")
-            )
-        )
-        fsm.act("COPY",
-            If(sink.valid & sink.ready,
-                crc.ce.eq(1),
+        # Data width <= CRC width: delay the packet by the CRC length (the last byte of the packet is
+        # then on the last_be lane of the word that is output with the last CRC word).
+        if ratio >= 1:
+            fifo = ResetInserter()(stream.SyncFIFO(description, ratio + 1))
+            self.submodules += fifo
+
+            fifo_in   = Signal()
+            fifo_out  = Signal()
+            fifo_full = Signal()
+
+            self.comb += [
+                fifo_full.eq(fifo.level == ratio),
+                fifo_in.eq(sink.valid & (~fifo_full | fifo_out)),
+                fifo_out.eq(source.valid & source.ready),
+
+                sink.connect(fifo.sink),
+                fifo.sink.valid.eq(fifo_in),
+                self.sink.ready.eq(fifo_in),
+
+                source.valid.eq(sink.valid & fifo_full),
+                source.last.eq(sink.last),
+                fifo.source.ready.eq(fifo_out),
+                source.payload.eq(fifo.source.payload),
+                source.last_be.eq(Mux(sink.last, sink.last_be, 0)),
+
+                source.error.eq(sink.error | Replicate(crc.error, dw//8)),
+                self.error.eq(source.valid & source.last & crc.error),
+            ]
+
+            # Reset on last (without idle cycle, to accept back-to-back packets).
+            self.comb += [
+                crc.ce.eq(sink.valid & sink.ready),
+                If(sink.valid & sink.ready & sink.last,
+                    crc.reset.eq(1),
+                    fifo.reset.eq(1)
+                )
+            ]
+
+        # Data width > CRC width: delay the packet by a word, the packet ends in the previous word or
+        # in the last word.
+        else:
+            bytes_per_clk = dw//8
+            crc_bytes     = crc.width//8
+            last_be       = Array([2**i for i in range(bytes_per_clk)])
+
+            last_lane = Signal(max=bytes_per_clk)
+            self.comb += last_lane.eq(bytes_per_clk - 1)
+            for i in range(bytes_per_clk):
+                self.comb += If(sink.last_be[i], last_lane.eq(i))
+
+            data_d      = Signal(dw)
+            error_d     = Signal(bytes_per_clk)
+            crc_error_d = Signal()
+            last_lane_d = Signal(max=bytes_per_clk)
+
+            self.comb += [
+                crc.ce.eq(sink.valid & sink.ready),
+                crc.reset.eq(sink.valid & sink.ready & sink.last),
+                source.data.eq(data_d),
+            ]
+            self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+            fsm_idle = [
+                sink.ready.eq(1),
+                If(sink.valid,
+                    NextValue(data_d, sink.data),
+                    If(~sink.last,
+                        NextState("COPY")
+                    # Packet ends in the first word.
+                    ).Elif(last_lane >= crc_bytes,
+                        NextValue(last_lane_d, last_lane - crc_bytes),
+                        NextValue(error_d, sink.error),
+                        NextValue(crc_error_d, crc.error),
+                        NextState("LAST")
+                    )
+                )
+            ]
+            fsm.act("IDLE", *fsm_idle)
+            fsm.act("COPY",
+                source.valid.eq(sink.valid),
+                sink.ready.eq(source.ready),
                 If(sink.last,
-                    NextState("RESET")
+                    # Packet ends in the previous word.
+                    If(last_lane < crc_bytes,
+                        source.last.eq(1),
+                        source.last_be.eq(last_be[last_lane + bytes_per_clk - crc_bytes]),
+                        source.error.eq(sink.error | Replicate(crc.error, bytes_per_clk)),
+                        self.error.eq(sink.valid & source.ready & crc.error)
+                    )
+                ),
+                If(sink.valid & sink.ready,
+                    NextValue(data_d, sink.data),
+                    If(sink.last,
+                        If(last_lane < crc_bytes,
+                            NextState("IDLE")
+                        # Packet ends in the last word.
+                        ).Else(
+                            NextValue(last_lane_d, last_lane - crc_bytes),
+                            NextValue(error_d, sink.error),
+                            NextValue(crc_error_d, crc.error),
+                            NextState("LAST")
+                        )
+                    )
+                )
+            )
+            fsm.act("LAST",
+                source.valid.eq(1),
+                source.last.eq(1),
+                source.last_be.eq(last_be[last_lane_d]),
+                source.error.eq(error_d | Replicate(crc_error_d, bytes_per_clk)),
+                # Output is taken from data_d: start receiving the next packet.
+                If(source.ready,
+                    self.error.eq(crc_error_d),
+                    NextState("IDLE"),
+                    *fsm_idle
                 )
             )
-        )
 
 
 class LiteEthMACCRC32Checker(LiteEthMACCRCChecker):
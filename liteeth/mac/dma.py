@@ -0,0 +1,293 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import math
+
+from liteeth.common import *
+from liteeth.packet import StoreAndForwardBuffer
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
+
+# Descriptors are 2 words in system memory: the buffer address (in bytes, word aligned) and the
+# frame length (in bytes). Rings are nslots descriptors at base (in bytes, word aligned).
+
+# MAC DMA Writer -----------------------------------------------------------------------------------
+
+class LiteEthMACDMAWriter(Module, AutoCSR):
+    """MAC DMA Writer
+
+    Writes the received frames to the buffers of the RX descriptor ring and writes back their
+    length. The descriptors from head (hardware) up to tail (software) are owned by the hardware:
+    head is incremented after each frame and frames are dropped when head == tail.
+
+    Frames are buffered before being written: frames with an error are dropped and the buffers
+    must be able to hold mtu bytes. Frames larger than mtu bytes are dropped (and counted in
+    errors) once mtu bytes have been written: nothing is written past mtu bytes.
+    """
+    def __init__(self, dw, nslots=2, endianness="big", mtu=eth_mtu):
+        assert dw == 32
+        assert nslots >= 2
+        self.sink = sink = stream.Endpoint(eth_phy_description(dw))
+        self.bus  = bus  = wishbone.Interface(data_width=dw)
+
+        indexbits = log2_int(nslots)
+
+        self._base   = CSRStorage(32)
+        self._head   = CSRStatus(indexbits)
+        self._tail   = CSRStorage(indexbits)
+        self._errors = CSRStatus(32)
+
+        self.submodules.ev = EventManager()
+        self.ev.available  = EventSourcePulse()
+        self.ev.finalize()
+
+        # # #
+
+        # Frame Buffer.
+        buffer = StoreAndForwardBuffer(eth_phy_description(dw), 2*math.ceil(mtu/(dw//8)))
+        self.submodules.buffer = buffer
+        self.comb += sink.connect(buffer.sink)
+        source = buffer.source
+
+        # Length computation (and byte selection of the last word).
+        inc      = Signal(3)
+        last_sel = Signal(4)
+        if endianness == "big":
+            self.comb += Case(source.last_be, {
+                0b1000    : [inc.eq(1), last_sel.eq(0b1000)],
+                0b0100    : [inc.eq(2), last_sel.eq(0b1100)],
+                0b0010    : [inc.eq(3), last_sel.eq(0b1110)],
+                "default" : [inc.eq(4), last_sel.eq(0b1111)]
+            })
+        else:
+            self.comb += Case(source.last_be, {
+                0b0001    : [inc.eq(1), last_sel.eq(0b0001)],
+                0b0010    : [inc.eq(2), last_sel.eq(0b0011)],
+                0b0100    : [inc.eq(3), last_sel.eq(0b0111)],
+                "default" : [inc.eq(4), last_sel.eq(0b1111)]
+            })
+
+        # Descriptor/Buffer addressing.
+        head       = Signal(indexbits)
+        descriptor = Signal(30)
+        address    = Signal(30)
+        offset     = Signal(30)
+        length     = Signal(32)
+        self.comb += [
+            self._head.status.eq(head),
+            descriptor.eq(self._base.storage[2:] + 2*head),
+        ]
+
+        # FSM
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            NextValue(offset, 0),
+            NextValue(length, 0),
+            If(source.valid,
+                If(head == self._tail.storage,
+                    NextValue(self._errors.status, self._errors.status + 1),
+                    NextState("DISCARD")
+                ).Else(
+                    NextState("READ-DESCRIPTOR")
+                )
+            )
+        )
+        fsm.act("READ-DESCRIPTOR",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(0xf),
+            bus.adr.eq(descriptor),
+            If(bus.ack,
+                NextValue(address, bus.dat_r[2:]),
+                NextState("WRITE")
+            )
+        )
+        fsm.act("WRITE",
+            # Frames larger than mtu bytes don't fit in the buffer: stop and drop them.
+            If(source.valid & ((length + Mux(source.last, inc, 4)) > mtu),
+                NextValue(self._errors.status, self._errors.status + 1),
+                NextState("DISCARD")
+            ).Else(
+                bus.stb.eq(source.valid),
+                bus.cyc.eq(source.valid),
+                bus.we.eq(1),
+                bus.sel.eq(Mux(source.last, last_sel, 0xf)),
+                bus.adr.eq(address + offset),
+                bus.dat_w.eq(source.data),
+                source.ready.eq(bus.ack),
+                If(source.valid & bus.ack,
+                    NextValue(offset, offset + 1),
+                    NextValue(length, length + Mux(source.last, inc, 4)),
+                    If(source.last,
+                        NextState("WRITE-LENGTH")
+                    )
+                )
+            )
+        )
+        fsm.act("WRITE-LENGTH",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(1),
+            bus.sel.eq(0xf),
+            bus.adr.eq(descriptor + 1),
+            bus.dat_w.eq(length),
+            If(bus.ack,
+                self.ev.available.trigger.eq(1),
+                NextValue(head, head + 1),
+                NextState("IDLE")
+            )
+        )
+        fsm.act("DISCARD",
+            source.ready.eq(1),
+            If(source.valid & source.last,
+                NextState("IDLE")
+            )
+        )
+
+# MAC DMA Reader -----------------------------------------------------------------------------------
+
+class LiteEthMACDMAReader(Module, AutoCSR):
+    """MAC DMA Reader
+
+    Reads the frames to transmit from the buffers of the TX descriptor ring. The descriptors from
+    head (hardware) up to tail (software) are owned by the hardware: head is incremented once the
+    frame has been read (and the buffer can be reused).
+
+    Frames are buffered before being transmitted (no underflow on bus latency): frames larger than
+    mtu bytes are dropped.
+    """
+    def __init__(self, dw, nslots=2, endianness="big", mtu=eth_mtu):
+        assert dw == 32
+        assert nslots >= 2
+        self.source = source = stream.Endpoint(eth_phy_description(dw))
+        self.bus    = bus    = wishbone.Interface(data_width=dw)
+
+        indexbits = log2_int(nslots)
+
+        self._base = CSRStorage(32)
+        self._head = CSRStatus(indexbits)
+        self._tail = CSRStorage(indexbits)
+
+        self.submodules.ev = EventManager()
+        self.ev.done       = EventSourcePulse()
+        self.ev.finalize()
+
+        # # #
+
+        # Frame Buffer.
+        buffer = StoreAndForwardBuffer(eth_phy_description(dw), 2*math.ceil(mtu/(dw//8)))
+        self.submodules.buffer = buffer
+        self.comb += buffer.source.connect(source)
+        sink = buffer.sink
+
+        # Descriptor/Buffer addressing.
+        head       = Signal(indexbits)
+        descriptor = Signal(30)
+        address    = Signal(30)
+        length     = Signal(16)
+        counter    = Signal(16)
+        self.comb += [
+            self._head.status.eq(head),
+            descriptor.eq(self._base.storage[2:] + 2*head),
+        ]
+
+        length_lsb = length[0:2]
+        if endianness == "big":
+            self.comb += If(sink.last,
+                Case(length_lsb, {
+                    0 : sink.last_be.eq(0b0001),
+                    1 : sink.last_be.eq(0b1000),
+                    2 : sink.last_be.eq(0b0100),
+                    3 : sink.last_be.eq(0b0010)
+                }))
+        else:
+            self.comb += If(sink.last,
+                Case(length_lsb, {
+                    0 : sink.last_be.eq(0b1000),
+                    1 : sink.last_be.eq(0b0001),
+                    2 : sink.last_be.eq(0b0010),
+                    3 : sink.last_be.eq(0b0100)
+                }))
+
+        # FSM
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            NextValue(counter, 0),
+            If(head != self._tail.storage,
+                NextState("READ-ADDRESS")
+            )
+        )
+        fsm.act("READ-ADDRESS",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(0xf),
+            bus.adr.eq(descriptor),
+            If(bus.ack,
+                NextValue(address, bus.dat_r[2:]),
+                NextState("READ-LENGTH")
+            )
+        )
+        fsm.act("READ-LENGTH",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(0xf),
+            bus.adr.eq(descriptor + 1),
+            If(bus.ack,
+                NextValue(length, bus.dat_r),
+                NextState("READ")
+            )
+        )
+        fsm.act("READ",
+            bus.stb.eq(sink.ready),
+            bus.cyc.eq(sink.ready),
+            bus.we.eq(0),
+            bus.sel.eq(0xf),
+            bus.adr.eq(address + counter[2:]),
+            sink.valid.eq(bus.ack),
+            sink.last.eq(counter >= (length - 4)),
+            sink.data.eq(bus.dat_r),
+            If(sink.valid & sink.ready,
+                NextValue(counter, counter + 4),
+                If(sink.last,
+                    self.ev.done.trigger.eq(1),
+                    NextValue(head, head + 1),
+                    NextState("IDLE")
+                )
+            )
+        )
+
+# MAC DMA Interface --------------------------------------------------------------------------------
+
+class LiteEthMACDMAInterface(Module, AutoCSR):
+    """MAC DMA Interface
+
+    Bus mastering alternative to the Wishbone SRAM slots: frames are directly written to/read from
+    the driver's buffers in system memory through RX/TX descriptor rings of nrxslots/ntxslots
+    descriptors (powers of 2).
+
+    Attributes
+    ----------
+    bus : out
+        Wishbone bus master (to be connected to the system memory).
+    """
+    def __init__(self, dw, nrxslots=2, ntxslots=2, endianness="big", mtu=eth_mtu):
+        self.sink   = stream.Endpoint(eth_phy_description(dw))
+        self.source = stream.Endpoint(eth_phy_description(dw))
+        self.bus    = wishbone.Interface(data_width=dw)
+
+        # # #
+
+        self.submodules.writer  = LiteEthMACDMAWriter(dw, nrxslots, endianness, mtu)
+        self.submodules.reader  = LiteEthMACDMAReader(dw, ntxslots, endianness, mtu)
+        self.submodules.ev      = SharedIRQ(self.writer.ev, self.reader.ev)
+        self.submodules.arbiter = wishbone.Arbiter([self.writer.bus, self.reader.bus], self.bus)
+        self.comb += self.sink.connect(self.writer.sink)
+        self.comb += self.reader.source.connect(self.source)
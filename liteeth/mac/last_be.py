@@ -19,11 +19,11 @@ class LiteEthMACTXLastBE(Module):
 
         self.submodules.fsm = fsm = FSM(reset_state="COPY")
         fsm.act("COPY",
-            sink.connect(source, omit={"last", "last_be"}),
-            source.last.eq(sink.last_be),
+            sink.connect(source, omit={"last"}),
+            source.last.eq(sink.last_be != 0),
             If(sink.valid & sink.ready,
                 # If last Byte but not last packet token.
-                If(sink.last_be & ~sink.last,
+                If((sink.last_be != 0) & ~sink.last,
                     NextState("WAIT-LAST")
                 )
             )
@@ -45,7 +45,7 @@ class LiteEthMACRXLastBE(Module):
 
         # # #
 
-        self.comb += [
-            sink.connect(source),
-            source.last_be.eq(sink.last)
-        ]
+        self.comb += sink.connect(source)
+        # With dw > 8, last_be is provided by the PHY/preamble checker.
+        if dw == 8:
+            self.comb += source.last_be.eq(sink.last)
@@ -19,12 +19,17 @@ class LiteEthMACPaddingInserter(Module):
 
         # # #
 
-        padding_limit = math.ceil(padding/(dw/8))-1
+        padding_limit   = math.ceil(padding/(dw/8))-1
+        padding_last_be = 2**((padding - 1)%(dw//8))
 
         counter      = Signal(16)
         counter_done = Signal()
         self.comb += counter_done.eq(counter >= padding_limit)
 
+        # Last word ending before the minimum length (last_be is one-hot, 0 means a full word).
+        sink_last_short = Signal()
+        self.comb += sink_last_short.eq((sink.last_be != 0) & (sink.last_be < padding_last_be))
+
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
             sink.connect(source),
@@ -33,8 +38,14 @@ class LiteEthMACPaddingInserter(Module):
                 If(sink.last,
                     If(~counter_done,
                         source.last.eq(0),
+                        source.last_be.eq(0),
                         NextState("PADDING")
                     ).Else(
+                        If(counter == padding_limit,
+                            If(sink_last_short,
+                                source.last_be.eq(padding_last_be)
+                            )
+                        ),
                         NextValue(counter, 0),
                     )
                 )
@@ -43,6 +54,7 @@ class LiteEthMACPaddingInserter(Module):
         fsm.act("PADDING",
             source.valid.eq(1),
             source.last.eq(counter_done),
+            source.last_be.eq(Mux(counter_done, padding_last_be, 0)),
             source.data.eq(0),
             If(source.valid & source.ready,
                 NextValue(counter, counter + 1),
@@ -57,13 +69,75 @@ class LiteEthMACPaddingInserter(Module):
 # MAC Padding Checker ------------------------------------------------------------------------------
 
 class LiteEthMACPaddingChecker(Module):
+    """MAC Padding Checker
+
+    Drops runt frames (frames shorter than packet_min_length). Frames are delayed until their
+    packet_min_length first bytes have been received: the frame is then known to be valid and is
+    forwarded, or ends before and is discarded. The delay is ceil(packet_min_length/(dw/8)) words,
+    the next frames are received while the current one is forwarded.
+
+    Attributes
+    ----------
+    error : out
+        Pulses every time a runt frame is dropped.
+    """
     def __init__(self, dw, packet_min_length):
         self.sink   = sink   = stream.Endpoint(eth_phy_description(dw))
         self.source = source = stream.Endpoint(eth_phy_description(dw))
 
+        self.error = Signal()
+
         # # #
 
-        # TODO: see if we should drop the packet when
-        # payload size < minimum ethernet payload size
-        self.comb += sink.connect(source)
+        if packet_min_length == 0:
+            self.comb += sink.connect(source)
+            return
+
+        bytes_per_clk = dw//8
+        min_words     = math.ceil(packet_min_length/bytes_per_clk)
+
+        # Data FIFO (delays the frames) and verdict FIFO (one entry per frame).
+        data_fifo    = stream.SyncFIFO(eth_phy_description(dw), min_words + 2, buffered=True)
+        verdict_fifo = stream.SyncFIFO([("runt", 1)], min_words + 2)
+        self.submodules += data_fifo, verdict_fifo
+
+        # Length measurement (up to the packet_min_length first bytes).
+        count  = Signal(max=min_words + 1)
+        length = Signal(max=(min_words + 1)*bytes_per_clk)
+        inc    = Signal(max=bytes_per_clk + 1)
+        self.comb += inc.eq(bytes_per_clk)
+        for i in range(bytes_per_clk):
+            self.comb += If(sink.last_be[i], inc.eq(i + 1))
+        self.comb += length.eq(count*bytes_per_clk + inc)
+        self.sync += [
+            If(sink.valid & sink.ready,
+                If(sink.last,
+                    count.eq(0)
+                ).Elif(count != min_words,
+                    count.eq(count + 1)
+                )
+            )
+        ]
+
+        # Input: the verdict is known on the last word or on the min_words-th word.
+        self.comb += [
+            sink.connect(data_fifo.sink, omit={"valid", "ready"}),
+            data_fifo.sink.valid.eq(sink.valid & verdict_fifo.sink.ready),
+            sink.ready.eq(data_fifo.sink.ready & verdict_fifo.sink.ready),
+            verdict_fifo.sink.runt.eq(sink.last & (length < packet_min_length)),
+            If(sink.valid & sink.ready & (count != min_words),
+                If(sink.last | (count == (min_words - 1)),
+                    verdict_fifo.sink.valid.eq(1)
+                )
+            )
+        ]
 
+        # Output: forward valid frames, discard runt frames.
+        runt = verdict_fifo.source.runt
+        self.comb += [
+            data_fifo.source.connect(source, omit={"valid", "ready"}),
+            source.valid.eq(data_fifo.source.valid & verdict_fifo.source.valid & ~runt),
+            data_fifo.source.ready.eq(verdict_fifo.source.valid & (source.ready | runt)),
+            verdict_fifo.source.ready.eq(data_fifo.source.valid & data_fifo.source.ready & data_fifo.source.last),
+            self.error.eq(verdict_fifo.source.valid & verdict_fifo.source.ready & runt),
+        ]
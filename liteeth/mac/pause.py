@@ -0,0 +1,253 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import math
+
+from liteeth.common import *
+
+# MAC PAUSE Constants ------------------------------------------------------------------------------
+
+mac_pause_address = 0x0180c2000001 # Reserved multicast address of MAC Control PAUSE frames.
+mac_pause_opcode  = 0x0001
+mac_pause_length  = 18             # Destination/Source MACs, Ethernet Type, Opcode, Quanta.
+mac_pause_quanta  = 512            # Pause quanta in bit times.
+
+def _bytes(value, n):
+    # Big endian (network order) bytes of value.
+    return [value[8*(n-1-i):8*(n-i)] for i in range(n)]
+
+# MAC PAUSE RX -------------------------------------------------------------------------------------
+
+class LiteEthMACPauseRX(Module):
+    """MAC PAUSE RX
+
+    Detects MAC Control PAUSE frames (802.3x) in the received stream and drops them: frames are
+    delayed by the length of the PAUSE header (in words) and only forwarded once their header has
+    been checked.
+
+    Attributes
+    ----------
+    pause : out
+        Pulses when a valid PAUSE frame has been received.
+    quanta : out
+        Pause time of the last PAUSE frame received (in quanta of 512 bit times).
+    """
+    def __init__(self, dw):
+        self.sink   = sink   = stream.Endpoint(eth_phy_description(dw))
+        self.source = source = stream.Endpoint(eth_phy_description(dw))
+
+        self.pause  = Signal()
+        self.quanta = Signal(16)
+
+        # # #
+
+        bytes_per_clk = dw//8
+        header_words  = math.ceil(mac_pause_length/bytes_per_clk)
+
+        # Header capture (kept until the first word of the next frame).
+        start  = Signal(reset=1)
+        count  = Signal(max=header_words + 1)
+        header = Array(Signal(dw) for i in range(header_words))
+        self.sync += [
+            If(sink.valid & sink.ready,
+                start.eq(sink.last),
+                If(start,
+                    header[0].eq(sink.data),
+                    count.eq(1)
+                ).Elif(count != header_words,
+                    header[count].eq(sink.data),
+                    count.eq(count + 1)
+                )
+            )
+        ]
+        header_bytes = [word[8*i:8*(i+1)] for word in header for i in range(bytes_per_clk)]
+        def field(offset, n):
+            return Cat(*reversed(header_bytes[offset:offset+n]))
+
+        # Delay line (header_words words, line[0] is the output): shifted on each received word and
+        # flushed when the last word of a frame is in the line (the PHY stream can't wait for the
+        # next frame).
+        line  = [stream.Endpoint(eth_phy_description(dw)) for i in range(header_words)]
+        move  = Signal()
+        flush = Signal()
+        shift = Signal()
+        drop  = Signal()
+        self.comb += [
+            move.eq(source.ready | drop | ~line[0].valid),
+            flush.eq(Cat(*[word.valid & word.last for word in line]) != 0),
+            shift.eq((sink.valid | flush) & move),
+            sink.ready.eq(move),
+            line[0].connect(source, omit={"valid", "ready"}),
+            source.valid.eq(line[0].valid & ~drop & (sink.valid | flush)),
+        ]
+        for i in range(header_words):
+            word_in = sink if i == (header_words - 1) else line[i + 1]
+            self.sync += If(shift,
+                line[i].valid.eq(word_in.valid),
+                line[i].last.eq(word_in.last),
+                line[i].payload.eq(word_in.payload),
+                line[i].param.eq(word_in.param)
+            )
+
+        # PAUSE header match.
+        is_pause = Signal()
+        self.comb += is_pause.eq(
+            (field( 0, 6) == mac_pause_address) &
+            (field(12, 2) == ethernet_type_mac_control) &
+            (field(14, 2) == mac_pause_opcode))
+
+        # PAUSE frame dropping (decided on the first word of the frame: its header is complete).
+        first    = Signal(reset=1)
+        dropping = Signal()
+        self.comb += drop.eq(Mux(first, (count == header_words) & is_pause, dropping))
+        self.sync += [
+            If(line[0].valid & shift,
+                first.eq(line[0].last),
+                If(first,
+                    dropping.eq(drop)
+                )
+            )
+        ]
+
+        # Header check (after the last word: the frame is complete and its CRC checked).
+        check = Signal()
+        self.sync += check.eq(sink.valid & sink.ready & sink.last & (Mux(start, 0, count) >= (header_words - 1)) & (sink.error == 0))
+        self.sync += [
+            self.pause.eq(0),
+            If(check & is_pause,
+                self.pause.eq(1),
+                self.quanta.eq(field(16, 2))
+            )
+        ]
+
+# MAC PAUSE TX -------------------------------------------------------------------------------------
+
+class LiteEthMACPauseTX(Module):
+    """MAC PAUSE TX
+
+    Honors the received PAUSE frames: when pause is pulsed, frames are held off for the requested
+    time (in quanta of 512 bit times, one word per clock cycle). A frame being transmitted is
+    always completed.
+
+    Emits PAUSE frames (XOFF) with tx_quanta when xoff is asserted, refreshed at half the pause
+    time while xoff remains asserted, and a PAUSE frame with a pause time of 0 (XON) when xoff is
+    deasserted. PAUSE frames are not held off and are inserted between frames (padding/CRC are
+    added by the MAC).
+    """
+    def __init__(self, dw):
+        self.sink   = sink   = stream.Endpoint(eth_phy_description(dw))
+        self.source = source = stream.Endpoint(eth_phy_description(dw))
+
+        # Honoring.
+        self.pause  = Signal()
+        self.quanta = Signal(16)
+
+        # Generation.
+        self.xoff        = Signal()
+        self.tx_quanta   = Signal(16)
+        self.mac_address = Signal(48)
+
+        # # #
+
+        bytes_per_clk = dw//8
+
+        # Quanta tick.
+        tick       = Signal()
+        tick_count = Signal(max=max(mac_pause_quanta//dw, 2))
+        self.sync += [
+            tick_count.eq(tick_count + 1),
+            If(tick,
+                tick_count.eq(0)
+            )
+        ]
+        self.comb += tick.eq(tick_count == (max(mac_pause_quanta//dw, 1) - 1))
+
+        # Pause timer.
+        paused = Signal()
+        timer  = Signal(16)
+        self.comb += paused.eq(timer != 0)
+        self.sync += [
+            If(self.pause,
+                timer.eq(self.quanta)
+            ).Elif(tick & paused,
+                timer.eq(timer - 1)
+            )
+        ]
+
+        # PAUSE requests (XOFF on xoff rising edge and refresh, XON on xoff falling edge).
+        xoff_d       = Signal()
+        refresh      = Signal(16)
+        request      = Signal()
+        request_ack  = Signal()
+        request_xoff = Signal()
+        self.sync += [
+            xoff_d.eq(self.xoff),
+            If(tick & (refresh != 0),
+                refresh.eq(refresh - 1)
+            ),
+            If(request_ack,
+                request.eq(0),
+                If(request_xoff,
+                    refresh.eq(self.tx_quanta[1:])
+                )
+            ),
+            If(self.xoff & (~xoff_d | ((refresh == 0) & ~request)),
+                request.eq(1),
+                request_xoff.eq(1)
+            ).Elif(~self.xoff & xoff_d,
+                request.eq(1),
+                request_xoff.eq(0)
+            )
+        ]
+
+        # PAUSE frame.
+        pause_words  = math.ceil(mac_pause_length/bytes_per_clk)
+        pause_quanta = Signal(16)
+        pause_bytes  = []
+        pause_bytes += _bytes(Constant(mac_pause_address, 48), 6)
+        pause_bytes += _bytes(self.mac_address, 6)
+        pause_bytes += _bytes(Constant(ethernet_type_mac_control, 16), 2)
+        pause_bytes += _bytes(Constant(mac_pause_opcode, 16), 2)
+        pause_bytes += _bytes(pause_quanta, 2)
+        pause_bytes += [Constant(0, 8)]*(pause_words*bytes_per_clk - mac_pause_length)
+        pause_data   = Array(Cat(*pause_bytes[n*bytes_per_clk:(n+1)*bytes_per_clk]) for n in range(pause_words))
+        pause_count  = Signal(max=max(pause_words, 2))
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            NextValue(pause_count, 0),
+            If(request,
+                request_ack.eq(1),
+                NextValue(pause_quanta, Mux(request_xoff, self.tx_quanta, 0)),
+                NextState("PAUSE")
+            ).Elif(~paused,
+                sink.connect(source),
+                If(sink.valid & sink.ready & ~sink.last,
+                    NextState("COPY")
+                )
+            )
+        )
+        fsm.act("COPY",
+            sink.connect(source),
+            If(sink.valid & sink.ready & sink.last,
+                NextState("IDLE")
+            )
+        )
+        fsm.act("PAUSE",
+            source.valid.eq(1),
+            source.data.eq(pause_data[pause_count]),
+            If(pause_count == (pause_words - 1),
+                source.last.eq(1),
+                source.last_be.eq(2**((mac_pause_length - 1)%bytes_per_clk))
+            ),
+            If(source.ready,
+                NextValue(pause_count, pause_count + 1),
+                If(source.last,
+                    NextState("IDLE")
+                )
+            )
+        )
@@ -31,7 +31,7 @@ class LiteEthMACPreambleInserter(Module):
         # # #
 
         preamble = Signal(64, reset=eth_preamble)
-        count    = Signal(max=(64//dw)-1, reset_less=True)
+        count    = Signal(max=max(64//dw, 2), reset_less=True)
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
             self.sink.ready.eq(1),
@@ -71,6 +71,10 @@ class LiteEthMACPreambleChecker(Module):
 
     Detects preamble at the beginning of each packet.
 
+    With data widths > 8-bit, the SFD can be found on any byte lane: the packet octets are then
+    realigned on lane 0 (last_be is adjusted and an extra word is generated when the last octets
+    of the packet don't fit in the last realigned word).
+
     Attributes
     ----------
     sink : in
@@ -81,7 +85,6 @@ class LiteEthMACPreambleChecker(Module):
         Pulses every time a preamble error is detected.
     """
     def __init__(self, dw):
-        assert dw == 8
         self.sink   = sink   = stream.Endpoint(eth_phy_description(dw))
         self.source = source = stream.Endpoint(eth_phy_description(dw))
 
@@ -89,21 +92,70 @@ class LiteEthMACPreambleChecker(Module):
 
         # # #
 
+        bytes_per_clk = dw//8
+
+        # SFD detection (first lane with the SFD).
+        sfd_found = Signal()
+        sfd_lane  = Signal(max=max(bytes_per_clk, 2))
+        for i in reversed(range(bytes_per_clk)):
+            self.comb += If(sink.data[8*i:8*(i+1)] == (eth_preamble >> 56),
+                sfd_found.eq(1),
+                sfd_lane.eq(i)
+            )
+
+        # Last lane (0: full word).
+        last_lane   = Signal(max=max(bytes_per_clk, 2))
+        last_lane_d = Signal(max=max(bytes_per_clk, 2))
+        self.comb += last_lane.eq(bytes_per_clk - 1)
+        for i in range(bytes_per_clk):
+            self.comb += If(sink.last_be[i], last_lane.eq(i))
+
+        # Realignment: packet octets start at offset (1 to bytes_per_clk) in Cat(sink_d, sink).
+        offset = Signal(max=bytes_per_clk + 1)
+        sink_d = Signal(dw)
+        self.sync += If(sink.valid & sink.ready, sink_d.eq(sink.data))
+        self.comb += Case(offset, {o: source.data.eq(Cat(sink_d, sink.data)[8*o:8*o + dw])
+            for o in range(1, bytes_per_clk + 1)})
+        last_be = Array([2**i for i in range(bytes_per_clk)])
+
+        # FSM.
         self.submodules.fsm = fsm = FSM(reset_state="PREAMBLE")
-        fsm.act("PREAMBLE",
+        fsm_preamble = [
             sink.ready.eq(1),
-            If(sink.valid & ~sink.last & (sink.data == (eth_preamble >> 56)),
-                NextState("COPY")
-            ),
-            If(sink.valid & sink.last, self.error.eq(1))
-        )
-        self.comb += [
-            source.data.eq(sink.data),
-            source.last_be.eq(sink.last_be)
+            If(sink.valid,
+                If(sink.last,
+                    self.error.eq(1)
+                ).Elif(sfd_found,
+                    NextValue(offset, sfd_lane + 1),
+                    NextState("COPY")
+                )
+            )
         ]
+        fsm.act("PREAMBLE", *fsm_preamble)
         fsm.act("COPY",
-            sink.connect(source, omit={"data", "last_be"}),
-            If(source.valid & source.last & source.ready,
+            sink.connect(source, omit={"data", "last", "last_be"}),
+            If(sink.last,
+                If(last_lane < offset,
+                    source.last.eq(1),
+                    source.last_be.eq(last_be[bytes_per_clk - offset + last_lane])
+                )
+            ),
+            If(sink.valid & sink.ready & sink.last,
+                NextValue(last_lane_d, last_lane),
+                If(last_lane < offset,
+                    NextState("PREAMBLE")
+                ).Else(
+                    NextState("COPY-LAST")
+                )
+            )
+        )
+        fsm.act("COPY-LAST",
+            source.valid.eq(1),
+            source.last.eq(1),
+            source.last_be.eq(last_be[last_lane_d - offset]),
+            # Output is taken from sink_d: look for the next preamble.
+            If(source.ready,
                 NextState("PREAMBLE"),
+                *fsm_preamble
             )
         )
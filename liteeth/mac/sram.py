@@ -14,16 +14,22 @@ from litex.soc.interconnect.csr_eventmanager import *
 # MAC SRAM Writer ----------------------------------------------------------------------------------
 
 class LiteEthMACSRAMWriter(Module, AutoCSR):
+    autocsr_exclude = {"mem"}
+
     def __init__(self, dw, depth, nslots=2, endianness="big", timestamp=None):
-        self.sink      = sink = stream.Endpoint(eth_phy_description(dw))
-        self.crc_error = Signal()
+        self.sink       = sink = stream.Endpoint(eth_phy_description(dw))
+        self.crc_error  = Signal()
+        self.frame_done = Signal() # Pulses for each frame stored.
 
         slotbits      = max(log2_int(nslots), 1)
+        indexbits     = log2_int(nslots) + 1
         lengthbits    = 32
 
-        self._slot   = CSRStatus(slotbits)
-        self._length = CSRStatus(lengthbits)
-        self._errors  = CSRStatus(32)
+        self._slot     = CSRStatus(slotbits)
+        self._length   = CSRStatus(lengthbits)
+        self._errors   = CSRStatus(32)
+        self._producer = CSRStatus(indexbits)
+        self._consumer = CSRStorage(indexbits)
 
         if timestamp is not None:
             # Timestamp the incoming packets when a Timestamp source is provided
@@ -40,59 +46,56 @@ class LiteEthMACSRAMWriter(Module, AutoCSR):
         # Packet dropped if no slot available
         sink.ready.reset = 1
 
-        # Length computation
-        inc = Signal(3)
-        if endianness == "big":
-            self.comb += Case(sink.last_be, {
-                0b1000    : inc.eq(1),
-                0b0100    : inc.eq(2),
-                0b0010    : inc.eq(3),
-                "default" : inc.eq(4)
-            })
-        else:
-            self.comb += Case(sink.last_be, {
-                0b0001    : inc.eq(1),
-                0b0010    : inc.eq(2),
-                0b0100    : inc.eq(3),
-                "default" : inc.eq(4)
-            })
+        # Length computation (last_be: one-hot on the last valid byte, first byte on the MSBs in
+        # big endian, on the LSBs in little endian).
+        bytes_per_word = dw//8
+        inc = Signal(bits_for(bytes_per_word))
+        cases = {"default": inc.eq(bytes_per_word)}
+        for i in range(bytes_per_word - 1):
+            if endianness == "big":
+                cases[2**(bytes_per_word - 1 - i)] = inc.eq(i + 1)
+            else:
+                cases[2**i] = inc.eq(i + 1)
+        self.comb += Case(sink.last_be, cases)
 
         counter = Signal(lengthbits)
 
-        # Slot computation
+        # Slot computation (Ring: slots are filled in order, from the producer index, and released
+        # by the driver, to the consumer index. Indexes have an extra wrap bit).
+        produce = Signal(indexbits)
+        consume = Signal(indexbits)
+        full    = Signal()
         slot    = Signal(slotbits)
         slot_ce = Signal()
-        self.sync += If(slot_ce, slot.eq(slot + 1))
+        self.comb += [
+            full.eq((produce - consume)[:indexbits] == nslots),
+            slot.eq(produce),
+        ]
+        self.sync += If(slot_ce, produce.eq(produce + 1))
 
         start   = Signal()
         ongoing = Signal()
 
-        # Status FIFO
-        stat_fifo_layout = [("slot", slotbits), ("length", lengthbits)]
-        if timestamp is not None:
-            stat_fifo_layout += [("timestamp", timestampbits)]
-
-        stat_fifo = stream.SyncFIFO(stat_fifo_layout, nslots)
-        self.submodules += stat_fifo
-
         # FSM
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
             If(sink.valid,
-                If(stat_fifo.sink.ready,
+                If(~full,
                     start.eq(1),
                     ongoing.eq(1),
                     NextValue(counter, counter + inc),
                     NextState("WRITE")
                 ).Else(
                     NextValue(self._errors.status, self._errors.status + 1),
-                    NextState("DISCARD_REMAINING")
+                    If(~sink.last,
+                        NextState("DROP")
+                    )
                 )
             )
         )
         fsm.act("WRITE",
             If(sink.valid,
-                If(counter == eth_mtu,
+                If(counter >= depth*bytes_per_word,
                     NextState("DISCARD_REMAINING")
                 ).Else(
                     NextValue(counter, counter + inc),
@@ -116,57 +119,83 @@ class LiteEthMACSRAMWriter(Module, AutoCSR):
                 NextState("TERMINATE")
             )
         )
-        self.comb += [
-            stat_fifo.sink.slot.eq(slot),
-            stat_fifo.sink.length.eq(counter)
-        ]
-
+        fsm.act("DROP",
+            If(sink.valid & sink.last,
+                NextState("IDLE")
+            )
+        )
         fsm.act("TERMINATE",
             NextValue(counter, 0),
             slot_ce.eq(1),
-            stat_fifo.sink.valid.eq(1),
             NextState("IDLE")
         )
 
+        # Status (Length/Timestamp of the slots).
+        self.lengths = Memory(lengthbits, nslots)
+        lengths_wrport = self.lengths.get_port(write_capable=True)
+        lengths_rdport = self.lengths.get_port(async_read=True)
+        self.specials += self.lengths, lengths_wrport, lengths_rdport
         self.comb += [
-            stat_fifo.source.ready.eq(self.ev.available.clear),
-            self.ev.available.trigger.eq(stat_fifo.source.valid),
-            self._slot.status.eq(stat_fifo.source.slot),
-            self._length.status.eq(stat_fifo.source.length),
+            lengths_wrport.adr.eq(slot),
+            lengths_wrport.dat_w.eq(counter),
+            lengths_wrport.we.eq(slot_ce),
+            lengths_rdport.adr.eq(consume),
         ]
         if timestamp is not None:
             # Latch Timestamp on start of incoming packet.
-            self.sync += If(start, stat_fifo.sink.timestamp.eq(timestamp))
-            self.comb += self._timestamp.status.eq(stat_fifo.source.timestamp)
+            timestamps        = Memory(timestampbits, nslots)
+            timestamps_wrport = timestamps.get_port(write_capable=True)
+            timestamps_rdport = timestamps.get_port(async_read=True)
+            self.specials += timestamps, timestamps_wrport, timestamps_rdport
+            self.comb += [
+                timestamps_wrport.adr.eq(slot),
+                timestamps_wrport.dat_w.eq(timestamp),
+                timestamps_wrport.we.eq(start),
+                timestamps_rdport.adr.eq(consume),
+                self._timestamp.status.eq(timestamps_rdport.dat_r),
+            ]
 
-        # Memory
-        mems  = [None]*nslots
-        ports = [None]*nslots
-        for n in range(nslots):
-            mems[n] = Memory(dw, depth)
-            ports[n] = mems[n].get_port(write_capable=True)
-            self.specials += ports[n]
-        self.mems = mems
+        # Slots are released one at a time when clearing the available event, or in batch when
+        # writing the consumer index.
+        self.sync += [
+            If(self._consumer.re,
+                consume.eq(self._consumer.storage)
+            ).Elif(self.ev.available.clear & (produce != consume),
+                consume.eq(consume + 1)
+            )
+        ]
+        self.comb += [
+            self.frame_done.eq(slot_ce),
+            self.ev.available.trigger.eq(produce != consume),
+            self._slot.status.eq(consume),
+            self._length.status.eq(lengths_rdport.dat_r),
+            self._producer.status.eq(produce),
+        ]
 
-        cases = {}
-        for n, port in enumerate(ports):
-            cases[n] = [
-                ports[n].adr.eq(counter[2:]),
-                ports[n].dat_w.eq(sink.data),
-                If(sink.valid & ongoing,
-                    ports[n].we.eq(0xf)
-                )
-            ]
-        self.comb += Case(slot, cases)
+        # Memory (Slots at slot*depth).
+        self.mem = mem = Memory(dw, nslots*depth)
+        port = mem.get_port(write_capable=True)
+        self.specials += mem, port
+        self.comb += [
+            port.adr.eq(slot*depth + counter[log2_int(bytes_per_word):]),
+            port.dat_w.eq(sink.data),
+            If(sink.valid & ongoing,
+                port.we.eq(1)
+            )
+        ]
 
 # MAC SRAM Reader ----------------------------------------------------------------------------------
 
 class LiteEthMACSRAMReader(Module, AutoCSR):
+    autocsr_exclude = {"mem"}
+
     def __init__(self, dw, depth, nslots=2, endianness="big", timestamp=None):
-        self.source = source = stream.Endpoint(eth_phy_description(dw))
+        self.source     = source = stream.Endpoint(eth_phy_description(dw))
+        self.frame_done = Signal() # Pulses for each frame sent.
 
         slotbits        = max(log2_int(nslots), 1)
-        lengthbits      = bits_for(depth*4)  # length in bytes
+        bytes_per_word  = dw//8
+        lengthbits      = bits_for(depth*bytes_per_word)  # length in bytes
         self.lengthbits = lengthbits
 
         self._start  = CSR()
@@ -224,30 +253,24 @@ class LiteEthMACSRAMReader(Module, AutoCSR):
             )
         )
 
-        length_lsb = cmd_fifo.source.length[0:2]
-        if endianness == "big":
-            self.comb += If(source.last,
-                Case(length_lsb, {
-                    0 : source.last_be.eq(0b0001),
-                    1 : source.last_be.eq(0b1000),
-                    2 : source.last_be.eq(0b0100),
-                    3 : source.last_be.eq(0b0010)
-                }))
-        else:
-            self.comb += If(source.last,
-                Case(length_lsb, {
-                    0 : source.last_be.eq(0b1000),
-                    1 : source.last_be.eq(0b0001),
-                    2 : source.last_be.eq(0b0010),
-                    3 : source.last_be.eq(0b0100)
-                }))
+        # last_be: one-hot on the last valid byte (first byte on the MSBs in big endian, on the
+        # LSBs in little endian).
+        length_lsb = cmd_fifo.source.length[0:log2_int(bytes_per_word)]
+        cases = {}
+        for i in range(bytes_per_word):
+            n = bytes_per_word if i == 0 else i # Valid bytes in the last word.
+            if endianness == "big":
+                cases[i] = source.last_be.eq(2**(bytes_per_word - n))
+            else:
+                cases[i] = source.last_be.eq(2**(n - 1))
+        self.comb += If(source.last, Case(length_lsb, cases))
         fsm.act("SEND",
             source.valid.eq(1),
-            source.last.eq(counter >= (cmd_fifo.source.length - 4)),
+            source.last.eq(counter >= (cmd_fifo.source.length - bytes_per_word)),
             read_address.eq(counter),
             If(source.ready,
-                read_address.eq(counter + 4),
-                NextValue(counter, counter + 4),
+                read_address.eq(counter + bytes_per_word),
+                NextValue(counter, counter + bytes_per_word),
                 If(source.last,
                     NextState("END")
                 )
@@ -255,6 +278,7 @@ class LiteEthMACSRAMReader(Module, AutoCSR):
         )
         fsm.act("END",
             self.ev.done.trigger.eq(1),
+            self.frame_done.eq(1),
             cmd_fifo.source.ready.eq(1),
             NextState("IDLE")
         )
@@ -267,27 +291,74 @@ class LiteEthMACSRAMReader(Module, AutoCSR):
             # Trigger event when Status FIFO has contents (Override FSM assignment).
             self.comb += self.ev.done.trigger.eq(stat_fifo.source.valid)
 
-        # Memory
-        rd_slot = cmd_fifo.source.slot
-        mems    = [None]*nslots
-        ports   = [None]*nslots
-        for n in range(nslots):
-            mems[n]  = Memory(dw, depth)
-            ports[n] = mems[n].get_port()
-            self.specials += ports[n]
-        self.mems = mems
+        # Memory (Slots at slot*depth).
+        rd_slot  = cmd_fifo.source.slot
+        self.mem = mem = Memory(dw, nslots*depth)
+        port = mem.get_port()
+        self.specials += mem, port
+        self.comb += [
+            port.adr.eq(rd_slot*depth + read_address[log2_int(bytes_per_word):]),
+            source.data.eq(port.dat_r),
+        ]
+
+# MAC SRAM IRQ Coalescing --------------------------------------------------------------------------
 
-        cases = {}
-        for n, port in enumerate(ports):
-            self.comb += ports[n].adr.eq(read_address[2:])
-            cases[n] = [source.data.eq(port.dat_r)]
-        self.comb += Case(rd_slot, cases)
+class LiteEthMACIRQCoalescing(Module, AutoCSR):
+    """MAC IRQ Coalescing
+
+    Shares the IRQ of the event managers (as SharedIRQ) but only raises it once coalescing_frames
+    frame events have been accumulated or coalescing_timeout sys clock cycles after the events
+    became pending, so that one IRQ covers a batch of frames. Events are counted until none of
+    the event managers is pending. 0 disables the thresholds (the defaults raise the IRQ
+    immediately).
+    """
+    def __init__(self, event_managers, events):
+        self.irq = Signal()
+
+        self._coalescing_frames  = CSRStorage(8)
+        self._coalescing_timeout = CSRStorage(32)
+
+        # # #
+
+        pending = Signal()
+        count   = Signal(8)
+        timer   = Signal(32)
+        n       = Signal(max=len(events) + 1)
+        self.comb += [
+            pending.eq(Reduce("OR", [ev.irq for ev in event_managers])),
+            n.eq(Reduce("ADD", events)),
+        ]
+        self.sync += [
+            If(n != 0,
+                count.eq(count + n),
+                If((count + n) > (2**len(count) - 1),
+                    count.eq(2**len(count) - 1)
+                )
+            ).Elif(~pending,
+                count.eq(0)
+            ),
+            If(~pending,
+                timer.eq(0)
+            ).Elif(timer != (2**len(timer) - 1),
+                timer.eq(timer + 1)
+            )
+        ]
+
+        frames  = self._coalescing_frames.storage
+        timeout = self._coalescing_timeout.storage
+        self.comb += self.irq.eq(pending & (
+            (count >= frames) |
+            ((timeout != 0) & (timer >= timeout))))
 
 # MAC SRAM -----------------------------------------------------------------------------------------
 
 class LiteEthMACSRAM(Module, AutoCSR):
-    def __init__(self, dw, depth, nrxslots, ntxslots, endianness, timestamp=None):
+    def __init__(self, dw, depth, nrxslots, ntxslots, endianness, timestamp=None, with_irq_coalescing=False):
         self.submodules.writer = LiteEthMACSRAMWriter(dw, depth, nrxslots, endianness, timestamp)
         self.submodules.reader = LiteEthMACSRAMReader(dw, depth, ntxslots, endianness, timestamp)
-        self.submodules.ev     = SharedIRQ(self.writer.ev, self.reader.ev)
+        if with_irq_coalescing:
+            self.submodules.ev = LiteEthMACIRQCoalescing([self.writer.ev, self.reader.ev],
+                events = [self.writer.frame_done, self.reader.frame_done])
+        else:
+            self.submodules.ev = SharedIRQ(self.writer.ev, self.reader.ev)
         self.sink, self.source = self.writer.sink, self.reader.source
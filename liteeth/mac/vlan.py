@@ -0,0 +1,138 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+from liteeth.common import *
+
+from liteeth.packet import Depacketizer, Packetizer
+
+# MAC VLAN RX --------------------------------------------------------------------------------------
+
+class LiteEthMACVLANRX(Module):
+    """MAC VLAN RX
+
+    Strips the 802.1Q tag of the tagged frames: ethernet_type is replaced with the encapsulated
+    Ethernet type and the tag is exposed as vlan_id/pcp. Untagged frames are forwarded with a
+    vlan_id of 0.
+    """
+    def __init__(self, dw):
+        self.sink   = sink   = stream.Endpoint(eth_mac_description(dw))
+        self.source = source = stream.Endpoint(eth_mac_description(dw))
+
+        # # #
+
+        # Tag Depacketizer.
+        self.submodules.depacketizer = depacketizer = Depacketizer(
+            eth_phy_description(dw),
+            eth_vlan_description(dw),
+            vlan_header)
+
+        # MAC addresses (the depacketizer can still be sending the frame when the next one starts).
+        target_mac = Signal(48)
+        sender_mac = Signal(48)
+        sink_done  = Signal()
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            NextValue(target_mac, sink.target_mac),
+            NextValue(sender_mac, sink.sender_mac),
+            NextValue(sink_done, 0),
+            If(sink.valid,
+                If(sink.ethernet_type == ethernet_type_vlan,
+                    NextState("TAGGED")
+                ).Else(
+                    NextState("UNTAGGED")
+                )
+            )
+        )
+        fsm.act("UNTAGGED",
+            sink.connect(source),
+            source.vlan_id.eq(0),
+            source.pcp.eq(0),
+            If(sink.valid & sink.ready & sink.last,
+                NextState("IDLE")
+            )
+        )
+        fsm.act("TAGGED",
+            If(~sink_done,
+                sink.connect(depacketizer.sink, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+                If(sink.valid & sink.ready & sink.last,
+                    NextValue(sink_done, 1)
+                )
+            ),
+            depacketizer.source.connect(source, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+            source.target_mac.eq(target_mac),
+            source.sender_mac.eq(sender_mac),
+            source.ethernet_type.eq(depacketizer.source.ethernet_type),
+            source.vlan_id.eq(depacketizer.source.tci[0:12]),
+            source.pcp.eq(depacketizer.source.tci[13:16]),
+            If(source.valid & source.ready & source.last,
+                NextState("IDLE")
+            )
+        )
+
+# MAC VLAN TX --------------------------------------------------------------------------------------
+
+class LiteEthMACVLANTX(Module):
+    """MAC VLAN TX
+
+    Inserts an 802.1Q tag (from vlan_id/pcp) in the frames with a non-null vlan_id. Frames with a
+    vlan_id of 0 are forwarded untagged.
+    """
+    def __init__(self, dw):
+        self.sink   = sink   = stream.Endpoint(eth_mac_description(dw))
+        self.source = source = stream.Endpoint(eth_mac_description(dw))
+
+        # # #
+
+        # Tag Packetizer.
+        self.submodules.packetizer = packetizer = Packetizer(
+            eth_vlan_description(dw),
+            eth_phy_description(dw),
+            vlan_header)
+
+        # MAC addresses (the packetizer can still be sending the frame when the next one starts).
+        target_mac = Signal(48)
+        sender_mac = Signal(48)
+        sink_done  = Signal()
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            NextValue(target_mac, sink.target_mac),
+            NextValue(sender_mac, sink.sender_mac),
+            NextValue(sink_done, 0),
+            If(sink.valid,
+                If(sink.vlan_id != 0,
+                    NextState("TAGGED")
+                ).Else(
+                    NextState("UNTAGGED")
+                )
+            )
+        )
+        fsm.act("UNTAGGED",
+            sink.connect(source),
+            If(sink.valid & sink.ready & sink.last,
+                NextState("IDLE")
+            )
+        )
+        fsm.act("TAGGED",
+            If(~sink_done,
+                sink.connect(packetizer.sink, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+                If(sink.valid & sink.ready & sink.last,
+                    NextValue(sink_done, 1)
+                )
+            ),
+            packetizer.sink.tci.eq(Cat(sink.vlan_id, C(0, 1), sink.pcp)),
+            packetizer.sink.ethernet_type.eq(sink.ethernet_type),
+            packetizer.source.connect(source, keep={"valid", "ready", "last", "data", "last_be", "error"}),
+            source.target_mac.eq(target_mac),
+            source.sender_mac.eq(sender_mac),
+            source.ethernet_type.eq(ethernet_type_vlan),
+            If(source.valid & source.ready & source.last,
+                NextState("IDLE")
+            )
+        )
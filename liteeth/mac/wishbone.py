@@ -5,6 +5,8 @@
 # Copyright (c) 2015-2016 Sebastien Bourdeauducq <sb@m-labs.hk>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import math
+
 from liteeth.common import *
 from liteeth.mac import sram
 
@@ -13,35 +15,47 @@ from litex.soc.interconnect import wishbone
 # MAC Wishbone Interface ---------------------------------------------------------------------------
 
 class LiteEthMACWishboneInterface(Module, AutoCSR):
-    def __init__(self, dw, nrxslots=2, ntxslots=2, endianness="big", timestamp=None):
+    def __init__(self, dw, nrxslots=2, ntxslots=2, endianness="big", timestamp=None, mtu=eth_mtu,
+        with_irq_coalescing=False):
         self.sink   = stream.Endpoint(eth_phy_description(dw))
         self.source = stream.Endpoint(eth_phy_description(dw))
-        self.bus    = wishbone.Interface()
+        self.bus    = wishbone.Interface(data_width=dw, bursting=True)
 
         # # #
 
-        # Storage in SRAM
-        sram_depth = eth_mtu//(dw//8)
-        self.submodules.sram = sram.LiteEthMACSRAM(dw, sram_depth, nrxslots, ntxslots, endianness, timestamp)
+        # Storage in SRAM (slots aligned on 16 words in the banked memories for wrapping bursts).
+        sram_depth = 16*math.ceil(math.ceil(mtu/(dw//8))/16)
+        # Slots are mapped on power of 2 boundaries (slot_size in bytes).
+        self.slot_size = 2**log2_int(sram_depth, need_pow2=False)*(dw//8)
+        self.submodules.sram = sram.LiteEthMACSRAM(dw, sram_depth, nrxslots, ntxslots, endianness, timestamp,
+            with_irq_coalescing)
         self.comb += self.sink.connect(self.sram.sink)
         self.comb += self.sram.source.connect(self.source)
 
-        # Wishbone interface
-        wb_rx_sram_ifs = [wishbone.SRAM(self.sram.writer.mems[n], read_only=True)
-            for n in range(nrxslots)]
-        wb_tx_sram_ifs = [wishbone.SRAM(self.sram.reader.mems[n], read_only=False)
-            for n in range(ntxslots)]
-        wb_sram_ifs = wb_rx_sram_ifs + wb_tx_sram_ifs
-
-        wb_slaves     = []
-        decoderoffset = log2_int(sram_depth, need_pow2=False)
-        rx_decoderbits   = log2_int(len(wb_rx_sram_ifs))
-        tx_decoderbits   = log2_int(len(wb_tx_sram_ifs))
+        # Wishbone interface (Slots mapped on slot_size boundaries, RX slots then TX slots, and
+        # translated to the banked memories). Incrementing/wrapping bursts (CTI/BTE) are supported:
+        # one word per clock cycle.
+        wb_slaves        = []
+        decoderoffset    = log2_int(sram_depth, need_pow2=False)
+        rx_decoderbits   = log2_int(nrxslots)
+        tx_decoderbits   = log2_int(ntxslots)
         decoderbits      = max(rx_decoderbits, tx_decoderbits)+1
-        for n, wb_sram_if in enumerate(wb_sram_ifs):
-            def slave_filter(a, v=n):
-                return a[decoderoffset:decoderoffset+decoderbits] == v
-            wb_slaves.append((slave_filter, wb_sram_if.bus))
+        for mem, read_only, first, nslots in [
+            (self.sram.writer.mem, True,  0,        nrxslots),
+            (self.sram.reader.mem, False, nrxslots, ntxslots)]:
+            wb_bus     = wishbone.Interface(data_width=dw, bursting=True)
+            wb_sram_if = wishbone.SRAM(mem, read_only=read_only, bus=wishbone.Interface(data_width=dw, bursting=True))
+            slot       = Signal(decoderbits)
+            self.comb += [
+                slot.eq(wb_bus.adr[decoderoffset:decoderoffset+decoderbits] - first),
+                wb_bus.connect(wb_sram_if.bus, omit={"adr"}),
+                wb_sram_if.bus.adr.eq(slot*sram_depth + wb_bus.adr[:decoderoffset]),
+            ]
+            def slave_filter(a, first=first, nslots=nslots):
+                n = a[decoderoffset:decoderoffset+decoderbits]
+                return (n >= first) & (n < (first + nslots))
+            wb_slaves.append((slave_filter, wb_bus))
             self.submodules += wb_sram_if
-        wb_con = wishbone.Decoder(self.bus, wb_slaves, register=True)
+        # Not registered: the slave selection only depends on a few address bits.
+        wb_con = wishbone.Decoder(self.bus, wb_slaves, register=False)
         self.submodules += wb_con
@@ -0,0 +1,427 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Packetizer/Depacketizer with last_be support (derived from LiteX's packet.py).
+#
+# With data widths > 8-bit, headers that are not a multiple of the data width shift the payload:
+# the last payload word can then fit in the previous output word or spill in an extra one. last_be
+# (one-hot, set on the last valid byte lane of the last word, 0 meaning a full word) is realigned
+# accordingly so that packets keep their exact byte length across the stack.
+#
+# Headers shorter than a word are sent/received with the first bytes of the payload.
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+# Helpers ------------------------------------------------------------------------------------------
+
+def _last_be(endpoint, bytes_per_clk):
+    # A null last_be is considered as a full last word.
+    return Mux(endpoint.last_be == 0, 2**(bytes_per_clk - 1), endpoint.last_be)
+
+# Packetizer ---------------------------------------------------------------------------------------
+
+class Packetizer(Module):
+    def __init__(self, sink_description, source_description, header):
+        self.sink   = sink   = stream.Endpoint(sink_description)
+        self.source = source = stream.Endpoint(source_description)
+        self.header = Signal(header.length*8)
+
+        # # #
+
+        # Parameters.
+        data_width      = len(self.sink.data)
+        bytes_per_clk   = data_width//8
+        header_words    = (header.length*8)//data_width
+        header_leftover = header.length%bytes_per_clk
+        aligned         = header_leftover == 0
+
+        # Signals.
+        sr       = Signal(header.length*8, reset_less=True)
+        sr_load  = Signal()
+        sr_shift = Signal()
+        count    = Signal(max=max(header_words, 2))
+        sink_d   = stream.Endpoint(sink_description)
+
+        # Header Encode/Load/Shift.
+        self.comb += header.encode(sink, self.header)
+        self.sync += If(sr_load, sr.eq(self.header))
+        if header_words > 1:
+            self.sync += If(sr_shift, sr.eq(sr[data_width:]))
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm_from_idle = Signal()
+        if header_words != 0:
+            fsm.act("IDLE",
+                sink.ready.eq(1),
+                NextValue(count, 1),
+                If(sink.valid,
+                    sink.ready.eq(0),
+                    source.valid.eq(1),
+                    source.last.eq(0),
+                    source.data.eq(self.header[:data_width]),
+                    If(source.valid & source.ready,
+                        sr_load.eq(1),
+                        NextValue(fsm_from_idle, 1),
+                        If(header_words == 1,
+                            NextState("ALIGNED-DATA-COPY" if aligned else "UNALIGNED-DATA-COPY")
+                        ).Else(
+                            NextState("HEADER-SEND")
+                        )
+                   )
+                )
+            )
+        fsm.act("HEADER-SEND",
+            source.valid.eq(1),
+            source.last.eq(0),
+            source.data.eq(sr[min(data_width, len(sr)-1):]),
+            If(source.valid & source.ready,
+                sr_shift.eq(1),
+                If(count == (header_words - 1),
+                    sr_shift.eq(0),
+                    NextState("ALIGNED-DATA-COPY" if aligned else "UNALIGNED-DATA-COPY"),
+                    NextValue(count, count + 1)
+               ).Else(
+                    NextValue(count, count + 1),
+               )
+            )
+        )
+        fsm.act("ALIGNED-DATA-COPY",
+            source.valid.eq(sink.valid),
+            source.last.eq(sink.last),
+            If(sink.last,
+                source.last_be.eq(_last_be(sink, bytes_per_clk))
+            ),
+            source.data.eq(sink.data),
+            sink.ready.eq(source.ready),
+            If(source.valid & source.ready,
+               If(source.last,
+                  NextState("IDLE")
+               )
+            )
+        )
+        if not aligned:
+            # Output words: header_leftover bytes from the previous word (or header) + the first
+            # bytes_per_clk - header_leftover bytes of the current one.
+            sink_bytes   = bytes_per_clk - header_leftover
+            sink_last_be = Signal(bytes_per_clk)
+            sink_d_last_be = Signal(bytes_per_clk)
+            sink_last_fit  = Signal()
+            self.comb += [
+                sink_last_be.eq(_last_be(sink, bytes_per_clk)),
+                sink_d_last_be.eq(_last_be(sink_d, bytes_per_clk)),
+                sink_last_fit.eq(sink_last_be[:sink_bytes] != 0),
+            ]
+            self.sync += If(sink.valid & sink.ready, sink_d.eq(sink))
+            if header_words == 0:
+                # Header shorter than a word: sent with the first bytes of the payload.
+                fsm.act("IDLE",
+                    source.valid.eq(sink.valid),
+                    source.last.eq(sink.last & sink_last_fit),
+                    If(source.last,
+                        source.last_be.eq(Cat(C(0, header_leftover), sink_last_be[:sink_bytes]))
+                    ),
+                    source.data[:header_leftover*8].eq(self.header),
+                    source.data[header_leftover*8:].eq(sink.data),
+                    sink.ready.eq(source.ready),
+                    If(source.valid & source.ready,
+                        If(~sink.last,
+                            NextState("UNALIGNED-DATA-COPY")
+                        ).Elif(~sink_last_fit,
+                            NextState("UNALIGNED-DATA-COPY-LAST")
+                        )
+                    )
+                )
+            header_offset_multiplier = 1 if header_words == 1 else 2
+            fsm.act("UNALIGNED-DATA-COPY",
+                source.valid.eq(sink.valid),
+                source.last.eq(sink.last & sink_last_fit),
+                If(source.last,
+                    source.last_be.eq(Cat(C(0, header_leftover), sink_last_be[:sink_bytes]))
+                ),
+                If(fsm_from_idle,
+                    source.data[:header_leftover*8].eq(sr[header_offset_multiplier*data_width:])
+                ).Else(
+                    source.data[:header_leftover*8].eq(sink_d.data[sink_bytes*8:])
+                ),
+                source.data[header_leftover*8:].eq(sink.data),
+                sink.ready.eq(source.ready),
+                If(source.valid & source.ready,
+                    NextValue(fsm_from_idle, 0),
+                    If(sink.last,
+                        If(sink_last_fit,
+                            NextState("IDLE")
+                        ).Else(
+                            NextState("UNALIGNED-DATA-COPY-LAST")
+                        )
+                    )
+                )
+            )
+            fsm.act("UNALIGNED-DATA-COPY-LAST",
+                source.valid.eq(1),
+                source.last.eq(1),
+                source.last_be.eq(sink_d_last_be[sink_bytes:]),
+                source.data.eq(sink_d.data[sink_bytes*8:]),
+                If(source.ready,
+                    NextState("IDLE")
+                )
+            )
+
+        # Error.
+        if hasattr(sink, "error") and hasattr(source, "error"):
+            self.comb += source.error.eq(sink.error)
+
+# Depacketizer -------------------------------------------------------------------------------------
+
+class Depacketizer(Module):
+    def __init__(self, sink_description, source_description, header):
+        self.sink   = sink   = stream.Endpoint(sink_description)
+        self.source = source = stream.Endpoint(source_description)
+        self.header = Signal(header.length*8)
+
+        # # #
+
+        # Parameters.
+        data_width      = len(sink.data)
+        bytes_per_clk   = data_width//8
+        header_words    = (header.length*8)//data_width
+        header_leftover = header.length%bytes_per_clk
+        aligned         = header_leftover == 0
+
+        # Signals.
+        sr                = Signal(header.length*8, reset_less=True)
+        sr_shift          = Signal()
+        sr_shift_leftover = Signal()
+        count             = Signal(max=max(header_words, 2))
+        sink_d            = stream.Endpoint(sink_description)
+
+        # Header Shift/Decode.
+        if header_words == 0:
+            self.sync += If(sr_shift_leftover, sr.eq(sink.data))
+        elif (header_words) == 1 and (header_leftover == 0):
+            self.sync += If(sr_shift, sr.eq(sink.data))
+        else:
+            self.sync += [
+                If(sr_shift,          sr.eq(Cat(sr[bytes_per_clk*8:],   sink.data))),
+                If(sr_shift_leftover, sr.eq(Cat(sr[header_leftover*8:], sink.data)))
+            ]
+        self.comb += self.header.eq(sr)
+        self.comb += header.decode(self.header, source)
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm_from_idle = Signal()
+        if header_words != 0:
+            fsm_idle = [
+                sink.ready.eq(1),
+                NextValue(count, 1),
+                If(sink.valid,
+                    sr_shift.eq(1),
+                    NextValue(fsm_from_idle, 1),
+                    If(header_words == 1,
+                        NextState("ALIGNED-DATA-COPY" if aligned else "UNALIGNED-DATA-COPY"),
+                    ).Else(
+                        NextState("HEADER-RECEIVE")
+                    )
+                )
+            ]
+            fsm.act("IDLE", *fsm_idle)
+        fsm.act("HEADER-RECEIVE",
+            sink.ready.eq(1),
+            If(sink.valid,
+                NextValue(count, count + 1),
+                sr_shift.eq(1),
+                If(count == (header_words - 1),
+                    NextState("ALIGNED-DATA-COPY" if aligned else "UNALIGNED-DATA-COPY"),
+                    NextValue(count, count + 1),
+                )
+            )
+        )
+        fsm.act("ALIGNED-DATA-COPY",
+            source.valid.eq(sink.valid),
+            source.last.eq(sink.last),
+            If(sink.last,
+                source.last_be.eq(_last_be(sink, bytes_per_clk))
+            ),
+            sink.ready.eq(source.ready),
+            source.data.eq(sink.data),
+            If(source.valid & source.ready,
+               If(source.last,
+                  NextState("IDLE")
+               )
+            )
+        )
+
+        if not aligned:
+            # Output words: the last bytes_per_clk - header_leftover bytes of the previous word +
+            # the first header_leftover bytes of the current one.
+            sink_d_bytes   = bytes_per_clk - header_leftover
+            sink_last_be   = Signal(bytes_per_clk)
+            sink_d_last_be = Signal(bytes_per_clk)
+            sink_last_fit  = Signal()
+            self.comb += [
+                sink_last_be.eq(_last_be(sink, bytes_per_clk)),
+                sink_d_last_be.eq(_last_be(sink_d, bytes_per_clk)),
+                sink_last_fit.eq(sink_last_be[:header_leftover] != 0),
+            ]
+            self.sync += If(sink.valid & sink.ready, sink_d.eq(sink))
+            if header_words == 0:
+                # Header shorter than a word: received with the first bytes of the payload.
+                fsm_idle = [
+                    sink.ready.eq(1),
+                    If(sink.valid,
+                        sr_shift_leftover.eq(1),
+                        If(~sink.last,
+                            NextState("UNALIGNED-DATA-COPY")
+                        ).Elif(~sink_last_fit,
+                            NextState("UNALIGNED-DATA-COPY-LAST")
+                        )
+                    )
+                ]
+                fsm.act("IDLE", *fsm_idle)
+            fsm.act("UNALIGNED-DATA-COPY",
+                If(fsm_from_idle,
+                    # First word: header leftover + start of the payload.
+                    sink.ready.eq(1),
+                    If(sink.valid,
+                        NextValue(fsm_from_idle, 0),
+                        sr_shift_leftover.eq(1),
+                        If(sink.last,
+                            If(sink_last_fit,
+                                NextState("IDLE")
+                            ).Else(
+                                NextState("UNALIGNED-DATA-COPY-LAST")
+                            )
+                        )
+                    )
+                ).Else(
+                    source.valid.eq(sink.valid),
+                    source.last.eq(sink.last & sink_last_fit),
+                    If(source.last,
+                        source.last_be.eq(Cat(C(0, sink_d_bytes), sink_last_be[:header_leftover]))
+                    ),
+                    source.data.eq(sink_d.data[header_leftover*8:]),
+                    source.data[sink_d_bytes*8:].eq(sink.data),
+                    sink.ready.eq(source.ready),
+                    If(source.valid & source.ready,
+                        If(sink.last,
+                            If(sink_last_fit,
+                                NextState("IDLE")
+                            ).Else(
+                                NextState("UNALIGNED-DATA-COPY-LAST")
+                            )
+                        )
+                    )
+                )
+            )
+            fsm.act("UNALIGNED-DATA-COPY-LAST",
+                source.valid.eq(1),
+                source.last.eq(1),
+                source.last_be.eq(sink_d_last_be[header_leftover:]),
+                source.data.eq(sink_d.data[header_leftover*8:]),
+                # Output is taken from sink_d: start receiving the next packet (back-to-back).
+                If(source.ready,
+                    NextState("IDLE"),
+                    *fsm_idle
+                )
+            )
+
+        # Error.
+        if hasattr(sink, "error") and hasattr(source, "error"):
+            self.comb += source.error.eq(sink.error)
+
+# Store and Forward Buffer -------------------------------------------------------------------------
+
+class StoreAndForwardBuffer(Module):
+    """Store and Forward Buffer
+
+    Buffers packets and forwards them once fully received: packets with an error (error set on
+    any of their words) are dropped, as are packets larger than the buffer. depth (in words) is
+    rounded up to a power of 2.
+
+    Attributes
+    ----------
+    dropped : out
+        Pulses every time a packet is dropped.
+    """
+    def __init__(self, description, depth):
+        self.sink   = sink   = stream.Endpoint(description)
+        self.source = source = stream.Endpoint(description)
+
+        self.dropped = Signal()
+
+        # # #
+
+        depth = 2**log2_int(depth, need_pow2=False)
+
+        # Storage (payload, params and last).
+        sink_bits   = Cat(sink.payload.raw_bits(), sink.param.raw_bits(), sink.last)
+        source_bits = Cat(source.payload.raw_bits(), source.param.raw_bits(), source.last)
+        mem = Memory(len(sink_bits), depth)
+        wrport = mem.get_port(write_capable=True)
+        rdport = mem.get_port(has_re=True, mode=READ_FIRST)
+        self.specials += mem, wrport, rdport
+
+        # Pointers (with an extra wrap bit): rp <= cp <= wp, packets are readable up to cp.
+        wp = Signal(log2_int(depth) + 1) # Write pointer.
+        cp = Signal(log2_int(depth) + 1) # Commit pointer (end of the last valid packet).
+        rp = Signal(log2_int(depth) + 1) # Read pointer.
+
+        # Write.
+        full    = Signal()
+        too_big = Signal()
+        discard = Signal()
+        error   = Signal()
+        self.comb += [
+            full.eq((wp - rp)[:log2_int(depth) + 1] == depth),
+            # Full with the current packet only: it can't fit, drop it.
+            too_big.eq(full & (cp == rp)),
+            sink.ready.eq(~full | too_big | discard),
+            wrport.adr.eq(wp[:log2_int(depth)]),
+            wrport.dat_w.eq(sink_bits),
+            wrport.we.eq(sink.valid & sink.ready & ~too_big & ~discard),
+        ]
+        self.sync += [
+            If(sink.valid & sink.ready,
+                If(too_big | discard,
+                    wp.eq(cp),
+                    discard.eq(~sink.last),
+                    error.eq(0)
+                ).Else(
+                    wp.eq(wp + 1),
+                    error.eq(error | (sink.error != 0)),
+                    If(sink.last,
+                        error.eq(0),
+                        If(error | (sink.error != 0),
+                            wp.eq(cp)
+                        ).Else(
+                            cp.eq(wp + 1)
+                        )
+                    )
+                )
+            )
+        ]
+        self.comb += self.dropped.eq(sink.valid & sink.ready & sink.last &
+            (too_big | discard | error | (sink.error != 0)))
+
+        # Read.
+        read = Signal()
+        self.comb += [
+            read.eq((rp != cp) & (~source.valid | source.ready)),
+            rdport.adr.eq(rp[:log2_int(depth)]),
+            rdport.re.eq(read),
+            source_bits.eq(rdport.dat_r),
+        ]
+        self.sync += [
+            If(read,
+                rp.eq(rp + 1),
+                source.valid.eq(1)
+            ).Elif(source.ready,
+                source.valid.eq(0)
+            )
+        ]
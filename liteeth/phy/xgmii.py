@@ -0,0 +1,315 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2018 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+from migen import *
+
+from liteeth.common import *
+
+# XGMII Constants ----------------------------------------------------------------------------------
+
+xgmii_idle      = 0x07
+xgmii_start     = 0xfb
+xgmii_terminate = 0xfd
+xgmii_error     = 0xfe
+
+# XGMII (64-bit SDR) interface, as provided by a 10GBASE-R PCS (64b/66b encoding/scrambling and
+# gearbox, generally in the transceiver). Use a Record of this layout as pads to connect the PHY to
+# a PCS from the design instead of top-level pads.
+xgmii_layout = [
+    ("tx_data", 64),
+    ("tx_ctl",   8),
+    ("rx_data", 64),
+    ("rx_ctl",   8),
+]
+
+def _lane(signal, n, width=8):
+    return signal[n*width:(n+1)*width]
+
+# XGMII TX -----------------------------------------------------------------------------------------
+
+class LiteEthPHYXGMIITX(Module):
+    """XGMII TX
+
+    Frames (preamble/SFD included, as provided by the MAC) are transmitted with the /S/ control
+    character replacing the first preamble octet and are ended with a /T/ control character. /S/ is
+    only allowed on lanes 0 and 4: when starting on lane 4, the frame is shifted by 4 octets.
+
+    The inter-frame gap (/T/ included) is generated here. With the Deficit Idle Count (DIC) the gap
+    can be shortened by up to 3 octets to start on the next allowed lane, the deficit then being
+    compensated on the next gaps so that the average gap stays at 12 octets.
+    """
+    def __init__(self, pads, with_dic=True):
+        self.sink = sink = stream.Endpoint(eth_phy_description(64))
+
+        # # #
+
+        # Signals.
+        data       = Signal(64)
+        ctl        = Signal(8)
+        word       = Signal(64)
+        term       = Signal(4, reset=8)  # /T/ lane (8: none).
+        term_next  = Signal(3)
+        last_lane  = Signal(3)
+        shift      = Signal()
+        sink_hi    = Signal(32)
+        ifg        = Signal(max=17, reset=16)
+        ifg_lane4  = Signal(max=21)
+        ifg_min    = Signal(max=13)
+        deficit    = Signal(2)
+
+        # Output.
+        pads.tx_data.reset_less = True
+        pads.tx_ctl.reset_less  = True
+        self.sync += [
+            pads.tx_data.eq(data),
+            pads.tx_ctl.eq(ctl),
+        ]
+
+        # Word/Terminate encoding (data lanes before /T/, idles after).
+        for i in range(8):
+            self.comb += [
+                If(i < term,
+                    _lane(data, i).eq(_lane(word, i)),
+                    ctl[i].eq(0)
+                ).Elif(i == term,
+                    _lane(data, i).eq(xgmii_terminate),
+                    ctl[i].eq(1)
+                ).Else(
+                    _lane(data, i).eq(xgmii_idle),
+                    ctl[i].eq(1)
+                )
+            ]
+
+        # Last lane (last_be is one-hot, 0 means a full word).
+        self.comb += last_lane.eq(7)
+        for i in range(8):
+            self.comb += If(sink.last_be[i], last_lane.eq(i))
+
+        # Inter-Frame Gap / Deficit Idle Count.
+        self.comb += ifg_lane4.eq(ifg + 4)
+        if with_dic:
+            self.comb += ifg_min.eq(eth_interpacket_gap - 3 + deficit)
+        else:
+            self.comb += ifg_min.eq(eth_interpacket_gap)
+        def update_deficit(gap):
+            if not with_dic:
+                return []
+            return [If((deficit + eth_interpacket_gap) > gap,
+                NextValue(deficit, deficit + eth_interpacket_gap - gap)
+            ).Else(
+                NextValue(deficit, 0)
+            )]
+
+        # FSM.
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            data.eq(Replicate(C(xgmii_idle, 8), 8)),
+            ctl.eq(0xff),
+            NextValue(ifg, Mux(ifg > 8, 16, ifg + 8)),
+            If(sink.valid,
+                # Start on lane 0.
+                If(ifg >= ifg_min,
+                    sink.ready.eq(1),
+                    data.eq(Cat(C(xgmii_start, 8), sink.data[8:])),
+                    ctl.eq(0b00000001),
+                    NextValue(shift, 0),
+                    *update_deficit(ifg),
+                    NextState("DATA")
+                # Start on lane 4.
+                ).Elif(ifg_lane4 >= ifg_min,
+                    sink.ready.eq(1),
+                    data.eq(Cat(Replicate(C(xgmii_idle, 8), 4), C(xgmii_start, 8), sink.data[8:32])),
+                    ctl.eq(0b00011111),
+                    NextValue(shift, 1),
+                    NextValue(sink_hi, sink.data[32:]),
+                    *update_deficit(ifg_lane4),
+                    NextState("DATA")
+                )
+            )
+        )
+        fsm.act("DATA",
+            sink.ready.eq(1),
+            If(shift,
+                word.eq(Cat(sink_hi, sink.data[:32]))
+            ).Else(
+                word.eq(sink.data)
+            ),
+            If(sink.valid,
+                NextValue(sink_hi, sink.data[32:]),
+                If(sink.last,
+                    If(~shift,
+                        If(last_lane == 7,
+                            NextValue(term_next, 0),
+                            NextState("TERMINATE")
+                        ).Else(
+                            term.eq(last_lane + 1),
+                            NextValue(ifg, 7 - last_lane),
+                            NextState("IDLE")
+                        )
+                    ).Else(
+                        If(last_lane >= 3,
+                            NextValue(term_next, last_lane - 3),
+                            NextState("TERMINATE")
+                        ).Else(
+                            term.eq(last_lane + 5),
+                            NextValue(ifg, 3 - last_lane),
+                            NextState("IDLE")
+                        )
+                    )
+                )
+            # Underflow: frames can't be paused on XGMII, signal an error.
+            ).Else(
+                data.eq(Replicate(C(xgmii_error, 8), 8)),
+                ctl.eq(0xff)
+            )
+        )
+        fsm.act("TERMINATE",
+            word.eq(sink_hi),
+            term.eq(term_next),
+            NextValue(ifg, 8 - term_next),
+            NextState("IDLE")
+        )
+
+# XGMII RX -----------------------------------------------------------------------------------------
+
+class LiteEthPHYXGMIIRX(Module):
+    """XGMII RX
+
+    Frames starting on lane 4 are realigned on lane 0 and the /S/ control character is replaced
+    with a preamble octet. The frame ends on the first control character: last_be is set on the
+    octet before it and error is set if this control character is not a /T/.
+    """
+    def __init__(self, pads):
+        self.source = source = stream.Endpoint(eth_phy_description(64))
+
+        # # #
+
+        # Input Register.
+        rx_data = Signal(64, reset_less=True)
+        rx_ctl  = Signal(8,  reset_less=True)
+        self.sync += [
+            rx_data.eq(pads.rx_data),
+            rx_ctl.eq(pads.rx_ctl),
+        ]
+
+        # Lane 4 realignment.
+        shift      = Signal()
+        rx_data_hi = Signal(32, reset_less=True)
+        rx_ctl_hi  = Signal(4,  reset_less=True)
+        start_lane0 = Signal()
+        start_lane4 = Signal()
+        x_data      = Signal(64)
+        x_ctl       = Signal(8)
+        self.comb += [
+            start_lane0.eq(rx_ctl[0] & (_lane(rx_data, 0) == xgmii_start)),
+            start_lane4.eq(rx_ctl[4] & (_lane(rx_data, 4) == xgmii_start)),
+            If(shift & ~start_lane0,
+                x_data.eq(Cat(rx_data_hi, rx_data[:32])),
+                x_ctl.eq(Cat(rx_ctl_hi, rx_ctl[:4]))
+            ).Else(
+                x_data.eq(rx_data),
+                x_ctl.eq(rx_ctl)
+            )
+        ]
+        self.sync += [
+            rx_data_hi.eq(rx_data[32:]),
+            rx_ctl_hi.eq(rx_ctl[4:]),
+            If(start_lane0,
+                shift.eq(0)
+            ).Elif(start_lane4,
+                shift.eq(1)
+            )
+        ]
+
+        # Start / End of frame.
+        x_start   = Signal()
+        x_end     = Signal(4) # Lane of the first control character (8: none).
+        x_end_err = Signal()
+        x_ctl_end = Signal(8)
+        in_frame  = Signal()
+        self.comb += [
+            x_start.eq(x_ctl[0] & (_lane(x_data, 0) == xgmii_start)),
+            x_ctl_end.eq(Cat(x_ctl[0] & ~x_start, x_ctl[1:])),
+            x_end.eq(8),
+        ]
+        for i in reversed(range(8)):
+            self.comb += If(x_ctl_end[i],
+                x_end.eq(i),
+                x_end_err.eq(_lane(x_data, i) != xgmii_terminate)
+            )
+        self.sync += [
+            If(x_start,
+                in_frame.eq(x_end == 8)
+            ).Elif(x_end != 8,
+                in_frame.eq(0)
+            )
+        ]
+
+        # Output (delayed by one word to detect a /T/ on lane 0 of the next word).
+        data  = Signal(64)
+        valid = Signal()
+        end   = Signal(4)
+        err   = Signal()
+        self.sync += [
+            valid.eq((x_start | in_frame) & (x_end != 0)),
+            data.eq(x_data),
+            If(x_start, _lane(data, 0).eq(eth_preamble & 0xff)),
+            end.eq(x_end),
+            err.eq((x_end != 8) & x_end_err),
+        ]
+        self.comb += [
+            source.valid.eq(valid),
+            source.data.eq(data),
+            If(end != 8,
+                source.last.eq(1),
+                source.last_be.eq(Array([2**max(i - 1, 0) for i in range(8)])[end[:3]]),
+                source.error.eq(Replicate(err, 8))
+            ).Elif(x_end == 0,
+                source.last.eq(1),
+                source.last_be.eq(0b10000000),
+                source.error.eq(Replicate(x_end_err, 8))
+            )
+        ]
+
+# XGMII CRG ----------------------------------------------------------------------------------------
+
+class LiteEthPHYXGMIICRG(Module, AutoCSR):
+    def __init__(self, clock_pads, model=False):
+        self._reset = CSRStorage()
+
+        # # #
+
+        self.clock_domains.cd_eth_rx = ClockDomain()
+        self.clock_domains.cd_eth_tx = ClockDomain()
+        if model:
+            self.comb += [
+                self.cd_eth_rx.clk.eq(ClockSignal()),
+                self.cd_eth_tx.clk.eq(ClockSignal())
+            ]
+        else:
+            self.comb += [
+                self.cd_eth_rx.clk.eq(clock_pads.rx),
+                self.cd_eth_tx.clk.eq(clock_pads.tx)
+            ]
+
+        reset = self._reset.storage
+        self.comb += [
+            self.cd_eth_rx.rst.eq(reset),
+            self.cd_eth_tx.rst.eq(reset)
+        ]
+
+# XGMII PHY ----------------------------------------------------------------------------------------
+
+class LiteEthPHYXGMII(Module, AutoCSR):
+    dw          = 64
+    tx_clk_freq = 156.25e6
+    rx_clk_freq = 156.25e6
+    integrated_ifg_inserter = True
+    def __init__(self, clock_pads, pads, model=False, with_dic=True):
+        self.submodules.crg = LiteEthPHYXGMIICRG(clock_pads, model)
+        self.submodules.tx  = ClockDomainsRenamer("eth_tx")(LiteEthPHYXGMIITX(pads, with_dic))
+        self.submodules.rx  = ClockDomainsRenamer("eth_rx")(LiteEthPHYXGMIIRX(pads))
+        self.sink, self.source = self.tx.sink, self.rx.source
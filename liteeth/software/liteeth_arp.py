@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from litex import RemoteClient
+
+class ARPClient:
+    def __init__(self, bus: RemoteClient, prefix="ethcore_arp_table"):
+        self.bus     = bus
+        self.ip      = getattr(bus.regs, prefix + "_static_ip_address")
+        self.mac     = getattr(bus.regs, prefix + "_static_mac_address")
+        self.control = getattr(bus.regs, prefix + "_static_control")
+        # Number of static entries (exported by the gateware as a CSR constant).
+        static_entries = bus.constants.d.get(prefix + "_static_entries", None)
+        if static_entries is None:
+            raise KeyError("{}_static_entries not found in constants".format(prefix))
+        self.static_entries = static_entries
+        # Control layout: index | valid | write (index is bits_for(static_entries - 1) wide).
+        self.index_bits = max((static_entries - 1).bit_length(), 1)
+
+    @staticmethod
+    def convert_ip(s: str) -> int:
+        ip = 0
+        for e in s.split("."):
+            ip = (ip << 8) | int(e)
+        return ip
+
+    @staticmethod
+    def convert_mac(s: str) -> int:
+        return int(s.replace(":", "").replace("-", ""), 16)
+
+    def write(self, index: int, ip: int, mac: int, valid: bool = True):
+        if index >= self.static_entries:
+            raise ValueError("Static entry {} out of range ({} entries)".format(index, self.static_entries))
+        self.ip.write(ip)
+        self.mac.write(mac)
+        self.control.write(index | (int(valid) << self.index_bits) | (1 << (self.index_bits + 1)))
+
+    def clear(self, index: int):
+        self.write(index, 0, 0, valid=False)
+
+    def load(self, table):
+        for index, (ip, mac) in enumerate(table):
+            self.write(index, ip, mac)
+
+def parse_table(filename):
+    table = []
+    with open(filename) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            ip, mac = line.split()
+            table.append((ARPClient.convert_ip(ip), ARPClient.convert_mac(mac)))
+    return table
+
+def main(args):
+    bus = RemoteClient(csr_csv=args.csr_csv)
+    bus.open()
+
+    arpc = ARPClient(bus, prefix=args.prefix)
+
+    for index in args.clear:
+        arpc.clear(index)
+
+    if args.table is not None:
+        table = parse_table(args.table)
+        arpc.load(table)
+        for index, (ip, mac) in enumerate(table):
+            print("{:2d}: {:08x} => {:012x}".format(index, ip, mac))
+
+    bus.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Preload LiteEth static ARP entries.")
+    parser.add_argument("table", nargs="?", default=None, help="ARP table file (one \"ip mac\" per line).")
+    parser.add_argument("--csr-csv", default="csr.csv", help="CSR configuration file.")
+    parser.add_argument("--prefix", default="ethcore_arp_table", help="ARP table CSR prefix.")
+    parser.add_argument("--clear", default=[], type=int, action="append", help="Invalidate static entry.")
+    args = parser.parse_args()
+    main(args)
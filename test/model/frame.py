@@ -0,0 +1,52 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+# Frame Generators ---------------------------------------------------------------------------------
+
+# Frames are lists of bytes, transferred with the first byte on lane 0 (little-endian byte lanes)
+# and last_be marking the last valid byte of the last word.
+
+def frame_sink_generator(sink, frames, stalls=None):
+    # When stalls is given, sink is fed from a PHY (that can't be paused): record words presented
+    # while sink is not ready.
+    bpc = len(sink.data)//8
+    for frame in frames:
+        words = [frame[i:i+bpc] for i in range(0, len(frame), bpc)]
+        for n, word in enumerate(words):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (len(words) - 1))
+            yield sink.last_be.eq(2**(len(word) - 1) if n == (len(words) - 1) else 0)
+            yield sink.data.eq(int.from_bytes(bytes(word), "little"))
+            yield
+            while not (yield sink.ready):
+                if stalls is not None:
+                    stalls.append(1)
+                yield
+    yield sink.valid.eq(0)
+
+def frame_source_generator(source, frames, n=None, cycles=None, errors=None, error=None):
+    # Receive frames until n frames are received and/or for cycles cycles. errors records
+    # source.error for each frame, or the error signal on each cycle when given.
+    bpc   = len(source.data)//8
+    frame = []
+    cycle = 0
+    yield source.ready.eq(1)
+    while ((n is None) or (len(frames) < n)) and ((cycles is None) or (cycle < cycles)):
+        if (errors is not None) and (error is not None):
+            errors.append((yield error))
+        if (yield source.valid):
+            data = (yield source.data).to_bytes(bpc, "little")
+            if (yield source.last):
+                last_be = (yield source.last_be)
+                frame += list(data[:last_be.bit_length() if last_be else bpc])
+                frames.append(frame)
+                if (errors is not None) and (error is None):
+                    errors.append((yield source.error) != 0)
+                frame = []
+            else:
+                frame += list(data)
+        cycle += 1
+        yield
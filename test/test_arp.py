@@ -13,7 +13,7 @@ from litex.soc.interconnect.stream_sim import *
 
 from liteeth.common import *
 from liteeth.mac import LiteEthMAC
-from liteeth.core.arp import LiteEthARP
+from liteeth.core.arp import LiteEthARP, LiteEthARPTable
 
 from test.model import phy, mac, arp
 
@@ -43,6 +43,106 @@ def main_generator(dut):
     print("Received MAC : 0x{:12x}".format((yield dut.arp.table.response.mac_address)))
 
 
+def table_lookup(table, ip_address):
+    # Request.
+    yield table.request.valid.eq(1)
+    yield table.request.ip_address.eq(ip_address)
+    yield
+    while (yield table.request.ready) != 1:
+        yield
+    yield table.request.valid.eq(0)
+    # Response.
+    requests = 0
+    while (yield table.response.valid) != 1:
+        if (yield table.source.valid) and (yield table.source.request):
+            requests += 1
+        yield
+    mac_address = (yield table.response.mac_address)
+    yield table.response.ready.eq(1)
+    yield
+    yield table.response.ready.eq(0)
+    return mac_address, requests
+
+
+def table_reply(table, ip_address, mac_address):
+    yield table.sink.valid.eq(1)
+    yield table.sink.reply.eq(1)
+    yield table.sink.ip_address.eq(ip_address)
+    yield table.sink.mac_address.eq(mac_address)
+    yield
+    yield table.sink.valid.eq(0)
+
+
+def table_generator(table, hosts, errors):
+    yield table.source.ready.eq(1)
+    # Resolve each host (ARP request + reply).
+    for ip_address, mac_address in hosts.items():
+        yield table.request.valid.eq(1)
+        yield table.request.ip_address.eq(ip_address)
+        yield
+        while (yield table.request.ready) != 1:
+            yield
+        yield table.request.valid.eq(0)
+        yield from table_reply(table, ip_address, mac_address)
+        while (yield table.response.valid) != 1:
+            yield
+        yield table.response.ready.eq(1)
+        yield
+        yield table.response.ready.eq(0)
+    # Alternate between hosts: all lookups should hit without new ARP requests.
+    for i in range(2):
+        for ip_address, mac_address in hosts.items():
+            mac, requests = yield from table_lookup(table, ip_address)
+            errors.append((mac != mac_address) + requests)
+
+
+def table_static_generator(table, hosts, errors):
+    yield table.source.ready.eq(1)
+    # Program static entries.
+    index_bits = len(table._static_control.fields.index)
+    for n, (ip_address, mac_address) in enumerate(hosts.items()):
+        yield from table._static_ip_address.write(ip_address)
+        yield from table._static_mac_address.write(mac_address)
+        yield from table._static_control.write(n | (0b11 << index_bits)) # valid + write
+    # Lookups should hit without ARP requests.
+    for ip_address, mac_address in hosts.items():
+        mac, requests = yield from table_lookup(table, ip_address)
+        errors.append((mac != mac_address) + requests)
+
+
+def table_refresh_generator(table, ip_address, mac_address, cycles, errors):
+    yield table.source.ready.eq(1)
+    # Resolve host.
+    yield table.request.valid.eq(1)
+    yield table.request.ip_address.eq(ip_address)
+    yield
+    while (yield table.request.ready) != 1:
+        yield
+    yield table.request.valid.eq(0)
+    yield from table_reply(table, ip_address, mac_address)
+    while (yield table.response.valid) != 1:
+        yield
+    yield table.response.ready.eq(1)
+    yield
+    yield table.response.ready.eq(0)
+    # Keep the entry active: refresh requests are answered and lookups should never miss.
+    yield table.lookup_valid.eq(1)
+    yield table.lookup_ip_address.eq(ip_address)
+    yield
+    refreshes = 0
+    misses    = 0
+    for i in range(cycles):
+        if (yield table.source.valid) and (yield table.source.request):
+            refreshes += 1
+            yield
+            yield from table_reply(table, ip_address, mac_address)
+        if not (yield table.lookup_hit):
+            misses += 1
+        yield
+    errors.append(misses)
+    errors.append(refreshes == 0)
+
+
 class TestARP(unittest.TestCase):
     def test(self):
         dut = DUT()
@@ -56,3 +156,31 @@ class TestARP(unittest.TestCase):
                   "eth_rx": 10,
                   "eth_tx": 10}
         run_simulation(dut, generators, clocks, vcd_name="sim.vcd")
+
+    def test_table(self):
+        hosts = {
+            0x0a000001: 0x000000000001,
+            0x0a000002: 0x000000000002,
+            0x0a000003: 0x000000000003,
+            0x0a000004: 0x000000000004,
+        }
+        errors = []
+        table  = LiteEthARPTable(clk_freq=100000, entries=4)
+        run_simulation(table, table_generator(table, hosts, errors))
+        self.assertEqual(sum(errors), 0)
+
+    def test_table_refresh(self):
+        errors = []
+        table  = LiteEthARPTable(clk_freq=100000, entries=1, entry_timeout=0.08, with_refresh=True)
+        run_simulation(table, table_refresh_generator(table, 0x0a000001, 0x000000000001, 24000, errors))
+        self.assertEqual(sum(errors), 0)
+
+    def test_table_static(self):
+        hosts = {
+            0x0a000001: 0x000000000001,
+            0x0a000002: 0x000000000002,
+        }
+        errors = []
+        table  = LiteEthARPTable(clk_freq=100000, entries=1, static_entries=2)
+        run_simulation(table, table_static_generator(table, hosts, errors))
+        self.assertEqual(sum(errors), 0)
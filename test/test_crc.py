@@ -0,0 +1,77 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+import zlib
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.mac.crc import LiteEthMACCRC32Inserter, LiteEthMACCRC32Checker
+
+from test.model.frame import frame_sink_generator, frame_source_generator
+
+# Generators ---------------------------------------------------------------------------------------
+
+def crc32(frame):
+    return list(zlib.crc32(bytes(frame)).to_bytes(4, "little"))
+
+# Test CRC -----------------------------------------------------------------------------------------
+
+class TestCRC(unittest.TestCase):
+    def frames(self, n=16):
+        prng = random.Random(42)
+        return [[prng.randrange(256) for _ in range(prng.randrange(8, 80))] for _ in range(n)]
+
+    def crc_inserter_test(self, dw):
+        frames   = self.frames()
+        received = []
+        dut = LiteEthMACCRC32Inserter(eth_phy_description(dw))
+        generators = [
+            frame_sink_generator(dut.sink, frames),
+            frame_source_generator(dut.source, received, n=len(frames)),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, [frame + crc32(frame) for frame in frames])
+
+    def crc_checker_test(self, dw):
+        frames    = self.frames()
+        corrupted = [3, 10, 11]
+        inputs    = []
+        for i, frame in enumerate(frames):
+            fcs = crc32(frame)
+            if i in corrupted:
+                fcs[i%4] ^= 0x01
+            inputs.append(frame + fcs)
+        received = []
+        errors   = []
+        dut = LiteEthMACCRC32Checker(eth_phy_description(dw))
+        generators = [
+            frame_sink_generator(dut.sink, inputs),
+            frame_source_generator(dut.source, received, n=len(frames), errors=errors),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, frames)
+        self.assertEqual(errors, [i in corrupted for i in range(len(frames))])
+
+    def test_crc_inserter_8b(self):
+        self.crc_inserter_test(8)
+
+    def test_crc_inserter_32b(self):
+        self.crc_inserter_test(32)
+
+    def test_crc_inserter_64b(self):
+        self.crc_inserter_test(64)
+
+    def test_crc_checker_8b(self):
+        self.crc_checker_test(8)
+
+    def test_crc_checker_32b(self):
+        self.crc_checker_test(32)
+
+    def test_crc_checker_64b(self):
+        self.crc_checker_test(64)
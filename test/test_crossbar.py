@@ -0,0 +1,163 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.crossbar import PriorityArbiter
+from liteeth.mac.common import LiteEthMACCrossbar
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class ArbiterDUT(Module):
+    def __init__(self, priorities, weights):
+        self.masters = [stream.Endpoint(eth_phy_description(8)) for _ in priorities]
+        self.slave   = stream.Endpoint(eth_phy_description(8))
+        self.submodules.arbiter = PriorityArbiter(self.masters, self.slave, priorities, weights)
+
+class CrossbarDUT(Module):
+    def __init__(self):
+        self.submodules.crossbar = crossbar = LiteEthMACCrossbar(8, mtu=16)
+        self.low  = crossbar.get_port(ethernet_type_ip,  8, priority=0, tx_fifo_depth=16)
+        self.high = crossbar.get_port(ethernet_type_arp, 8, priority=1)
+
+    @property
+    def arbiter(self):
+        return self.crossbar.arbiter # Created on finalize.
+
+# Generators ---------------------------------------------------------------------------------------
+
+def master_generator(endpoint, n, length, start=0, gap=0):
+    # n packets of length words tagged with data = packet number.
+    for i in range(start):
+        yield
+    for i in range(n):
+        for j in range(length):
+            yield endpoint.valid.eq(1)
+            yield endpoint.last.eq(j == (length - 1))
+            yield endpoint.data.eq(i)
+            yield
+            while not (yield endpoint.ready):
+                yield
+            yield endpoint.valid.eq(0)
+            for k in range(gap):
+                yield
+    yield endpoint.valid.eq(0)
+
+def wait_generator(cycles):
+    for i in range(cycles):
+        yield
+
+@passive
+def slave_generator(dut, slave, packets):
+    # Record (granted master, packet number, length) of the packets.
+    length = 0
+    yield slave.ready.eq(1)
+    while True:
+        if (yield slave.valid) and (yield slave.ready):
+            length += 1
+            if (yield slave.last):
+                packets.append(((yield dut.arbiter.grant), (yield slave.data), length))
+                length = 0
+        yield
+
+# Test Crossbar ------------------------------------------------------------------------------------
+
+class TestCrossbar(unittest.TestCase):
+    def arbiter_test(self, priorities, weights, n=6, length=4, starts=None):
+        dut     = ArbiterDUT(priorities, weights)
+        packets = []
+        starts  = starts or [0]*len(priorities)
+        generators = [master_generator(m, n, length, s) for m, s in zip(dut.masters, starts)]
+        generators.append(slave_generator(dut, dut.slave, packets))
+        run_simulation(dut, generators)
+        # Packets are never interleaved.
+        self.assertEqual(len(packets), n*len(priorities))
+        for master, number, l in packets:
+            self.assertEqual(l, length)
+        for i in range(len(priorities)):
+            self.assertEqual([p[1] for p in packets if p[0] == i], list(range(n)))
+        return [p[0] for p in packets]
+
+    def test_arbiter_round_robin(self):
+        grants = self.arbiter_test([0, 0, 0], [1, 1, 1])
+        self.assertEqual(grants, [0, 1, 2]*6)
+
+    def test_arbiter_weighted_round_robin(self):
+        grants = self.arbiter_test([0, 0], [2, 1])
+        self.assertEqual(grants[:9], [0, 0, 1]*3)
+
+    def test_arbiter_strict_priority(self):
+        # Master 2 starts later but overtakes at the next packet boundary.
+        grants = self.arbiter_test([0, 0, 1], [1, 1, 1], starts=[0, 0, 6])
+        self.assertEqual(grants[:8], [0, 1] + [2]*6)
+        self.assertEqual(grants[8:], [0, 1]*5)
+
+    def test_crossbar_tx_fifo(self):
+        # A slow low priority port with a TX FIFO does not hold the crossbar: the high priority
+        # packet (presented later) is sent first.
+        dut     = CrossbarDUT()
+        packets = []
+        generators = [
+            master_generator(dut.low.sink,  1, 8, gap=2),
+            master_generator(dut.high.sink, 1, 8, start=4),
+            slave_generator(dut, dut.crossbar.master.source, packets),
+            wait_generator(64),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(packets, [(1, 0, 8), (0, 0, 8)])
+
+    def test_crossbar_tx_fifo_depth(self):
+        # TX FIFOs smaller than the MTU would deadlock the port.
+        crossbar = LiteEthMACCrossbar(8)
+        crossbar.get_port(ethernet_type_ip, 8, tx_fifo_depth=1024)
+        with self.assertRaises(ValueError):
+            crossbar.finalize()
+
+    def test_crossbar_rx_modes(self):
+        # Packets with errors are dropped by store-and-forward ports, forwarded (with error) by
+        # cut-through ports.
+        crossbar = LiteEthMACCrossbar(8)
+        ports    = [
+            crossbar.get_port(ethernet_type_ip,  8),
+            crossbar.get_port(ethernet_type_arp, 8, rx_mode="store-and-forward", rx_buffer_depth=16),
+        ]
+        received = [[], []]
+        errors   = [1, 0, 1, 0]
+        def sink_generator():
+            sink = crossbar.master.sink
+            for ethernet_type in [ethernet_type_ip, ethernet_type_arp]:
+                for n, error in enumerate(errors):
+                    for j in range(8):
+                        yield sink.valid.eq(1)
+                        yield sink.ethernet_type.eq(ethernet_type)
+                        yield sink.last.eq(j == 7)
+                        yield sink.error.eq(error if j == 7 else 0)
+                        yield sink.data.eq(n)
+                        yield
+                        while not (yield sink.ready):
+                            yield
+            yield sink.valid.eq(0)
+            for i in range(64):
+                yield
+
+        @passive
+        def source_generator(source, packets):
+            yield source.ready.eq(1)
+            while True:
+                if (yield source.valid) and (yield source.last):
+                    packets.append(((yield source.data), (yield source.error)))
+                yield
+
+        run_simulation(crossbar, [
+            sink_generator(),
+            source_generator(ports[0].source, received[0]),
+            source_generator(ports[1].source, received[1]),
+        ])
+        self.assertEqual(received[0], [(0, 1), (1, 0), (2, 1), (3, 0)])
+        self.assertEqual(received[1], [(1, 0), (3, 0)])
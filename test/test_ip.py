@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import unittest
+import random
 
 from migen import *
 
@@ -13,6 +14,8 @@ from litex.soc.interconnect.stream_sim import *
 
 from liteeth.common import *
 from liteeth.core import LiteEthIPCore
+from liteeth.core.arp import LiteEthARPTable
+from liteeth.core.ip import LiteEthIPV4Checksum, LiteEthIPTX, LiteEthIPRX
 
 from test.model import phy, mac, arp, ip
 
@@ -23,13 +26,13 @@ mac_address = 0x12345678abcd
 
 
 class DUT(Module):
-    def __init__(self):
+    def __init__(self, core_mac_address=mac_address, core_ip_address=ip_address, **kwargs):
         self.submodules.phy_model = phy.PHY(8, debug=False)
         self.submodules.mac_model = mac.MAC(self.phy_model, debug=False, loopback=False)
         self.submodules.arp_model = arp.ARP(self.mac_model, mac_address, ip_address, debug=False)
         self.submodules.ip_model = ip.IP(self.mac_model, mac_address, ip_address, debug=False, loopback=True)
 
-        self.submodules.ip = LiteEthIPCore(self.phy_model, mac_address, ip_address, 100000)
+        self.submodules.ip = LiteEthIPCore(self.phy_model, core_mac_address, core_ip_address, 100000, **kwargs)
         self.ip_port = self.ip.ip.crossbar.get_port(udp_protocol)
 
 
@@ -45,6 +48,154 @@ def main_generator(dut):
     print("packet from IP 0x{:08x}".format((yield dut.ip_port.sink.ip_address)))
 
 
+def address_csrs_generator(dut, errors):
+    # Re-address the core at runtime, then run a loopback through the IP model.
+    yield from dut.ip._mac_address.write(mac_address)
+    yield from dut.ip._ip_address.write(ip_address)
+    yield dut.ip_port.sink.valid.eq(1)
+    yield dut.ip_port.sink.last.eq(1)
+    yield dut.ip_port.sink.ip_address.eq(ip_address)
+    yield dut.ip_port.sink.protocol.eq(udp_protocol)
+    yield dut.ip_port.source.ready.eq(1)
+    for i in range(2048):
+        if (yield dut.ip_port.source.valid) and (yield dut.ip_port.source.last):
+            return
+        yield
+    errors.append(1)
+
+
+class IPTXDUT(Module):
+    def __init__(self, arp_entry_timeout=10, **kwargs):
+        self.submodules.arp_table = LiteEthARPTable(clk_freq=100000, entries=4, entry_timeout=arp_entry_timeout)
+        self.submodules.ip_tx     = LiteEthIPTX(mac_address, ip_address, self.arp_table,
+            dummy_checksum = True,
+            pending_depth  = 128,
+            **kwargs)
+
+
+def ip_tx_sink_generator(dut, packets, gap=0):
+    sink = dut.ip_tx.sink
+    for target_ip, length in packets:
+        for i in range(gap):
+            yield
+        for n in range(length):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (length - 1))
+            yield sink.ip_address.eq(target_ip)
+            yield sink.protocol.eq(udp_protocol)
+            yield sink.length.eq(length)
+            yield sink.data.eq(n)
+            yield
+            while (yield sink.ready) == 0:
+                yield
+        yield sink.valid.eq(0)
+    for i in range(2048):
+        yield
+
+
+@passive
+def arp_responder_generator(dut, delays, requests=None):
+    # Replies with target_ip as MAC address (+ 2**32 for each previous request to target_ip).
+    table  = dut.arp_table
+    counts = {}
+    yield table.source.ready.eq(1)
+    while True:
+        if (yield table.source.valid) and (yield table.source.request):
+            target_ip = (yield table.source.ip_address)
+            target_mac = target_ip + (counts.get(target_ip, 0) << 32)
+            counts[target_ip] = counts.get(target_ip, 0) + 1
+            if requests is not None:
+                requests.append(target_ip)
+            for i in range(delays.get(target_ip, 16)):
+                yield
+            yield table.sink.valid.eq(1)
+            yield table.sink.reply.eq(1)
+            yield table.sink.ip_address.eq(target_ip)
+            yield table.sink.mac_address.eq(target_mac)
+            yield
+            yield table.sink.valid.eq(0)
+        yield
+
+
+@passive
+def ip_tx_source_generator(dut, frames):
+    source = dut.ip_tx.source
+    yield source.ready.eq(1)
+    cycle = 0
+    first = True
+    while True:
+        if (yield source.valid):
+            if first:
+                frames.append({"target_mac": (yield source.target_mac), "start": cycle, "length": 0})
+                first = False
+            frames[-1]["length"] += 1
+            if (yield source.last):
+                frames[-1]["end"] = cycle
+                first = True
+        cycle += 1
+        yield
+
+
+def ip_rx_sink_generator(dut, packets):
+    sink = dut.sink
+    for i, (target_mac, target_ip) in enumerate(packets):
+        header  = [0x45, 0x00, 0x00, 24, 0x00, 0x00, 0x00, 0x00, 0x80, udp_protocol, 0x00, 0x00]
+        header += list((0x0a000001).to_bytes(4, "big"))
+        header += list(target_ip.to_bytes(4, "big"))
+        data    = header + [i, 1, 2, 3]
+        for n, byte in enumerate(data):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (len(data) - 1))
+            yield sink.target_mac.eq(target_mac)
+            yield sink.data.eq(byte)
+            yield
+            while (yield sink.ready) == 0:
+                yield
+        yield sink.valid.eq(0)
+    for i in range(64):
+        yield
+
+
+@passive
+def ip_rx_source_generator(dut, packets):
+    source = dut.source
+    yield source.ready.eq(1)
+    first = True
+    while True:
+        if (yield source.valid):
+            if first:
+                packets.append(((yield source.data), (yield source.ip_index)))
+            first = bool((yield source.last))
+        yield
+
+
+def checksum_generator(tx_checksum, rx_checksum, headers, errors, max_cycles):
+    checksum_offset = ipv4_header.fields["checksum"].byte*8
+    for header in headers:
+        # TX: compute checksum (checksum field skipped).
+        yield tx_checksum.header.eq(header)
+        yield tx_checksum.ce.eq(1)
+        yield tx_checksum.reset.eq(1)
+        yield
+        yield tx_checksum.reset.eq(0)
+        for cycles in range(max_cycles + 1):
+            yield
+            if (yield tx_checksum.done):
+                break
+        errors.append(cycles > max_cycles)
+        value = (yield tx_checksum.value)
+        # RX: verify header with inserted checksum.
+        header |= int.from_bytes(value.to_bytes(2, "big"), "little") << checksum_offset
+        yield rx_checksum.header.eq(header)
+        yield rx_checksum.ce.eq(1)
+        yield rx_checksum.reset.eq(1)
+        yield
+        yield rx_checksum.reset.eq(0)
+        while not (yield rx_checksum.done):
+            yield
+        errors.append((yield rx_checksum.value) != 0)
+
+
 class TestIP(unittest.TestCase):
     def test(self):
         dut = DUT()
@@ -58,3 +209,176 @@ class TestIP(unittest.TestCase):
                   "eth_rx": 10,
                   "eth_tx": 10}
         run_simulation(dut, generators, clocks, vcd_name="sim.vcd")
+
+    def test_address_csrs(self):
+        errors = []
+        # Build with different reset addresses to check the runtime ones are used.
+        dut = DUT(core_mac_address=0, core_ip_address=0, with_address_csrs=True)
+        generators = {
+            "sys" :   [address_csrs_generator(dut, errors)],
+            "eth_tx": [dut.phy_model.phy_sink.generator(),
+                       dut.phy_model.generator()],
+            "eth_rx":  dut.phy_model.phy_source.generator()
+        }
+        clocks = {"sys":    10,
+                  "eth_rx": 10,
+                  "eth_tx": 10}
+        run_simulation(dut, generators, clocks)
+        self.assertEqual(errors, [])
+
+    def checksum_test(self, dw, max_cycles):
+        prng    = random.Random(42)
+        headers = [prng.randrange(2**(ipv4_header.length*8)) & ~(0xffff << 80) for i in range(16)]
+        errors  = []
+        dut = Module()
+        dut.submodules.tx = tx = LiteEthIPV4Checksum(skip_checksum=True,  dummy=False, dw=dw)
+        dut.submodules.rx = rx = LiteEthIPV4Checksum(skip_checksum=False, dummy=False, dw=dw)
+        run_simulation(dut, checksum_generator(tx, rx, headers, errors, max_cycles))
+        self.assertEqual(sum(errors), 0)
+
+    def test_checksum_8b(self):
+        self.checksum_test(dw=8, max_cycles=4)
+
+    def test_checksum_32b(self):
+        self.checksum_test(dw=32, max_cycles=2)
+
+    def test_checksum_64b(self):
+        self.checksum_test(dw=64, max_cycles=2)
+
+    def test_tx_pending(self):
+        host_a = 0x0a000001
+        host_b = 0x0a000002
+        host_c = 0x0a000003
+        packets = [
+            # Warm-up: Resolve Host A and B.
+            (host_a, 16), (host_b, 16),
+            # Host C is slow to resolve, packets to Host A/B should not be blocked.
+            (host_c, 16), (host_a, 16), (host_b, 16), (host_a, 16), (host_b, 16),
+        ]
+        frames = []
+        dut = IPTXDUT()
+        generators = [
+            ip_tx_sink_generator(dut, packets),
+            arp_responder_generator(dut, delays={host_c: 1024}),
+            ip_tx_source_generator(dut, frames),
+        ]
+        run_simulation(dut, generators)
+        target_macs = [frame["target_mac"] for frame in frames]
+        self.assertEqual(target_macs, [host_a, host_b, host_a, host_b, host_a, host_b, host_c])
+        # Resolved frames are sent back-to-back.
+        for i in range(2, 5):
+            self.assertEqual(frames[i+1]["start"], frames[i]["end"] + 1)
+
+    def test_tx_pending_multiple(self):
+        host_a = 0x0a000001
+        host_b = 0x0a000002
+        host_c = 0x0a000003
+        host_d = 0x0a000004
+        packets = [
+            # Warm-up: Resolve Host A and B.
+            (host_a, 16), (host_b, 16),
+            # Host C and D are slow to resolve, packets to Host A/B should not be blocked.
+            (host_c, 16), (host_d, 16), (host_a, 16), (host_b, 16), (host_a, 16), (host_b, 16),
+        ]
+        frames = []
+        dut = IPTXDUT()
+        generators = [
+            ip_tx_sink_generator(dut, packets),
+            arp_responder_generator(dut, delays={host_c: 512, host_d: 512}),
+            ip_tx_source_generator(dut, frames),
+        ]
+        run_simulation(dut, generators)
+        target_macs = [frame["target_mac"] for frame in frames]
+        self.assertEqual(target_macs, [host_a, host_b, host_a, host_b, host_a, host_b, host_c, host_d])
+
+    def test_tx_pending_order(self):
+        # A packet to the host being resolved is submitted around the ARP reply (while the ARP Table
+        # already hits but the parked packet is not flushed yet): it must not be sent ahead of the
+        # packet parked for this host.
+        host_c = 0x0a000003
+        for delay in range(90, 98):
+            packets = [(host_c, 16), (host_c, 20)]
+            frames  = []
+            dut = IPTXDUT()
+            generators = [
+                ip_tx_sink_generator(dut, packets, gap=64),
+                arp_responder_generator(dut, delays={host_c: delay}),
+                ip_tx_source_generator(dut, frames),
+            ]
+            run_simulation(dut, generators)
+            lengths = [frame["length"] - ipv4_header.length for frame in frames]
+            self.assertEqual([frame["target_mac"] for frame in frames], [host_c, host_c])
+            self.assertEqual(lengths, [16, 20], msg="delay={}".format(delay))
+
+    def test_tx_gateway(self):
+        gateway = 0x12345601
+        local   = 0x12345602
+        remote  = [0x0a000001, 0x0a000002, 0x0a000003]
+        packets = [(remote[0], 16), (local, 16), (remote[1], 16), (remote[2], 16), (local, 16)]
+        frames   = []
+        requests = []
+        dut = IPTXDUT(gateway=gateway, netmask=0xffffff00)
+        generators = [
+            ip_tx_sink_generator(dut, packets),
+            arp_responder_generator(dut, delays={}, requests=requests),
+            ip_tx_source_generator(dut, frames),
+        ]
+        run_simulation(dut, generators)
+        target_macs = [frame["target_mac"] for frame in frames]
+        self.assertEqual(target_macs, [gateway, local, gateway, gateway, local])
+        # Gateway is only resolved once for all off-subnet destinations.
+        self.assertEqual(requests, [gateway, local])
+
+    def test_tx_gateway_expiration(self):
+        # The Gateway's MAC address changes: it must be re-resolved once its ARP entry expired.
+        gateway = 0x12345601
+        remote  = [0x0a000001, 0x0a000002]
+        packets = [(remote[0], 16), (remote[1], 16)]
+        frames   = []
+        requests = []
+        dut = IPTXDUT(arp_entry_timeout=0.01, gateway=gateway, netmask=0xffffff00)
+        generators = [
+            ip_tx_sink_generator(dut, packets, gap=2048),
+            arp_responder_generator(dut, delays={}, requests=requests),
+            ip_tx_source_generator(dut, frames),
+        ]
+        run_simulation(dut, generators)
+        target_macs = [frame["target_mac"] for frame in frames]
+        self.assertEqual(len(target_macs), 2)
+        self.assertEqual(target_macs[0], gateway)
+        self.assertEqual(target_macs[1] & 0xffffffff, gateway)
+        self.assertNotEqual(target_macs[1], gateway)
+        self.assertEqual(set(requests), {gateway})
+
+    def test_rx_multiple_ips(self):
+        local_ips = [0x0a000010, 0x0a000011, 0x0a000012]
+        packets   = [(mac_address, ip) for ip in [local_ips[1], 0x0a000013, local_ips[0], local_ips[2]]]
+        received  = []
+        dut = LiteEthIPRX(mac_address, local_ips, dummy_checksum=True)
+        generators = [
+            ip_rx_sink_generator(dut, packets),
+            ip_rx_source_generator(dut, received),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, [(0, 1), (2, 0), (3, 2)])
+
+    def test_rx_broadcast_multicast(self):
+        group_a = 0xef010101 # 239.1.1.1
+        group_b = 0xef010102 # 239.1.1.2
+        packets = [
+            (mac_address,    ip_address), # Unicast.
+            (0xffffffffffff, 0xffffffff), # Broadcast.
+            (0x01005e010101, group_a),    # Subscribed group.
+            (0x01005e010102, group_b),    # Unsubscribed group: dropped.
+            (0x01005e010102, group_a),    # Subscribed group with non matching MAC: dropped.
+            (0x01005e010101, group_a),    # Subscribed group.
+        ]
+        received = []
+        dut = LiteEthIPRX(mac_address, ip_address, dummy_checksum=True, with_broadcast=True, mcast_groups=2)
+        def generator():
+            index_bits = len(dut._mcast_control.fields.index)
+            yield from dut._mcast_ip_address.write(group_a)
+            yield from dut._mcast_control.write(1 | (0b11 << index_bits)) # index 1 + valid + write
+            yield from ip_rx_sink_generator(dut, packets)
+        run_simulation(dut, [generator(), ip_rx_source_generator(dut, received)])
+        self.assertEqual([data for data, ip_index in received], [0, 1, 2, 5])
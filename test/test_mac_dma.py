@@ -0,0 +1,150 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+from liteeth.common import *
+from liteeth.mac.dma import LiteEthMACDMAWriter, LiteEthMACDMAInterface
+
+from test.model.frame import frame_sink_generator
+
+# Memory Map (in bytes) ----------------------------------------------------------------------------
+
+tx_ring   = 0x0000
+rx_ring   = 0x0100
+tx_buffer = lambda n: 0x0200 + n*0x100
+rx_buffer = lambda n: 0x0a00 + n*0x100
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class DUT(Module):
+    # DMA Interface with TX looped back to RX and a system memory.
+    def __init__(self, frames, nslots=8):
+        self.submodules.interface = LiteEthMACDMAInterface(32, nslots, nslots)
+        self.comb += self.interface.source.connect(self.interface.sink)
+
+        # System memory: TX descriptors/buffers filled with the frames, RX descriptors.
+        init = [0]*1024
+        for n in range(nslots):
+            init[(rx_ring + 8*n)//4] = rx_buffer(n)
+        for n, frame in enumerate(frames):
+            init[(tx_ring + 8*n)//4 + 0] = tx_buffer(n)
+            init[(tx_ring + 8*n)//4 + 1] = len(frame)
+            padded = frame + [0]*(-len(frame)%4)
+            for i in range(len(padded)//4):
+                init[tx_buffer(n)//4 + i] = int.from_bytes(bytes(padded[4*i:4*(i+1)]), "big")
+        self.mem = Memory(32, 1024, init=init)
+        self.submodules.sram = wishbone.SRAM(self.mem, bus=self.interface.bus)
+
+class WriterDUT(Module):
+    # DMA Writer fed directly and a system memory with the RX buffers filled with a guard pattern.
+    def __init__(self, mtu, nslots=4):
+        self.submodules.writer = LiteEthMACDMAWriter(32, nslots, endianness="little", mtu=mtu)
+
+        init = [0]*1024
+        for n in range(nslots):
+            init[(rx_ring + 8*n)//4] = rx_buffer(n)
+            for i in range(0x100//4):
+                init[rx_buffer(n)//4 + i] = guard
+        self.mem = Memory(32, 1024, init=init)
+        self.submodules.sram = wishbone.SRAM(self.mem, bus=self.writer.bus)
+
+guard = 0x5a5a5a5a
+
+# Generators ---------------------------------------------------------------------------------------
+
+def main_generator(dut, nframes, nrx, results):
+    writer = dut.interface.writer
+    reader = dut.interface.reader
+    yield writer._base.storage.eq(rx_ring)
+    yield reader._base.storage.eq(tx_ring)
+    yield writer._tail.storage.eq(nrx)
+    yield reader._tail.storage.eq(nframes)
+    yield
+    timeout = 0
+    while (yield reader._head.status) != nframes:
+        timeout += 1
+        assert timeout < 4096
+        yield
+    for i in range(512):
+        yield
+    results["rx_head"] = (yield writer._head.status)
+    results["errors"]  = (yield writer._errors.status)
+    results["frames"]  = []
+    for n in range(results["rx_head"]):
+        length = (yield dut.mem[(rx_ring + 8*n)//4 + 1])
+        data   = []
+        for i in range((length + 3)//4):
+            data += list((yield dut.mem[rx_buffer(n)//4 + i]).to_bytes(4, "big"))
+        results["frames"].append(data[:length])
+
+def writer_generator(dut, nslots, results):
+    writer = dut.writer
+    yield writer._base.storage.eq(rx_ring)
+    yield writer._tail.storage.eq(nslots - 1)
+    for i in range(2048):
+        yield
+    results["rx_head"] = (yield writer._head.status)
+    results["errors"]  = (yield writer._errors.status)
+    results["frames"]  = []
+    results["buffers"] = []
+    for n in range(nslots):
+        length = (yield dut.mem[(rx_ring + 8*n)//4 + 1])
+        data   = []
+        for i in range(0x100//4):
+            data += list((yield dut.mem[rx_buffer(n)//4 + i]).to_bytes(4, "little"))
+        results["buffers"].append(data)
+        if n < results["rx_head"]:
+            results["frames"].append(data[:length])
+
+# Test MAC DMA -------------------------------------------------------------------------------------
+
+class TestMACDMA(unittest.TestCase):
+    def dma_test(self, nframes, nrx):
+        prng    = random.Random(42)
+        frames  = [[prng.randrange(256) for _ in range(prng.randrange(60, 128))] for n in range(nframes)]
+        results = {}
+        dut     = DUT(frames)
+        run_simulation(dut, main_generator(dut, nframes, nrx, results))
+        return frames, results
+
+    def test_dma(self):
+        frames, results = self.dma_test(nframes=5, nrx=7)
+        self.assertEqual(results["rx_head"], 5)
+        self.assertEqual(results["errors"],  0)
+        self.assertEqual(results["frames"],  frames)
+
+    def test_dma_no_descriptor(self):
+        # Only 2 RX descriptors are given to the hardware: the following frames are dropped.
+        frames, results = self.dma_test(nframes=4, nrx=2)
+        self.assertEqual(results["rx_head"], 2)
+        self.assertEqual(results["errors"],  2)
+        self.assertEqual(results["frames"],  frames[:2])
+
+    def test_dma_too_big(self):
+        # Frames larger than mtu are dropped and nothing is written past mtu bytes.
+        mtu     = 126
+        nslots  = 4
+        prng    = random.Random(42)
+        frames  = [[prng.randrange(256) for _ in range(length)] for length in [100, mtu + 1, 200, mtu]]
+        results = {}
+        dut     = WriterDUT(mtu, nslots)
+        generators = [
+            frame_sink_generator(dut.writer.sink, frames),
+            writer_generator(dut, nslots, results),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(results["rx_head"], 2)
+        self.assertEqual(results["errors"],  2)
+        self.assertEqual(results["frames"],  [frames[0], frames[3]])
+        guard_bytes = list(guard.to_bytes(4, "little"))*(0x100//4)
+        for buffer in results["buffers"]:
+            self.assertEqual(buffer[mtu:], guard_bytes[mtu:])
@@ -9,10 +9,12 @@ import unittest
 from migen import *
 
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr_bus import CSRBankArray
 from litex.soc.interconnect.stream_sim import *
 
 from liteeth.common import *
 from liteeth.mac import LiteEthMAC
+from liteeth.mac.wishbone import LiteEthMACWishboneInterface
 
 from test.model import phy, mac
 
@@ -29,7 +31,7 @@ class WishboneMaster:
         yield self.obj.stb.eq(1)
         yield self.obj.adr.eq(adr)
         yield self.obj.we.eq(1)
-        yield self.obj.sel.eq(0xf)
+        yield self.obj.sel.eq(2**len(self.obj.sel) - 1)
         yield self.obj.dat_w.eq(dat)
         while not (yield self.obj.ack):
             yield
@@ -42,7 +44,7 @@ class WishboneMaster:
         yield self.obj.stb.eq(1)
         yield self.obj.adr.eq(adr)
         yield self.obj.we.eq(0)
-        yield self.obj.sel.eq(0xf)
+        yield self.obj.sel.eq(2**len(self.obj.sel) - 1)
         yield self.obj.dat_w.eq(0)
         while not (yield self.obj.ack):
             yield
@@ -144,7 +146,246 @@ def main_generator(dut):
             print("shift " + str(s) + " / length " + str(l) + " / errors " + str(e))
 
 
+def jumbo_sink_generator(sink, frames):
+    for frame in frames:
+        words = [frame[i:i+4] for i in range(0, len(frame), 4)]
+        for n, word in enumerate(words):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (len(words) - 1))
+            yield sink.data.eq(int.from_bytes(bytes(word), "big"))
+            yield
+        # Inter-frame gap.
+        yield sink.valid.eq(0)
+        for i in range(8):
+            yield
+
+
+def jumbo_main_generator(dut, frames, received, lengths):
+    wishbone_master    = WishboneMaster(dut.bus)
+    sram_writer_driver = SRAMWriterDriver(dut.sram.writer)
+    for frame in frames:
+        yield from sram_writer_driver.wait_available()
+        slot   = (yield dut.sram.writer._slot.status)
+        length = (yield dut.sram.writer._length.status)
+        data   = []
+        for i in range(length//4):
+            yield from wishbone_master.read(slot*dut.slot_size//4 + i)
+            data += list(wishbone_master.dat.to_bytes(4, byteorder="big"))
+        received.append(data)
+        lengths.append(length)
+        yield from sram_writer_driver.clear_available()
+
+
+def ring_main_generator(dut, nframes, received, results):
+    # Wait for the frames, then drain the ring (lengths table, slots) and release it in batch.
+    wishbone_master = WishboneMaster(dut.bus)
+    writer          = dut.sram.writer
+    nslots          = writer.lengths.depth
+    for i in range(nframes*32):
+        yield
+    results["errors"] = (yield writer._errors.status)
+    consumer = (yield writer._consumer.storage)
+    producer = (yield writer._producer.status)
+    while consumer != producer:
+        slot   = consumer%nslots
+        length = (yield writer.lengths[slot])
+        data   = []
+        for i in range((length + 3)//4):
+            yield from wishbone_master.read(slot*dut.slot_size//4 + i)
+            data += list(wishbone_master.dat.to_bytes(4, byteorder="big"))
+        received.append(data[:length])
+        consumer = (consumer + 1)%(2*nslots)
+    yield writer._consumer.storage.eq(consumer)
+    yield writer._consumer.re.eq(1)
+    yield
+    yield writer._consumer.re.eq(0)
+    yield
+    results["available"] = (yield writer.ev.available.status)
+
+
+def burst_main_generator(dut, frame, results):
+    # Incrementing burst reads of the RX slot, burst writes of a TX slot.
+    bus = dut.bus
+    sram_writer_driver = SRAMWriterDriver(dut.sram.writer)
+    yield from sram_writer_driver.wait_available()
+    for write in [False, True]:
+        adr  = (dut.slot_size//4)*(2 if write else 0) # RX slot 0 / TX slot 0.
+        n    = len(frame)//4
+        data = []
+        yield bus.cyc.eq(1)
+        yield bus.stb.eq(1)
+        yield bus.we.eq(write)
+        yield bus.sel.eq(0xf)
+        yield bus.adr.eq(adr)
+        yield bus.dat_w.eq(0x5a000000)
+        yield bus.cti.eq(wishbone.CTI_BURST_INCREMENTING)
+        yield bus.bte.eq(0)
+        cycles = 0
+        while len(data) < n:
+            yield
+            cycles += 1
+            if (yield bus.ack):
+                data.append((yield bus.dat_r))
+                yield bus.adr.eq(adr + len(data))
+                yield bus.dat_w.eq(0x5a000000 + len(data))
+                yield bus.cti.eq(wishbone.CTI_BURST_END if len(data) == (n - 1) else wishbone.CTI_BURST_INCREMENTING)
+        yield bus.cyc.eq(0)
+        yield bus.stb.eq(0)
+        yield
+        results["write" if write else "read"] = (data, cycles)
+    results["tx"] = []
+    for i in range(n):
+        results["tx"].append((yield dut.sram.reader.mem[i]))
+
+
+class LoopbackDUT(Module):
+    def __init__(self, dw, endianness):
+        self.submodules.interface = LiteEthMACWishboneInterface(dw=dw, endianness=endianness)
+        self.comb += self.interface.source.connect(self.interface.sink)
+
+
+def loopback_main_generator(dut, frames, endianness, received):
+    # Frames written to the TX slot, sent and read back from the RX slot.
+    interface          = dut.interface
+    wishbone_master    = WishboneMaster(interface.bus)
+    sram_reader_driver = SRAMReaderDriver(interface.sram.reader)
+    sram_writer_driver = SRAMWriterDriver(interface.sram.writer)
+    bpw   = len(interface.bus.dat_w)//8
+    words = interface.slot_size//bpw
+    for n, frame in enumerate(frames):
+        slot   = n%2
+        padded = frame + [0]*(-len(frame)%bpw)
+        for i in range(len(padded)//bpw):
+            dat = int.from_bytes(bytes(padded[bpw*i:bpw*(i+1)]), endianness)
+            yield from wishbone_master.write((2 + slot)*words + i, dat)
+        yield from sram_reader_driver.start(slot, len(frame))
+        yield from sram_reader_driver.wait_done()
+        yield from sram_reader_driver.clear_done()
+        yield from sram_writer_driver.wait_available()
+        rx_slot = (yield interface.sram.writer._slot.status)
+        length  = (yield interface.sram.writer._length.status)
+        data    = []
+        for i in range((length + bpw - 1)//bpw):
+            yield from wishbone_master.read(rx_slot*words + i)
+            data += list(wishbone_master.dat.to_bytes(bpw, byteorder=endianness))
+        received.append(data[:length])
+        yield from sram_writer_driver.clear_available()
+
+
+class CoalescingDUT(Module):
+    def __init__(self):
+        self.submodules.interface = LiteEthMACWishboneInterface(dw=32, nrxslots=8, with_irq_coalescing=True)
+        self.sink, self.sram = self.interface.sink, self.interface.sram
+        # CSRs (EventManagers) are only connected in a CSR bank.
+        self.submodules.csr_banks = CSRBankArray(self, lambda name, memory: 0)
+
+
+def coalescing_main_generator(dut, frames, timeout, events):
+    # Record (frames stored, cycle) at each IRQ rising edge.
+    yield dut.sram.ev._coalescing_frames.storage.eq(frames)
+    yield dut.sram.ev._coalescing_timeout.storage.eq(timeout)
+    yield dut.sram.writer.ev.enable.storage.eq(1)
+    stored = 0
+    irq    = 0
+    for cycle in range(1024):
+        yield
+        if (yield dut.sram.writer.frame_done):
+            stored += 1
+        if (yield dut.sram.ev.irq) and not irq:
+            events.append((stored, cycle))
+        irq = (yield dut.sram.ev.irq)
+
+
 class TestMACWishbone(unittest.TestCase):
+    def coalescing_test(self, nframes, frames, timeout):
+        events = []
+        dut    = CoalescingDUT()
+        generators = [
+            jumbo_sink_generator(dut.sink, [[i for i in range(64)]]*nframes),
+            coalescing_main_generator(dut, frames, timeout, events),
+        ]
+        run_simulation(dut, generators)
+        return events
+
+    def test_irq_coalescing(self):
+        # No thresholds: IRQ raised with the first frame (and kept pending).
+        self.assertEqual([e[0] for e in self.coalescing_test(4, frames=0, timeout=0)], [1])
+        # Frame count threshold.
+        self.assertEqual([e[0] for e in self.coalescing_test(4, frames=3, timeout=0)], [3])
+        # Timeout threshold: IRQ raised 256 cycles after the first frame.
+        events = self.coalescing_test(1, frames=8, timeout=256)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], 1)
+        self.assertTrue(256 <= events[0][1] < 256 + 32)
+
+
+    def test_ring(self):
+        # 40 frames in a 32 slots ring: the last 8 frames are dropped (ring full).
+        frames   = [[(i + n)%256 for i in range(60 + 4*(n%8))] for n in range(40)]
+        received = []
+        results  = {}
+        dut = LiteEthMACWishboneInterface(dw=32, nrxslots=32)
+        generators = [
+            jumbo_sink_generator(dut.sink, frames),
+            ring_main_generator(dut, len(frames), received, results),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(results["errors"], 8)
+        self.assertEqual(received, frames[:32])
+        self.assertEqual(results["available"], 0)
+
+    def test_burst(self):
+        frame   = [i%256 for i in range(256)]
+        results = {}
+        dut = LiteEthMACWishboneInterface(dw=32)
+        generators = [
+            jumbo_sink_generator(dut.sink, [frame]),
+            burst_main_generator(dut, frame, results),
+        ]
+        run_simulation(dut, generators)
+        # RX slot burst read at one word per clock cycle.
+        data, cycles = results["read"]
+        self.assertEqual(data, [int.from_bytes(bytes(frame[4*i:4*(i+1)]), "big") for i in range(64)])
+        self.assertTrue(cycles <= 64 + 2)
+        # TX slot burst write at one word per clock cycle.
+        data, cycles = results["write"]
+        self.assertEqual(results["tx"], [0x5a000000 + i for i in range(64)])
+        self.assertTrue(cycles <= 64 + 2)
+
+    def loopback_test(self, dw, endianness):
+        frames   = [[(i*7 + n)%256 for i in range(length)] for n, length in enumerate([60, 61, 62, 63, 64, 67, 100])]
+        received = []
+        dut = LoopbackDUT(dw, endianness)
+        run_simulation(dut, loopback_main_generator(dut, frames, endianness, received))
+        self.assertEqual(received, frames)
+
+    def test_loopback_32b(self):
+        self.loopback_test(32, "big")
+        self.loopback_test(32, "little")
+
+    def test_loopback_64b(self):
+        self.loopback_test(64, "big")
+        self.loopback_test(64, "little")
+
+    def test_loopback_128b(self):
+        self.loopback_test(128, "big")
+        self.loopback_test(128, "little")
+
+    def test_jumbo(self):
+        frames   = [[i%251 for i in range(9000)], [i%253 for i in range(9100)]]
+        received = []
+        lengths  = []
+        dut = LiteEthMACWishboneInterface(dw=32, mtu=9022)
+        self.assertEqual(dut.slot_size, 16384)
+        generators = [
+            jumbo_sink_generator(dut.sink, frames),
+            jumbo_main_generator(dut, frames, received, lengths),
+        ]
+        run_simulation(dut, generators)
+        # Jumbo frames are stored, frames larger than the slots are truncated.
+        self.assertEqual(lengths, [9000, 9024])
+        self.assertEqual(received, [frames[0], frames[1][:9024]])
+
     def test(self):
         dut = DUT()
         generators = {
@@ -0,0 +1,188 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.packet import Packetizer, Depacketizer, StoreAndForwardBuffer
+
+def description(dw, header=None):
+    param_layout = [] if header is None else header.get_layout()
+    return EndpointDescription(eth_phy_description(dw).payload_layout, param_layout)
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class DUT(Module):
+    # UDP -> IPV4 -> MAC packetizers, MAC -> IPV4 -> UDP depacketizers (8, 20 and 14 bytes headers:
+    # the payload is unaligned on the wire for dw >= 32).
+    def __init__(self, dw, headers=[udp_header, ipv4_header, mac_header]):
+        self.dw = dw
+        self.packetizers   = packetizers   = [Packetizer(description(dw, h), description(dw), h) for h in headers]
+        self.depacketizers = depacketizers = [Depacketizer(description(dw), description(dw, h), h) for h in reversed(headers)]
+        self.submodules += packetizers, depacketizers
+        self.sink   = stream.Endpoint(description(dw))
+        self.comb  += self.sink.connect(packetizers[0].sink, keep={"valid", "ready", "last", "data", "last_be", "error"})
+        self.wire   = packetizers[-1].source
+        self.source = stream.Endpoint(eth_phy_description(dw))
+        chain = packetizers + depacketizers
+        for a, b in zip(chain[:-1], chain[1:]):
+            self.comb += a.source.connect(b.sink, keep={"valid", "ready", "last", "data", "last_be", "error"})
+        self.comb += depacketizers[-1].source.connect(self.source, keep={"valid", "ready", "last", "data", "last_be", "error"})
+
+# Generators ---------------------------------------------------------------------------------------
+
+def sink_generator(dut, packets):
+    bpc = dut.dw//8
+    for packet in packets:
+        words = [packet[i:i+bpc] for i in range(0, len(packet), bpc)]
+        for n, word in enumerate(words):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.last.eq(n == (len(words) - 1))
+            yield dut.sink.last_be.eq(2**(len(word) - 1) if n == (len(words) - 1) else 0)
+            yield dut.sink.data.eq(int.from_bytes(bytes(word), "little"))
+            yield
+            while not (yield dut.sink.ready):
+                yield
+    yield dut.sink.valid.eq(0)
+
+def wire_generator(dut, cycles):
+    # Record wire activity from the first to the last word.
+    while not (yield dut.wire.valid):
+        yield
+    while True:
+        valid = (yield dut.wire.valid)
+        ready = (yield dut.wire.ready)
+        last  = (yield dut.wire.last)
+        cycles.append((valid, ready))
+        yield
+        if valid and ready and last and len([c for c in cycles if c == (1, 1)]) == dut.expected_words:
+            break
+
+def source_generator(dut, packets):
+    bpc    = dut.dw//8
+    packet = []
+    yield dut.source.ready.eq(1)
+    while len(packets) < dut.expected_packets:
+        if (yield dut.source.valid):
+            data = (yield dut.source.data).to_bytes(bpc, "little")
+            if (yield dut.source.last):
+                last_be = (yield dut.source.last_be)
+                packet += list(data[:last_be.bit_length() if last_be else bpc])
+                packets.append(packet)
+                packet = []
+            else:
+                packet += list(data)
+        yield
+
+# Test Packet --------------------------------------------------------------------------------------
+
+class TestPacket(unittest.TestCase):
+    def packet_test(self, dw, lengths, headers=[udp_header, ipv4_header, mac_header]):
+        prng    = random.Random(42)
+        packets = [[prng.randrange(256) for _ in range(length)] for length in lengths]
+        header_length = sum(header.length for header in headers)
+        dut = DUT(dw, headers)
+        dut.expected_packets = len(packets)
+        dut.expected_words   = sum(ceil((header_length + length)/(dw//8)) for length in lengths)
+        cycles   = []
+        received = []
+        generators = [
+            sink_generator(dut, packets),
+            wire_generator(dut, cycles),
+            source_generator(dut, received),
+        ]
+        run_simulation(dut, generators)
+        # Packets are recovered with their exact byte length.
+        self.assertEqual(received, packets)
+        # Back-to-back packets at line rate: a word on the wire every cycle, no backpressure.
+        self.assertEqual(len(cycles), dut.expected_words)
+        self.assertEqual(cycles, [(1, 1)]*len(cycles))
+
+    def test_packet_8b(self):
+        self.packet_test(8, [1, 17, 46, 64])
+
+    def test_packet_32b(self):
+        self.packet_test(32, [1, 2, 3, 4, 5, 17, 46, 64, 65, 66, 67])
+
+    def test_packet_64b(self):
+        self.packet_test(64, [1, 2, 3, 4, 5, 6, 7, 8, 9, 17, 46, 64, 65, 66, 67, 68, 69, 70, 71, 1472])
+
+    def test_packet_vlan_32b(self):
+        # VLAN tag + MAC headers (4 and 14 bytes).
+        self.packet_test(32, [1, 2, 3, 4, 5, 17, 46, 64, 65, 66, 67], [vlan_header, mac_header])
+
+    def test_packet_vlan_64b(self):
+        # VLAN tag + MAC headers (4 and 14 bytes, the VLAN tag is shorter than a word).
+        self.packet_test(64, [1, 2, 3, 4, 5, 6, 7, 8, 9, 17, 46, 64, 65, 66, 67, 68, 69, 70, 71], [vlan_header, mac_header])
+
+# Test Store and Forward Buffer --------------------------------------------------------------------
+
+class TestStoreAndForwardBuffer(unittest.TestCase):
+    def buffer_test(self, dw, ready_rate=1.0):
+        prng    = random.Random(42)
+        bpc     = dw//8
+        depth   = 128//bpc
+        lengths = [64, 17, 128, 129, 300, 1, 46, 64, 65]
+        errors  = [False, True, False, False, False, False, True, False, False]
+        packets = [[prng.randrange(256) for _ in range(length)] for length in lengths]
+        # Packets with errors and packets larger than the buffer are dropped.
+        expected = [p for p, e in zip(packets, errors) if not e and len(p) <= depth*bpc]
+        dut = StoreAndForwardBuffer(eth_phy_description(dw), depth)
+        dropped  = []
+        received = []
+
+        def sink_generator():
+            for packet, error in zip(packets, errors):
+                words = [packet[i:i+bpc] for i in range(0, len(packet), bpc)]
+                for n, word in enumerate(words):
+                    last = (n == (len(words) - 1))
+                    yield dut.sink.valid.eq(1)
+                    yield dut.sink.last.eq(last)
+                    yield dut.sink.last_be.eq(2**(len(word) - 1) if last else 0)
+                    yield dut.sink.error.eq(2**bpc - 1 if (last and error) else 0)
+                    yield dut.sink.data.eq(int.from_bytes(bytes(word), "little"))
+                    yield
+                    while not (yield dut.sink.ready):
+                        yield
+            yield dut.sink.valid.eq(0)
+
+        def source_generator():
+            packet = []
+            while len(received) < len(expected):
+                if (yield dut.source.valid) and (yield dut.source.ready):
+                    data = (yield dut.source.data).to_bytes(bpc, "little")
+                    if (yield dut.source.last):
+                        last_be = (yield dut.source.last_be)
+                        packet += list(data[:last_be.bit_length() if last_be else bpc])
+                        received.append(packet)
+                        packet = []
+                    else:
+                        packet += list(data)
+                yield dut.source.ready.eq(prng.random() < ready_rate)
+                yield
+
+        @passive
+        def dropped_generator():
+            while True:
+                if (yield dut.dropped):
+                    dropped.append(1)
+                yield
+
+        run_simulation(dut, [sink_generator(), source_generator(), dropped_generator()])
+        self.assertEqual(received, expected)
+        self.assertEqual(len(dropped), len(packets) - len(expected))
+
+    def test_buffer_8b(self):
+        self.buffer_test(8)
+
+    def test_buffer_32b(self):
+        self.buffer_test(32)
+
+    def test_buffer_64b_backpressure(self):
+        self.buffer_test(64, ready_rate=0.5)
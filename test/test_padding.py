@@ -0,0 +1,46 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.mac.padding import LiteEthMACPaddingChecker
+
+from test.model.frame import frame_sink_generator, frame_source_generator
+
+# Test Padding -------------------------------------------------------------------------------------
+
+class TestPadding(unittest.TestCase):
+    def padding_checker_test(self, dw, n=32):
+        prng     = random.Random(42)
+        frames   = [[prng.randrange(256) for _ in range(prng.randrange(1, 80))] for _ in range(n)]
+        frames  += [[prng.randrange(256) for _ in range(length)] for length in [59, 60, 61, 1]]
+        received = []
+        errors   = []
+        stalls   = []
+        dut = LiteEthMACPaddingChecker(dw, 60)
+        generators = [
+            frame_sink_generator(dut.sink, frames, stalls),
+            frame_source_generator(dut.source, received, cycles=sum(len(f) for f in frames) + 128,
+                errors=errors, error=dut.error),
+        ]
+        run_simulation(dut, generators)
+        # Runt frames are dropped and counted, others forwarded unmodified, without stalling the PHY.
+        self.assertEqual(received, [frame for frame in frames if len(frame) >= 60])
+        self.assertEqual(sum(errors), len([frame for frame in frames if len(frame) < 60]))
+        self.assertEqual(stalls, [])
+
+    def test_padding_checker_8b(self):
+        self.padding_checker_test(8)
+
+    def test_padding_checker_32b(self):
+        self.padding_checker_test(32)
+
+    def test_padding_checker_64b(self):
+        self.padding_checker_test(64)
@@ -0,0 +1,198 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.mac.pause import LiteEthMACPauseTX, LiteEthMACPauseRX
+from liteeth.mac.core import LiteEthMACCore
+from liteeth.phy.xgmii import LiteEthPHYXGMII, xgmii_layout
+
+from test.model.frame import frame_sink_generator
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class DUT(Module):
+    def __init__(self, dw):
+        self.dw = dw
+        self.submodules.tx = LiteEthMACPauseTX(dw)
+        self.submodules.rx = LiteEthMACPauseRX(dw)
+        self.comb += [
+            self.tx.source.connect(self.rx.sink),
+            self.rx.source.ready.eq(1),
+            self.tx.mac_address.eq(0x10e2d5000000),
+        ]
+
+class MACDUT(Module):
+    def __init__(self, with_pause):
+        self.pads = pads = Record(xgmii_layout)
+        self.submodules.phy  = LiteEthPHYXGMII(None, pads, model=True)
+        self.submodules.core = LiteEthMACCore(self.phy, 64, endianness="little",
+            with_pause       = with_pause,
+            pause_fifo_depth = 32)
+        # Loopback (the core receives its own PAUSE frames).
+        self.comb += [
+            pads.rx_data.eq(pads.tx_data),
+            pads.rx_ctl.eq(pads.tx_ctl),
+        ]
+
+# Generators ---------------------------------------------------------------------------------------
+
+def sink_generator(dut, n, length=64):
+    bpc   = dut.dw//8
+    words = length//bpc
+    for i in range(n):
+        for j in range(words):
+            yield dut.tx.sink.valid.eq(1)
+            yield dut.tx.sink.last.eq(j == (words - 1))
+            yield dut.tx.sink.last_be.eq(2**(bpc - 1) if j == (words - 1) else 0)
+            yield
+            while not (yield dut.tx.sink.ready):
+                yield
+    yield dut.tx.sink.valid.eq(0)
+
+def xoff_generator(dut, cycles):
+    yield dut.tx.tx_quanta.eq(4)
+    for i in range(16):
+        yield
+    yield dut.tx.xoff.eq(1)
+    for i in range(cycles):
+        yield
+    yield dut.tx.xoff.eq(0)
+    for i in range(64):
+        yield
+
+def pause_generator(dut, quanta):
+    for i in range(64):
+        yield
+    yield dut.tx.quanta.eq(quanta)
+    yield dut.tx.pause.eq(1)
+    yield
+    yield dut.tx.pause.eq(0)
+
+@passive
+def monitor_generator(dut, received, activity, forwarded=None):
+    while True:
+        if forwarded is not None:
+            forwarded.append((yield dut.rx.source.valid))
+        if (yield dut.rx.pause):
+            yield
+            received.append((yield dut.rx.quanta))
+            continue
+        activity.append((yield dut.tx.source.valid) & (yield dut.tx.source.ready))
+        yield
+
+@passive
+def pause_monitor_generator(pause_rx, received):
+    while True:
+        if (yield pause_rx.pause):
+            yield
+            received.append((yield pause_rx.quanta))
+        yield
+
+def frames_source_generator(dut, frames, pauses, n, blocked):
+    # Consumer blocked for a while: the RX FIFO fills up.
+    source = dut.core.source
+    for i in range(blocked):
+        yield
+    frame = []
+    yield source.ready.eq(1)
+    yield
+    for i in range(4096):
+        if (yield source.valid):
+            data = (yield source.data).to_bytes(8, "little")
+            if (yield source.last):
+                last_be = (yield source.last_be)
+                frame += list(data[:last_be.bit_length() if last_be else 8])
+                if frame[12:14] == [0x88, 0x08]:
+                    pauses.append(frame)
+                else:
+                    frames.append(frame)
+                frame = []
+            else:
+                frame += list(data)
+        yield
+        if len(frames) == n:
+            break
+
+# Test PAUSE ---------------------------------------------------------------------------------------
+
+class TestPause(unittest.TestCase):
+    def pause_generation_test(self, dw):
+        # XOFF is sent on watermark crossing and refreshed every 2 quanta, XON is sent on release.
+        quanta_cycles = 512//dw
+        received  = []
+        forwarded = []
+        dut = DUT(dw)
+        generators = [
+            xoff_generator(dut, 8*quanta_cycles),
+            monitor_generator(dut, received, [], forwarded),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, [4]*len(received[:-1]) + [0])
+        self.assertTrue(4 <= len(received) <= 6)
+        # PAUSE frames are dropped.
+        self.assertEqual(sum(forwarded), 0)
+
+    def pause_honoring_test(self, dw, quanta=16):
+        # Frames are held off for the requested pause time.
+        quanta_cycles = 512//dw
+        activity = []
+        dut = DUT(dw)
+        generators = [
+            sink_generator(dut, 2*quanta*quanta_cycles//(64//(dw//8))),
+            pause_generator(dut, quanta),
+            monitor_generator(dut, [], activity),
+        ]
+        run_simulation(dut, generators)
+        # Transmission restarts quanta*512 bit times after the pause request (cycle 64).
+        activity = "".join(str(a) for a in activity)
+        restart  = activity.index("1", activity.index("0", 64))
+        self.assertTrue(abs(restart - (64 + quanta*quanta_cycles)) <= 2)
+
+    def test_pause_generation_8b(self):
+        self.pause_generation_test(8)
+
+    def test_pause_generation_64b(self):
+        self.pause_generation_test(64)
+
+    def test_pause_honoring_8b(self):
+        self.pause_honoring_test(8)
+
+    def test_pause_honoring_64b(self):
+        self.pause_honoring_test(64)
+
+    def test_pause_mac_core(self, n=12):
+        # Lossless: the core pauses itself (loopback) while its consumer is blocked.
+        prng     = random.Random(42)
+        frames   = [[prng.randrange(256) for _ in range(64)] for _ in range(n)]
+        received = []
+        pauses   = []
+        quantas  = []
+        dut = MACDUT(with_pause=True)
+        generators = {
+            "sys": [
+                frame_sink_generator(dut.core.sink, frames),
+                frames_source_generator(dut, received, pauses, n, blocked=256),
+            ],
+            "eth_rx": pause_monitor_generator(dut.core.pause_rx, quantas),
+        }
+        clocks = {"sys": 10, "eth_tx": 10, "eth_rx": 10}
+        run_simulation(dut, generators, clocks)
+        self.assertEqual(received, frames)
+        # XOFF then XON, PAUSE frames are not forwarded.
+        self.assertEqual(quantas[-2:], [0xffff, 0x0000])
+        self.assertEqual(pauses, [])
+
+    def test_pause_fifo_depth_jumbo(self):
+        # The default PAUSE FIFO depth must follow the configured MTU (2 frames).
+        pads = Record(xgmii_layout)
+        phy  = LiteEthPHYXGMII(None, pads, model=True)
+        core = LiteEthMACCore(phy, 64, endianness="little", with_pause=True, mtu=9022)
+        self.assertGreaterEqual(2*core.pause_watermark.storage.reset.value*(64//8), 2*9022)
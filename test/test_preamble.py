@@ -0,0 +1,50 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.mac.preamble import LiteEthMACPreambleChecker
+
+from test.model.frame import frame_sink_generator, frame_source_generator
+
+# Test Preamble ------------------------------------------------------------------------------------
+
+class TestPreamble(unittest.TestCase):
+    def preamble_checker_test(self, dw, n=32):
+        prng    = random.Random(42)
+        sfd     = eth_preamble >> 56
+        packets = [[prng.randrange(256) for _ in range(prng.randrange(1, 70))] for _ in range(n)]
+        # Variable preamble lengths, SFD on any lane and one frame ending in the preamble.
+        frames  = [[0x55]*prng.randrange(0, 16) + [sfd] + packet for packet in packets]
+        frames.insert(n//2, [0x55]*7)
+        received = []
+        errors   = []
+        stalls   = []
+        dut = LiteEthMACPreambleChecker(dw)
+        generators = [
+            frame_sink_generator(dut.sink, frames, stalls),
+            frame_source_generator(dut.source, received, n=n, errors=errors, error=dut.error),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, packets)
+        self.assertEqual(sum(errors), 1)
+        self.assertEqual(stalls, [])
+
+    def test_preamble_checker_8b(self):
+        self.preamble_checker_test(8)
+
+    def test_preamble_checker_16b(self):
+        self.preamble_checker_test(16)
+
+    def test_preamble_checker_32b(self):
+        self.preamble_checker_test(32)
+
+    def test_preamble_checker_64b(self):
+        self.preamble_checker_test(64)
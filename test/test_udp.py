@@ -13,6 +13,8 @@ from litex.soc.interconnect.stream_sim import *
 
 from liteeth.common import *
 from liteeth.core import LiteEthUDPIPCore
+from liteeth.core.ip import LiteEthIPRX
+from liteeth.core.udp import LiteEthUDPTX, LiteEthUDPRX
 
 from test.model import phy, mac, arp, ip, udp
 
@@ -23,15 +25,16 @@ mac_address = 0x12345678abcd
 
 
 class DUT(Module):
-    def __init__(self, dw=8):
-        self.dw = dw
+    def __init__(self, dw=8, length=64):
+        self.dw     = dw
+        self.length = length
         self.submodules.phy_model = phy.PHY(8, debug=False)
         self.submodules.mac_model = mac.MAC(self.phy_model, debug=False, loopback=False)
         self.submodules.arp_model = arp.ARP(self.mac_model, mac_address, ip_address, debug=False)
         self.submodules.ip_model = ip.IP(self.mac_model, mac_address, ip_address, debug=False, loopback=False)
         self.submodules.udp_model = udp.UDP(self.ip_model, ip_address, debug=False, loopback=True)
 
-        self.submodules.core = LiteEthUDPIPCore(self.phy_model, mac_address, ip_address, 100000)
+        self.submodules.core = LiteEthUDPIPCore(self.phy_model, mac_address, ip_address, 100000, dw=dw)
         udp_port = self.core.udp.crossbar.get_port(0x5678, dw)
         self.submodules.streamer = PacketStreamer(eth_udp_user_description(dw))
         self.submodules.logger = PacketLogger(eth_udp_user_description(dw))
@@ -40,20 +43,205 @@ class DUT(Module):
             udp_port.sink.ip_address.eq(0x12345678),
             udp_port.sink.src_port.eq(0x1234),
             udp_port.sink.dst_port.eq(0x5678),
-            udp_port.sink.length.eq(64//(dw//8)),
+            udp_port.sink.length.eq(length),
+            udp_port.sink.last_be.eq(2**((length - 1)%(dw//8))),
             Record.connect(udp_port.source, self.logger.sink)
         ]
 
-def main_generator(dut):
-    packet = Packet([i for i in range(64//(dut.dw//8))])
+def main_generator(dut, results=None):
+    bpc    = dut.dw//8
+    datas  = list(range(dut.length))
+    packet = Packet([int.from_bytes(bytes(datas[i:i+bpc]), "little") for i in range(0, dut.length, bpc)])
     dut.streamer.send(packet)
     yield from dut.logger.receive()
 
     # check results
     s, l, e = check(packet, dut.logger.packet)
     print("shift " + str(s) + " / length " + str(l) + " / errors " + str(e))
+    if results is not None:
+        # Compare received bytes (bytes after the last valid byte of the last word are don't care).
+        received = b"".join(d.to_bytes(bpc, "little") for d in dut.logger.packet)
+        results.append(list(received[:dut.length]) == datas and len(dut.logger.packet) == len(packet))
+
+class UDPChecksumDUT(Module):
+    def __init__(self, dw, mtu=eth_mtu):
+        self.dw = dw
+        self.submodules.tx = LiteEthUDPTX(ip_address, dw, with_checksum=True, mtu=mtu)
+        self.submodules.rx = LiteEthUDPRX(ip_address, dw, with_checksum=True)
+        self.corrupt = Signal(dw)
+        self.comb += [
+            self.tx.source.connect(self.rx.sink),
+            self.rx.sink.data.eq(self.tx.source.data ^ self.corrupt),
+            self.rx.sink.dst_ip_address.eq(ip_address)
+        ]
+
+
+class UDPChecksumRXDUT(Module):
+    def __init__(self):
+        self.submodules.ip_rx  = LiteEthIPRX(mac_address, ip_address, dummy_checksum=True,
+            with_broadcast = True,
+            mcast_groups   = 1)
+        self.submodules.udp_rx = LiteEthUDPRX(ip_address, with_checksum=True)
+        self.comb += self.ip_rx.source.connect(self.udp_rx.sink)
+
+
+def udp_checksum(src_ip, dst_ip, datagram):
+    data  = src_ip.to_bytes(4, "big") + dst_ip.to_bytes(4, "big")
+    data += bytes([0, udp_protocol]) + len(datagram).to_bytes(2, "big")
+    data += bytes(datagram) + bytes(len(datagram)%2)
+    s = sum(int.from_bytes(data[i:i+2], "big") for i in range(0, len(data), 2))
+    while s >> 16:
+        s = (s & 0xffff) + (s >> 16)
+    return s
+
+
+def udp_checksum_sink_generator(dut, payloads):
+    sink  = dut.tx.sink
+    lanes = dut.dw//8
+    for payload in payloads:
+        words = [payload[i:i+lanes] for i in range(0, len(payload), lanes)]
+        for n, word in enumerate(words):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (len(words) - 1))
+            yield sink.ip_address.eq(0x0a000001)
+            yield sink.src_port.eq(0x1234)
+            yield sink.dst_port.eq(0x5678)
+            yield sink.length.eq(len(payload))
+            yield sink.data.eq(int.from_bytes(bytes(word), "little"))
+            yield
+            while (yield sink.ready) == 0:
+                yield
+        yield sink.valid.eq(0)
+    # Wait for the last datagram (store and forward).
+    for i in range(256 + len(payloads[-1])//lanes):
+        yield
+
+
+@passive
+def udp_checksum_monitor_generator(dut, corrupted, sums, errors):
+    lanes = dut.dw//8
+    yield dut.rx.source.ready.eq(1)
+    datagram = []
+    while True:
+        yield dut.corrupt.eq(0xff if len(sums) in corrupted else 0)
+        if (yield dut.tx.source.valid) and (yield dut.tx.source.ready):
+            datagram += list(((yield dut.tx.source.data)).to_bytes(lanes, "little"))
+            if (yield dut.tx.source.last):
+                length = int.from_bytes(bytes(datagram[4:6]), "big")
+                sums.append(udp_checksum(ip_address, 0x0a000001, datagram[:length]))
+                datagram = []
+        if (yield dut.rx.source.valid) and (yield dut.rx.source.last):
+            errors.append((yield dut.rx.source.error) != 0)
+        yield
+
+
+def udp_checksum_rx_sink_generator(dut, datagrams):
+    sink = dut.ip_rx.sink
+    for target_mac, target_ip, payload, corrupted in datagrams:
+        length   = udp_header.length + len(payload)
+        datagram = [0x12, 0x34, 0x56, 0x78] + list(length.to_bytes(2, "big")) + [0x00, 0x00] + payload
+        checksum = (~udp_checksum(0x0a000001, target_ip, datagram)) & 0xffff
+        datagram[6:8] = list(checksum.to_bytes(2, "big"))
+        if corrupted:
+            datagram[-1] ^= 0xff
+        header  = [0x45, 0x00] + list((20 + length).to_bytes(2, "big"))
+        header += [0x00, 0x00, 0x00, 0x00, 0x80, udp_protocol, 0x00, 0x00]
+        header += list((0x0a000001).to_bytes(4, "big"))
+        header += list(target_ip.to_bytes(4, "big"))
+        data    = header + datagram
+        for n, byte in enumerate(data):
+            yield sink.valid.eq(1)
+            yield sink.last.eq(n == (len(data) - 1))
+            yield sink.last_be.eq(n == (len(data) - 1))
+            yield sink.target_mac.eq(target_mac)
+            yield sink.data.eq(byte)
+            yield
+            while (yield sink.ready) == 0:
+                yield
+        yield sink.valid.eq(0)
+    for i in range(64):
+        yield
+
+
+@passive
+def udp_checksum_rx_source_generator(dut, errors):
+    source = dut.udp_rx.source
+    yield source.ready.eq(1)
+    while True:
+        if (yield source.valid) and (yield source.last):
+            errors.append((yield source.error) != 0)
+        yield
+
 
 class TestUDP(unittest.TestCase):
+    def checksum_test(self, dw, payloads, mtu=eth_mtu):
+        corrupted = [len(payloads) - 1]
+        sums      = []
+        errors    = []
+        dut = UDPChecksumDUT(dw, mtu)
+        generators = [
+            udp_checksum_sink_generator(dut, payloads),
+            udp_checksum_monitor_generator(dut, corrupted, sums, errors),
+        ]
+        run_simulation(dut, generators)
+        # TX: Checksum over pseudo-header + datagram should fold to 0xffff.
+        self.assertEqual(sums[:-1], [0xffff]*(len(payloads) - 1))
+        # RX: Only the corrupted datagram should be flagged.
+        self.assertEqual(errors, [i in corrupted for i in range(len(payloads))])
+
+    def test_checksum_8b(self):
+        self.checksum_test(8, [list(range(17)), [0xff]*64, list(range(32)), list(range(16))])
+
+    def test_checksum_32b(self):
+        self.checksum_test(32, [list(range(64)), [0xff]*32, list(range(32, 48)), list(range(16))])
+
+    def test_checksum_64b(self):
+        self.checksum_test(64, [list(range(64)), [0xff]*32, list(range(32, 48)), list(range(16))])
+
+    def test_checksum_jumbo_64b(self):
+        # Jumbo datagrams must fit in the checksum buffer.
+        self.checksum_test(64, [[i%256 for i in range(8972)], list(range(64)), [0xff]*8000], mtu=9022)
+
+    def test_checksum_rx_broadcast_multicast(self):
+        # The checksum must be verified against the received destination IP address.
+        group = 0xef010101 # 239.1.1.1
+        datagrams = [
+            (mac_address,    ip_address, list(range(16)), False), # Unicast.
+            (0xffffffffffff, 0xffffffff, list(range(16)), False), # Broadcast.
+            (0x01005e010101, group,      list(range(16)), False), # Multicast.
+            (0xffffffffffff, 0xffffffff, list(range(16)), True),  # Corrupted Broadcast.
+            (0x01005e010101, group,      list(range(16)), True),  # Corrupted Multicast.
+        ]
+        errors = []
+        dut = UDPChecksumRXDUT()
+        def generator():
+            index_bits = len(dut.ip_rx._mcast_control.fields.index)
+            yield from dut.ip_rx._mcast_ip_address.write(group)
+            yield from dut.ip_rx._mcast_control.write(0b11 << index_bits) # index 0 + valid + write
+            yield from udp_checksum_rx_sink_generator(dut, datagrams)
+        run_simulation(dut, [generator(), udp_checksum_rx_source_generator(dut, errors)])
+        self.assertEqual(errors, [corrupted for _, _, _, corrupted in datagrams])
+
+    def loopback_test(self, dw, length):
+        results = []
+        dut = DUT(dw, length)
+        generators = {
+            "sys" :   [main_generator(dut, results),
+                       dut.streamer.generator(),
+                       dut.logger.generator()],
+            "eth_tx": [dut.phy_model.phy_sink.generator(),
+                       dut.phy_model.generator()],
+            "eth_rx":  dut.phy_model.phy_source.generator()
+        }
+        clocks = {"sys":    10,
+                  "eth_rx": 10,
+                  "eth_tx": 10}
+        run_simulation(dut, generators, clocks)
+        self.assertEqual(results, [True])
+
+    def test_loopback_64b(self):
+        self.loopback_test(64, 61)
+
     def test(self):
         dut = DUT(8)
         generators = {
@@ -0,0 +1,155 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.mac.common import LiteEthMACCrossbar, LiteEthMACPacketizer, LiteEthMACDepacketizer
+from liteeth.mac.vlan import LiteEthMACVLANTX, LiteEthMACVLANRX
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class DUT(Module):
+    # Crossbar -> VLAN TX -> MAC Packetizer -> MAC Depacketizer -> VLAN RX -> Crossbar.
+    def __init__(self, dw):
+        self.dw = dw
+        self.submodules.crossbar     = crossbar = LiteEthMACCrossbar(dw, with_vlan=True)
+        self.submodules.vlan_tx      = LiteEthMACVLANTX(dw)
+        self.submodules.packetizer   = LiteEthMACPacketizer(dw)
+        self.submodules.depacketizer = LiteEthMACDepacketizer(dw)
+        self.submodules.vlan_rx      = LiteEthMACVLANRX(dw)
+        self.ports = {
+            (ethernet_type_ip,  0): crossbar.get_port(ethernet_type_ip,  dw),
+            (ethernet_type_ip,  5): crossbar.get_port(ethernet_type_ip,  dw, vlan_id=5),
+            (ethernet_type_arp, 5): crossbar.get_port(ethernet_type_arp, dw, vlan_id=5),
+        }
+        self.wire = self.packetizer.source
+        self.comb += [
+            crossbar.master.source.connect(self.vlan_tx.sink),
+            self.vlan_tx.source.connect(self.packetizer.sink),
+            self.packetizer.source.connect(self.depacketizer.sink),
+            self.depacketizer.source.connect(self.vlan_rx.sink),
+            self.vlan_rx.source.connect(crossbar.master.sink),
+        ]
+
+# Generators ---------------------------------------------------------------------------------------
+
+def sink_generator(dut, frames):
+    bpc  = dut.dw//8
+    sink = dut.ports[(ethernet_type_ip, 0)].sink
+    for params, payload in frames:
+        words = [payload[i:i+bpc] for i in range(0, len(payload), bpc)]
+        for n, word in enumerate(words):
+            yield sink.valid.eq(1)
+            yield sink.target_mac.eq(0x10e2d5000001)
+            yield sink.sender_mac.eq(0x10e2d5000000)
+            yield sink.ethernet_type.eq(params[0])
+            yield sink.vlan_id.eq(params[1])
+            yield sink.pcp.eq(params[2])
+            yield sink.last.eq(n == (len(words) - 1))
+            yield sink.last_be.eq(2**(len(word) - 1) if n == (len(words) - 1) else 0)
+            yield sink.data.eq(int.from_bytes(bytes(word), "little"))
+            yield
+            while not (yield sink.ready):
+                yield
+    yield sink.valid.eq(0)
+    for i in range(128):
+        yield
+
+@passive
+def source_generator(dut, source, frames):
+    bpc   = dut.dw//8
+    frame = []
+    yield source.ready.eq(1)
+    while True:
+        if (yield source.valid):
+            data = (yield source.data).to_bytes(bpc, "little")
+            if (yield source.last):
+                last_be = (yield source.last_be)
+                frame += list(data[:last_be.bit_length() if last_be else bpc])
+                params = ((yield source.ethernet_type), (yield source.vlan_id), (yield source.pcp))
+                macs   = ((yield source.target_mac), (yield source.sender_mac))
+                frames.append((params, macs, frame))
+                frame = []
+            else:
+                frame += list(data)
+        yield
+
+@passive
+def wire_generator(dut, frames):
+    bpc   = dut.dw//8
+    frame = []
+    while True:
+        if (yield dut.wire.valid) and (yield dut.wire.ready):
+            data = (yield dut.wire.data).to_bytes(bpc, "little")
+            if (yield dut.wire.last):
+                last_be = (yield dut.wire.last_be)
+                frame += list(data[:last_be.bit_length() if last_be else bpc])
+                frames.append(frame)
+                frame = []
+            else:
+                frame += list(data)
+        yield
+
+# Test VLAN ----------------------------------------------------------------------------------------
+
+class TestVLAN(unittest.TestCase):
+    def vlan_test(self, dw):
+        prng   = random.Random(42)
+        params = [
+            (ethernet_type_ip,  0, 0),
+            (ethernet_type_ip,  5, 3),
+            (ethernet_type_arp, 5, 7),
+            (ethernet_type_arp, 0, 0), # No port: dropped.
+            (ethernet_type_ip,  7, 0), # No port: dropped.
+            (ethernet_type_ip,  5, 0),
+            (ethernet_type_ip,  0, 0),
+        ]
+        frames   = [(p, [prng.randrange(256) for _ in range(prng.randrange(46, 80))]) for p in params]
+        wire     = []
+        dut      = DUT(dw)
+        received = {k: [] for k in dut.ports.keys()}
+        generators = [sink_generator(dut, frames), wire_generator(dut, wire)]
+        for k, port in dut.ports.items():
+            generators.append(source_generator(dut, port.source, received[k]))
+        run_simulation(dut, generators)
+
+        # Tag inserted on the wire for the frames with a VLAN ID.
+        self.assertEqual(len(wire), len(frames))
+        for (p, payload), frame in zip(frames, wire):
+            if p[1]:
+                tci = (p[2] << 13) | p[1]
+                self.assertEqual(frame[12:18], [0x81, 0x00, tci >> 8, tci & 0xff, p[0] >> 8, p[0] & 0xff])
+                self.assertEqual(frame[18:], payload)
+            else:
+                self.assertEqual(frame[12:14], [p[0] >> 8, p[0] & 0xff])
+                self.assertEqual(frame[14:], payload)
+
+        # Tag stripped and frames dispatched on (Ethernet type, VLAN ID).
+        macs = (0x10e2d5000001, 0x10e2d5000000)
+        for k, port_frames in received.items():
+            expected = [(p, macs, payload) for p, payload in frames if (p[0], p[1]) == k]
+            self.assertEqual(port_frames, expected)
+
+    def test_vlan_8b(self):
+        self.vlan_test(8)
+
+    def test_vlan_32b(self):
+        self.vlan_test(32)
+
+    def test_vlan_64b(self):
+        self.vlan_test(64)
+
+    def test_vlan_port_errors(self):
+        crossbar = LiteEthMACCrossbar(8, with_vlan=True)
+        crossbar.get_port(ethernet_type_ip, vlan_id=5)
+        with self.assertRaises(ValueError):
+            crossbar.get_port(ethernet_type_ip, vlan_id=5)
+        with self.assertRaises(ValueError):
+            LiteEthMACCrossbar(8).get_port(ethernet_type_ip, vlan_id=5)
@@ -0,0 +1,127 @@
+#
+# This file is part of LiteEth.
+#
+# Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from liteeth.common import *
+from liteeth.phy.xgmii import *
+from liteeth.mac.core import LiteEthMACCore
+
+from test.model.frame import frame_sink_generator, frame_source_generator
+
+# DUT ----------------------------------------------------------------------------------------------
+
+class DUT(Module):
+    def __init__(self, with_dic=True):
+        self.pads = pads = Record(xgmii_layout)
+        self.submodules.tx = LiteEthPHYXGMIITX(pads, with_dic=with_dic)
+        self.submodules.rx = LiteEthPHYXGMIIRX(pads)
+        # Loopback.
+        self.comb += [
+            pads.rx_data.eq(pads.tx_data),
+            pads.rx_ctl.eq(pads.tx_ctl),
+        ]
+
+class MACDUT(Module):
+    def __init__(self, **kwargs):
+        self.pads = pads = Record(xgmii_layout)
+        self.submodules.phy  = LiteEthPHYXGMII(None, pads, model=True)
+        self.submodules.core = LiteEthMACCore(self.phy, 64, endianness="little", **kwargs)
+        # Loopback.
+        self.comb += [
+            pads.rx_data.eq(pads.tx_data),
+            pads.rx_ctl.eq(pads.tx_ctl),
+        ]
+
+# Generators ---------------------------------------------------------------------------------------
+
+def xgmii_monitor_generator(dut, gaps, starts, n):
+    # Count octets from /T/ (included) to /S/ (excluded) and record /S/ lanes.
+    gap = None
+    while len(starts) < n:
+        data = (yield dut.pads.tx_data)
+        ctl  = (yield dut.pads.tx_ctl)
+        for i in range(8):
+            c = (data >> 8*i) & 0xff
+            if (ctl >> i) & 0x1:
+                if c == xgmii_start:
+                    if gap is not None:
+                        gaps.append(gap)
+                    starts.append(i)
+                    gap = None
+                elif c == xgmii_terminate:
+                    gap = 1
+                elif gap is not None:
+                    gap += 1
+        yield
+
+# Test XGMII ---------------------------------------------------------------------------------------
+
+class TestXGMII(unittest.TestCase):
+    def xgmii_test(self, with_dic, n=32):
+        prng     = random.Random(42)
+        preamble = list(eth_preamble.to_bytes(8, "little"))
+        frames   = [preamble + [prng.randrange(256) for _ in range(prng.randrange(60, 80))] for _ in range(n)]
+        received = []
+        errors   = []
+        gaps     = []
+        starts   = []
+        dut = DUT(with_dic)
+        generators = [
+            frame_sink_generator(dut.tx.sink, frames),
+            frame_source_generator(dut.rx.source, received, n=n, errors=errors),
+            xgmii_monitor_generator(dut, gaps, starts, n),
+        ]
+        run_simulation(dut, generators)
+        self.assertEqual(received, frames)
+        self.assertEqual(errors, [False]*n)
+        self.assertEqual(set(starts), {0, 4})
+        return gaps
+
+    def test_xgmii_dic(self):
+        gaps = self.xgmii_test(with_dic=True)
+        # Gaps are shortened by up to 3 octets and the average stays at 12 octets.
+        self.assertTrue(all(9 <= gap <= 15 for gap in gaps))
+        self.assertLessEqual(abs(sum(gaps) - eth_interpacket_gap*len(gaps)), 3)
+
+    def test_xgmii_no_dic(self):
+        gaps = self.xgmii_test(with_dic=False)
+        self.assertTrue(all(12 <= gap <= 15 for gap in gaps))
+
+    def test_xgmii_mac_core(self, n=8):
+        # Back-to-back frames through the 64-bit MAC (padding, CRC, preamble) and the XGMII PHY.
+        prng     = random.Random(42)
+        frames   = [[prng.randrange(256) for _ in range(prng.randrange(60, 90))] for _ in range(n)]
+        received = []
+        errors   = []
+        dut = MACDUT()
+        generators = {"sys": [
+            frame_sink_generator(dut.core.sink, frames),
+            frame_source_generator(dut.core.source, received, n=n, errors=errors),
+        ]}
+        clocks = {"sys": 10, "eth_tx": 10, "eth_rx": 10}
+        run_simulation(dut, generators, clocks)
+        self.assertEqual(received, frames)
+        self.assertEqual(errors, [False]*n)
+
+    def test_xgmii_mac_core_jumbo(self):
+        # Jumbo frames through the store-and-forward RX buffer (sized from the MTU).
+        prng     = random.Random(42)
+        frames   = [[prng.randrange(256) for _ in range(length)] for length in [9000, 64, 8996]]
+        received = []
+        errors   = []
+        dut = MACDUT(rx_mode="store-and-forward", mtu=9022)
+        generators = {"sys": [
+            frame_sink_generator(dut.core.sink, frames),
+            frame_source_generator(dut.core.source, received, n=len(frames), errors=errors),
+        ]}
+        clocks = {"sys": 10, "eth_tx": 10, "eth_rx": 10}
+        run_simulation(dut, generators, clocks)
+        self.assertEqual(received, frames)
+        self.assertEqual(errors, [False]*len(frames))